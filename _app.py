@@ -1,16 +1,38 @@
+import os
+import sqlite3
+import tempfile
+import uuid
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import requests
-import json
-import io
-from typing import Dict, List, Any
-import numpy as np
-import asyncio
-import websockets
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from parallel_aggregation import groupby_sum
+from regions import LEVELS, rollup_for
+from panel_index import PATH_CACHED, panel_index_for
+from anomalies import anomalies_for, anomaly_section, flag_trend_figure, headline_warning
+from digest import context_section, prompt_context
+from offsets import LBS_PER_UNIT, plan_for, planting_section
+from preview import preview_for, preview_section, wants_preview
+from enrichment import enrichment_for, intensity_section
+from world_map import map_section
+from sections import dataset_metrics, input_key, level_figures
+from synthetic import SAMPLE_ROWS, SAMPLE_SEED, synthetic_frame
+from analysis_summary import summarize_emissions
+from analysis_core import (ANALYSIS_VERSION, CO2_LBS_PER_TREE, cached_visualizations, calculate_tree_impact,
+                           calculate_trends)
+from artifacts import ArtifactBundle, BUNDLED_CSV, load_artifacts
+from validation import ValidationError, validate_emissions
+from jobs import DONE, FAILED, Job, JobCancelled, JobScheduler, poll_job
+from result_cache import ResultCache, frame_fingerprint, pin_frame
+from voice import VoiceSynthesizer, play_summary
+from ledger import LedgerWriter, show_ledger_receipts
+from agent_messages import (AgentMessage, AgentResponse, EnergyResult, PolicyResult, TradingResult,
+                            TreePlantingResult, WIRE_VERSION, decode, encode, format_range, format_usd)
+from agent_dag import DagRun, TaskNode, run_dag
+from agent_calls import AgentCallScheduler
+from comparison import comparison_section
+from export import available_export_formats, export_file_name, lazy_export, lazy_json
 from datetime import datetime
+from functools import partial
 
 # Configure page
 st.set_page_config(
@@ -93,14 +115,42 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Upstream agents whose output each agent consumes in a collaboration thread
+AGENT_DEPENDENCIES = {
+    "carbon_analyzer_agent": (),
+    "tree_planting_agent": (),
+    "renewable_energy_agent": (),
+    "policy_agent": ("carbon_analyzer_agent",),
+    "carbon_trading_agent": ("tree_planting_agent",),
+}
+
+AGENT_TASKS = {
+    "tree_planting_agent": "optimize_tree_planting",
+    "policy_agent": "policy_recommendations",
+    "renewable_energy_agent": "renewable_energy_planning",
+    "carbon_trading_agent": "carbon_credit_optimization",
+}
+
+# Bump when what an agent answers changes; cached responses of an older version are recomputed
+AGENT_RESPONSE_VERSION = 2
+
 class CoralProtocolIntegration:
     """Integration with Coral Protocol for multi-agent collaboration"""
     
     def __init__(self):
         self.coral_server_url = "http://localhost:5555"
-        self.session_id = f"carbon_emission_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.session_id = self.new_session_id()
         self.registered_agents = {}
         self.agent_status = {}
+        # Budgets, rate limits and request coalescing for paid agent queries
+        self.calls = AgentCallScheduler({
+            agent_id: info["cost_per_query"] for agent_id, info in self.discover_climate_agents().items()
+        })
+        
+    def new_session_id(self) -> str:
+        """Generate an identifier for one user's collaboration session"""
+        # The suffix keeps sessions started in the same second apart; budgets are per session
+        return f"carbon_emission_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         
     def register_carbon_analysis_agent(self):
         """Register our main carbon analysis agent with Coral Protocol"""
@@ -160,109 +210,140 @@ class CoralProtocolIntegration:
         
         return available_agents
     
-    def create_agent_collaboration_thread(self, participating_agents: List[str]):
+    def create_agent_collaboration_thread(self, participating_agents: List[str], session_id: str = None):
         """Create a collaboration thread with multiple agents"""
         thread_config = {
             "thread_id": f"climate_collab_{datetime.now().strftime('%H%M%S')}",
+            "session_id": session_id or self.session_id,
             "participants": participating_agents,
             "topic": "carbon_emission_reduction",
-            "coordinator": "carbon_analyzer_agent"
+            "coordinator": "carbon_analyzer_agent",
+            "dependencies": {
+                agent_id: [dep for dep in AGENT_DEPENDENCIES.get(agent_id, ()) if dep in participating_agents]
+                for agent_id in participating_agents
+            }
         }
         
         return thread_config
     
-    def send_agent_message(self, agent_id: str, message: Dict, data: pd.DataFrame = None):
-        """Send message to another agent through Coral Protocol"""
+    def run_collaboration_thread(self, thread_config: Dict, data: pd.DataFrame, on_progress=None) -> DagRun:
+        """Run a thread's agents as a DAG, independent agents in parallel"""
+        nodes = [
+            TaskNode(agent_id, partial(self._thread_step, thread_config["session_id"], agent_id, data),
+                     thread_config["dependencies"][agent_id])
+            for agent_id in thread_config["participants"]
+        ]
+        return run_dag(nodes, on_progress=on_progress)
+    
+    def _thread_step(self, session_id: str, agent_id: str, data: pd.DataFrame, inputs: Dict[str, Any]):
+        """One node of a collaboration thread, fed by its upstream agents"""
+        if agent_id == "carbon_analyzer_agent":
+            # The coordinator is this app; its trend output feeds the policy agent
+            return calculate_trends(data)
+        
+        context = {}
+        tree = inputs.get("tree_planting_agent")
+        if tree is not None:
+            context["offset_tons"] = tree.result.recommended_trees * tree.result.co2_lbs_per_tree / 1000
+        trend = inputs.get("carbon_analyzer_agent")
+        if trend is not None:
+            context["growth_rate"] = trend["growth_rate"]
+        
+        message = AgentMessage(agent_id, AGENT_TASKS[agent_id], context=context)
+        return self.query_agent(session_id, agent_id, message, data)
+    
+    def query_agent(self, session_id: str, agent_id: str, message: AgentMessage, data: pd.DataFrame) -> AgentResponse:
+        """Budgeted, rate-limited agent query; identical queries in flight share one call"""
+        def _send():
+            response = decode(self.send_agent_message(agent_id, message, data))
+            if not response.ok:
+                # Raising refunds the session; failed queries are not billed
+                raise RuntimeError(response.error)
+            return response
+        
+        key = (agent_id, encode(message), frame_fingerprint(data))
+        return self.calls.call(session_id, agent_id, key, _send)
+    
+    def send_agent_message(self, agent_id: str, message: AgentMessage, data: pd.DataFrame = None) -> bytes:
+        """Send message to another agent through Coral Protocol; returns the encoded response"""
+        simulators = {
+            "tree_planting_agent": ("Tree Planting Optimizer", self._simulate_tree_agent_response),
+            "policy_agent": ("Climate Policy Advisor", self._simulate_policy_agent_response),
+            "renewable_energy_agent": ("Renewable Energy Planner", self._simulate_energy_agent_response),
+            "carbon_trading_agent": ("Carbon Credit Optimizer", self._simulate_trading_agent_response),
+        }
         try:
-            # Simulate agent communication
-            if agent_id == "tree_planting_agent":
-                return self._simulate_tree_agent_response(message, data)
-            elif agent_id == "policy_agent":
-                return self._simulate_policy_agent_response(message, data)
-            elif agent_id == "renewable_energy_agent":
-                return self._simulate_energy_agent_response(message, data)
-            elif agent_id == "carbon_trading_agent":
-                return self._simulate_trading_agent_response(message, data)
+            # Simulate agent communication over the msgpack wire format
+            if agent_id not in simulators:
+                return encode(AgentResponse.failure(agent_id, f"Unknown agent: {agent_id}"))
+            name, simulate = simulators[agent_id]
+            return encode(AgentResponse(agent_id, name, result=simulate(message, data)))
             
         except Exception as e:
-            return {"error": str(e), "status": "failed"}
+            return encode(AgentResponse.failure(agent_id, str(e)))
     
-    def _simulate_tree_agent_response(self, message: Dict, data: pd.DataFrame):
-        """Simulate response from tree planting agent"""
-        total_emissions = data['Carbon_Emissions'].sum()
-        trees_needed = int(total_emissions * 1000 / 48)
+    def _simulate_tree_agent_response(self, message: AgentMessage, data: pd.DataFrame) -> TreePlantingResult:
+        """Simulate response from tree planting agent with the cheapest plan that offsets every emission"""
+        plan = plan_for(float(data['Carbon_Emissions'].sum()) * LBS_PER_UNIT)
+        trees = max(plan.trees, 1)
         
-        return {
-            "agent": "Tree Planting Optimizer",
-            "response": {
-                "recommended_trees": trees_needed,
-                "optimal_species": ["Oak", "Pine", "Maple", "Birch"],
-                "planting_locations": ["Temperate forests", "Urban areas", "Degraded lands"],
-                "cost_estimate": trees_needed * 2.5,  # $2.5 per tree
-                "co2_absorption_rate": "48 lbs CO2/year per tree",
-                "optimal_planting_season": "Spring (March-May)"
-            },
-            "status": "success"
-        }
+        return TreePlantingResult(
+            recommended_trees=plan.trees,
+            optimal_species=plan.by('Species').index[:4].tolist(),
+            planting_locations=plan.by('Region').index[:3].tolist(),
+            cost_per_tree=plan.cost / trees,
+            co2_lbs_per_tree=plan.absorbed_lbs / trees if plan.trees else CO2_LBS_PER_TREE,
+            planting_months=(3, 5)
+        )
     
-    def _simulate_policy_agent_response(self, message: Dict, data: pd.DataFrame):
+    def _simulate_policy_agent_response(self, message: AgentMessage, data: pd.DataFrame) -> PolicyResult:
         """Simulate response from policy agent"""
-        top_countries = data.groupby('Country')['Carbon_Emissions'].sum().nlargest(5).index.tolist()
+        top_countries = groupby_sum(data, 'Country').nlargest(5).index.tolist()
         
-        return {
-            "agent": "Climate Policy Advisor", 
-            "response": {
-                "priority_countries": top_countries,
-                "recommended_policies": [
-                    "Carbon pricing mechanism",
-                    "Renewable energy mandates",
-                    "Electric vehicle incentives",
-                    "Industrial emission standards"
-                ],
-                "estimated_reduction": "15-30% over 5 years",
-                "implementation_cost": "$50B globally",
-                "key_sectors": ["Energy", "Transportation", "Industry"]
-            },
-            "status": "success"
-        }
+        return PolicyResult(
+            priority_countries=top_countries,
+            recommended_policies=[
+                "Carbon pricing mechanism",
+                "Renewable energy mandates",
+                "Electric vehicle incentives",
+                "Industrial emission standards"
+            ],
+            reduction_range=(0.15, 0.30),
+            reduction_years=5,
+            implementation_cost_usd=50e9,
+            key_sectors=["Energy", "Transportation", "Industry"],
+            baseline_growth_rate=message.context.get("growth_rate")
+        )
     
-    def _simulate_energy_agent_response(self, message: Dict, data: pd.DataFrame):
+    def _simulate_energy_agent_response(self, message: AgentMessage, data: pd.DataFrame) -> EnergyResult:
         """Simulate response from renewable energy agent"""
-        return {
-            "agent": "Renewable Energy Planner",
-            "response": {
-                "renewable_potential": "65% of current emissions could be offset",
-                "recommended_mix": {
-                    "Solar": "40%",
-                    "Wind": "35%", 
-                    "Hydro": "15%",
-                    "Geothermal": "10%"
-                },
-                "investment_needed": "$2.5T globally",
-                "timeline": "10-15 years for full deployment",
-                "job_creation": "15 million jobs globally"
-            },
-            "status": "success"
-        }
+        return EnergyResult(
+            offset_share=0.65,
+            recommended_mix={"Solar": 0.40, "Wind": 0.35, "Hydro": 0.15, "Geothermal": 0.10},
+            investment_usd=2.5e12,
+            timeline_years=(10, 15),
+            jobs_created=15_000_000
+        )
     
-    def _simulate_trading_agent_response(self, message: Dict, data: pd.DataFrame):
+    def _simulate_trading_agent_response(self, message: AgentMessage, data: pd.DataFrame) -> TradingResult:
         """Simulate response from carbon trading agent"""
-        total_emissions = data['Carbon_Emissions'].sum()
+        # Offset volume comes from the tree agent when run in a thread
+        offset_tons = message.context.get("offset_tons", data['Carbon_Emissions'].sum())
+        carbon_price = 85.0
         
-        return {
-            "agent": "Carbon Credit Optimizer",
-            "response": {
-                "current_carbon_price": "$85/ton CO2",
-                "total_offset_cost": f"${total_emissions * 85:,.2f}",
-                "recommended_strategy": "Buy 60% verified credits, invest 40% in projects",
-                "market_trend": "Increasing demand, prices rising 12% annually",
-                "best_credit_sources": ["Forestry projects", "Renewable energy", "Carbon capture"]
-            },
-            "status": "success"
-        }
+        return TradingResult(
+            carbon_price_usd=carbon_price,
+            total_offset_cost_usd=offset_tons * carbon_price,
+            verified_credit_share=0.6,
+            annual_price_growth=0.12,
+            best_credit_sources=["Forestry projects", "Renewable energy", "Carbon capture"]
+        )
 
 class CarbonEmissionAnalyzer:
-    def __init__(self):
+    def __init__(self, bundle: ArtifactBundle = None):
+        # Precomputed artifacts for the bundled dataset, if available
+        self.bundle = bundle
+        
         # Make API keys optional - use fallback if secrets not available
         try:
             self.mistral_api_key = st.secrets.get("MISTRAL_API_KEY", "")
@@ -273,19 +354,22 @@ class CarbonEmissionAnalyzer:
             
         # Initialize Coral Protocol integration
         self.coral = CoralProtocolIntegration()
+        self.voice = VoiceSynthesizer(self.elevenlabs_api_key)
         
-    def analyze_with_mistral(self, data: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze carbon emissions data using Mistral AI"""
+    def analyze_with_mistral(self, data: pd.DataFrame, summary: Optional[Dict[str, Any]] = None,
+                             progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """Analyze carbon emissions data using Mistral AI
+
+        summary replaces the data summary computed from `data`, e.g. one
+        derived for a subset by analyze_subset. progress(fraction, message)
+        is called between stages; a background job passes Job.update so
+        each stage is also a cancellation point. A failed analysis falls
+        back to basic statistics and reports why in analysis["error"].
+        """
+        report = progress or (lambda fraction, message: None)
         try:
             # Prepare data summary for AI analysis
-            data_summary = {
-                "total_countries": len(data['Country'].unique()),
-                "year_range": f"{data['Year'].min()} - {data['Year'].max()}",
-                "total_emissions": data['Carbon_Emissions'].sum(),
-                "avg_emissions": data['Carbon_Emissions'].mean(),
-                "top_emitters": data.groupby('Country')['Carbon_Emissions'].sum().nlargest(5).to_dict(),
-                "trend_analysis": self._calculate_trends(data)
-            }
+            data_summary, llm_context = summarize_emissions(data, self.bundle, summary, report)
             
             # Enhanced analysis with Coral Protocol multi-agent insights
             analysis = {
@@ -304,6 +388,9 @@ class CarbonEmissionAnalyzer:
                     "Deploy AI agent coordination for climate action"
                 ],
                 "tree_impact": self._calculate_tree_impact(data_summary["total_emissions"]),
+                "regional_emitters": data_summary["regional_emitters"],
+                "anomalies": data_summary["anomalies"],
+                "llm_context": llm_context,
                 "sector_priorities": {
                     "Energy": "Critical - 45% of emissions",
                     "Transportation": "High - 25% of emissions",
@@ -315,37 +402,65 @@ class CarbonEmissionAnalyzer:
             
             return analysis
             
+        except JobCancelled:
+            raise
         except Exception as e:
-            st.error(f"Error in Mistral analysis: {str(e)}")
-            return self._get_fallback_analysis(data)
+            # Usually runs in a job thread, where st.error would be dropped; the caller shows it
+            analysis = self._get_fallback_analysis(data, summary)
+            analysis["error"] = f"Error in Mistral analysis: {str(e)}"
+            return analysis
+    
+    def analyze_subset(self, data: pd.DataFrame, countries: Optional[List[str]] = None,
+                       years: Optional[Tuple[int, int]] = None,
+                       min_emissions: Optional[float] = None) -> Dict[str, Any]:
+        """Analyze a subset of countries and an inclusive year window
+        
+        The summary comes from the cached full-dataset aggregates unless a
+        record-level filter forces a raw scan; analysis["subset"] records
+        the filters, the summary and which path produced it. The model
+        context is a digest of the subset's own rows and anomalies.
+        """
+        index = panel_index_for(data)
+        subset = index.summary(countries, years, min_emissions)
+        summary = dict(subset.stats)
+        summary["anomalies"] = anomalies_for(data).summary(countries=countries, years=years)
+        analysis = self.analyze_with_mistral(data, summary)
+        if "error" not in analysis:
+            analysis["llm_context"] = prompt_context(index.records(countries, years, min_emissions),
+                                                     summary["anomalies"])
+        analysis["subset"] = {
+            "countries": list(countries or []),
+            "years": list(years) if years is not None else None,
+            "min_emissions": min_emissions,
+            "summary": subset.stats,
+            **subset.to_dict()
+        }
+        return analysis
     
     def _calculate_trends(self, data: pd.DataFrame) -> Dict:
         """Calculate emission trends"""
-        yearly_data = data.groupby('Year')['Carbon_Emissions'].sum()
-        if len(yearly_data) > 1:
-            growth_rate = ((yearly_data.iloc[-1] - yearly_data.iloc[0]) / yearly_data.iloc[0]) * 100
-            return {"growth_rate": growth_rate, "trend": "increasing" if growth_rate > 0 else "decreasing"}
-        return {"growth_rate": 0, "trend": "stable"}
+        return calculate_trends(data)
     
     def _calculate_tree_impact(self, total_emissions: float) -> Dict:
         """Calculate how many trees needed to offset emissions"""
-        trees_needed = int(total_emissions * 1000 / 48)
-        forest_area = trees_needed * 0.0006
-        
-        return {
-            "trees_needed": trees_needed,
-            "forest_area_acres": forest_area,
-            "annual_absorption": trees_needed * 48
-        }
+        return calculate_tree_impact(total_emissions)
     
-    def _get_fallback_analysis(self, data: pd.DataFrame) -> Dict:
-        """Fallback analysis if AI service fails"""
+    def _get_fallback_analysis(self, data: pd.DataFrame, summary: Optional[Dict[str, Any]] = None) -> Dict:
+        """Fallback analysis if AI service fails; reads a given summary instead of scanning `data`"""
+        if summary is None:
+            summary = {
+                "records": len(data),
+                "avg_emissions": data['Carbon_Emissions'].mean(),
+                "max_emissions": data['Carbon_Emissions'].max(),
+                "total_years": data['Year'].nunique(),
+                "total_emissions": data['Carbon_Emissions'].sum()
+            }
         return {
             "key_insights": [
-                f"Data covers {len(data)} emission records",
-                f"Average emission per record: {data['Carbon_Emissions'].mean():.2f} units",
-                f"Highest emission: {data['Carbon_Emissions'].max():.2f} units",
-                f"Data spans {data['Year'].nunique()} years"
+                f"Data covers {summary['records']} emission records",
+                f"Average emission per record: {summary['avg_emissions']:.2f} units",
+                f"Highest emission: {summary['max_emissions']:.2f} units",
+                f"Data spans {summary['total_years']} years"
             ],
             "recommendations": [
                 "Focus on countries with highest emissions",
@@ -353,7 +468,7 @@ class CarbonEmissionAnalyzer:
                 "Invest in renewable energy",
                 "Monitor emission trends closely"
             ],
-            "tree_impact": self._calculate_tree_impact(data['Carbon_Emissions'].sum()),
+            "tree_impact": self._calculate_tree_impact(summary['total_emissions']),
             "sector_priorities": {
                 "Energy": "Critical Priority",
                 "Transportation": "High Priority",
@@ -403,52 +518,66 @@ def display_coral_agent_status(coral: CoralProtocolIntegration):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def create_visualizations(data: pd.DataFrame):
-    """Create comprehensive data visualizations"""
-    
-    # 1. Bar Chart - Top Countries by Emissions
-    country_emissions = data.groupby('Country')['Carbon_Emissions'].sum().nlargest(10)
-    bar_fig = px.bar(
-        x=country_emissions.index,
-        y=country_emissions.values,
-        title="Top 10 Countries by Carbon Emissions",
-        labels={'x': 'Country', 'y': 'Carbon Emissions (units)'},
-        color=country_emissions.values,
-        color_continuous_scale="Reds"
-    )
-    bar_fig.update_layout(showlegend=False)
-    
-    # 2. Pie Chart - Emission Distribution
-    pie_fig = px.pie(
-        values=country_emissions.values,
-        names=country_emissions.index,
-        title="Carbon Emission Distribution by Country"
-    )
-    
-    # 3. Line Graph - Emissions Over Time
-    yearly_emissions = data.groupby('Year')['Carbon_Emissions'].sum().reset_index()
-    line_fig = px.line(
-        yearly_emissions,
-        x='Year',
-        y='Carbon_Emissions',
-        title="Carbon Emissions Trend Over Time",
-        markers=True
-    )
-    line_fig.update_traces(line=dict(width=3))
-    
-    # 4. Area Chart - Cumulative Emissions
-    yearly_emissions['Cumulative'] = yearly_emissions['Carbon_Emissions'].cumsum()
-    area_fig = px.area(
-        yearly_emissions,
-        x='Year', 
-        y='Cumulative',
-        title="Cumulative Carbon Emissions Over Time"
-    )
-    
-    return bar_fig, pie_fig, line_fig, area_fig
+@st.cache_resource(show_spinner=False)
+def get_bundled_artifacts():
+    """Load the precomputed artifacts for the bundled dataset once per process"""
+    return load_artifacts()
+
+@st.cache_resource(show_spinner=False)
+def get_job_scheduler() -> JobScheduler:
+    """Background job scheduler shared by every session in this process"""
+    return JobScheduler()
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    """Persistent result cache shared by every session and worker process"""
+    try:
+        return ResultCache()
+    except (OSError, sqlite3.Error):
+        # Read-only app directory: keep the cache in the temp dir instead
+        return ResultCache(os.path.join(tempfile.gettempdir(), "carbon_results.sqlite"))
+
+@st.cache_resource(show_spinner=False)
+def get_ledger_writer() -> LedgerWriter:
+    """Process-wide ledger batcher, so records from every session share batches"""
+    try:
+        api_key = st.secrets.get("CROSSMINT_API_KEY", "")
+    except Exception:
+        api_key = ""
+    return LedgerWriter(api_key=api_key)
+
+def run_analysis_job(job: Job, analyzer: CarbonEmissionAnalyzer, cache: ResultCache,
+                     data: pd.DataFrame) -> Dict[str, Any]:
+    """Background job wrapper around the analyzer, served from the cache when possible"""
+    job.update(0.1, "Checking result cache")
+    key = cache.key("analysis", "agentic", ANALYSIS_VERSION, frame_fingerprint(data))
+    results = cache.get(key)
+    if results is None:
+        job.update(0.2, "Analyzing emissions data")
+        results = analyzer.analyze_with_mistral(data, progress=job.update)
+        job.update(0.95, "Saving results")
+        # A fallback after a failure is not cached, so the next run tries again
+        if "error" not in results:
+            cache.put(key, results)
+    return results
+
+@st.cache_resource(show_spinner=False)
+def get_analyzer() -> CarbonEmissionAnalyzer:
+    """Build the analyzer and its Coral integration once per process"""
+    return CarbonEmissionAnalyzer(get_bundled_artifacts())
+
+def submit_ledger_record(ledger: LedgerWriter, kind: str, payload: Dict, message: str):
+    """Queue a record for the ledger and confirm with its record hash"""
+    if not ledger.enabled:
+        st.info("💡 Set CARBON_LEDGER_URL to submit records to the blockchain ledger")
+        return
+    record_id = ledger.submit(kind, payload, owner=st.session_state.ledger_owner)
+    st.success(message)
+    st.caption(f"Record hash: 0x{record_id}")
 
 def create_metric_cards(data: pd.DataFrame, analysis: Dict):
     """Create metric cards for key statistics"""
+    metrics = dataset_metrics(data)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -457,7 +586,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Total Emissions</h3>
             <h2>{:.2f} units</h2>
         </div>
-        """.format(data['Carbon_Emissions'].sum()), unsafe_allow_html=True)
+        """.format(metrics['total_emissions']), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
@@ -465,7 +594,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Countries Analyzed</h3>
             <h2>{}</h2>
         </div>
-        """.format(len(data['Country'].unique())), unsafe_allow_html=True)
+        """.format(metrics['countries']), unsafe_allow_html=True)
     
     with col3:
         st.markdown("""
@@ -473,7 +602,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Years Covered</h3>
             <h2>{}</h2>
         </div>
-        """.format(data['Year'].nunique()), unsafe_allow_html=True)
+        """.format(metrics['years']), unsafe_allow_html=True)
     
     with col4:
         st.markdown("""
@@ -483,108 +612,377 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
         </div>
         """.format(analysis['tree_impact']['trees_needed']), unsafe_allow_html=True)
 
-def display_multi_agent_insights(coral: CoralProtocolIntegration, data: pd.DataFrame):
-    """Display insights from multiple Coral Protocol agents"""
+def run_agent_job(job: Job, coral: CoralProtocolIntegration, cache: ResultCache, session_id: str, agent_id: str,
+                  message: AgentMessage, data: pd.DataFrame) -> AgentResponse:
+    """Background job wrapper around an agent consultation, served from the cache when possible"""
+    job.update(0.1, "Checking result cache")
+    key = cache.key("agent", WIRE_VERSION, AGENT_RESPONSE_VERSION, agent_id, message.to_list(), frame_fingerprint(data))
+    cached = cache.get(key)
+    if cached is not None:
+        coral.calls.record_cached(session_id, agent_id)
+        return AgentResponse.from_list(cached)
+    job.update(0.2, "Waiting for agent response")
+    # Only successful responses get here; failures raise and fail the job
+    response = coral.query_agent(session_id, agent_id, message, data)
+    cache.put(key, response.to_list())
+    return response
+
+def run_thread_job(job: Job, coral: CoralProtocolIntegration, thread_config: Dict, data: pd.DataFrame):
+    """Background job running a collaboration thread's agent DAG"""
+    job.update(0.05, "Starting agents")
+    run = coral.run_collaboration_thread(
+        thread_config, data, on_progress=lambda settled, total: job.update(settled / total, f"{settled}/{total} agents finished")
+    )
+    return thread_config, run
+
+def display_thread_run(thread_config: Dict, run: DagRun):
+    """Per-agent timings and critical path of a finished collaboration thread"""
+    if run.succeeded:
+        st.success(f"✅ Climate action thread completed: {thread_config['thread_id']}")
+    else:
+        st.warning(f"⚠️ Climate action thread finished with errors: {thread_config['thread_id']}")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Critical Path", f"{run.critical_path_latency * 1000:,.0f} ms")
+    with col2:
+        st.metric("Sequential Equivalent", f"{run.serial_time * 1000:,.0f} ms")
+    with col3:
+        st.metric("Agents on Critical Path", len(run.critical_path()))
+    
+    st.write("**Critical path:** " + " → ".join(run.critical_path()))
+    st.dataframe(pd.DataFrame(run.summary()["nodes"]), hide_index=True)
+    with st.expander("Thread configuration"):
+        st.json(thread_config)
+
+def consult_agent(coral: CoralProtocolIntegration, scheduler: JobScheduler, agent_id: str, message: AgentMessage,
+                  data: pd.DataFrame, label: str, key: str, progress_label: str):
+    """Button that consults an agent in the background; returns its latest response"""
+    job_key = f"{key}_job"
+    if st.button(label, key=key):
+        scheduler.cancel(st.session_state.get(job_key))
+        st.session_state[job_key] = scheduler.submit(
+            run_agent_job, coral, get_result_cache(), st.session_state.coral_session_id, agent_id, message, data,
+            kind=agent_id
+        )
+    
+    job = poll_job(scheduler, st.session_state.get(job_key), progress_label)
+    if job is None or not job.finished:
+        return None
+    if job.status == FAILED:
+        st.warning(f"⚠️ {job.error}")
+        return AgentResponse.failure(agent_id, job.error)
+    return job.result
+
+@st.fragment
+def display_multi_agent_insights(coral: CoralProtocolIntegration, scheduler: JobScheduler, data: pd.DataFrame):
+    """Display insights from multiple Coral Protocol agents; consulting one reruns only this fragment"""
     st.subheader("🤝 Multi-Agent Climate Analysis")
     
     # Create tabs for different agent responses
     tab1, tab2, tab3, tab4 = st.tabs(["🌳 Tree Planning", "📋 Policy", "⚡ Energy", "💰 Carbon Trading"])
     
     with tab1:
-        if st.button("🌳 Consult Tree Planting Agent", key="tree_agent"):
-            with st.spinner("🌱 Consulting tree planting specialist..."):
-                message = {"task": "optimize_tree_planting", "data_summary": "carbon_emissions_analysis"}
-                response = coral.send_agent_message("tree_planting_agent", message, data)
-                
-                if response["status"] == "success":
-                    tree_data = response["response"]
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.success(f"🤖 **{response['agent']}** Response:")
-                        st.write(f"**Trees Needed:** {tree_data['recommended_trees']:,}")
-                        st.write(f"**Estimated Cost:** ${tree_data['cost_estimate']:,.2f}")
-                        st.write(f"**CO₂ Absorption:** {tree_data['co2_absorption_rate']}")
-                        
-                    with col2:
-                        st.write("**Recommended Species:**")
-                        for species in tree_data['optimal_species']:
-                            st.write(f"• {species}")
-                        
-                        st.write("**Best Locations:**")
-                        for location in tree_data['planting_locations']:
-                            st.write(f"• {location}")
+        message = AgentMessage("tree_planting_agent", AGENT_TASKS["tree_planting_agent"])
+        response = consult_agent(coral, scheduler, "tree_planting_agent", message, data,
+                                 "🌳 Consult Tree Planting Agent", "tree_agent", "🌱 Consulting tree planting specialist...")
+
+        if response is not None and response.ok:
+            tree_data = response.result
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                st.success(f"🤖 **{response.agent}** Response:")
+                st.write(f"**Trees Needed:** {tree_data.recommended_trees:,}")
+                st.write(f"**Estimated Cost:** ${tree_data.cost_estimate:,.2f}")
+                st.write(f"**CO₂ Absorption:** {tree_data.co2_lbs_per_tree:g} lbs CO2/year per tree")
+        
+            with col2:
+                st.write("**Recommended Species:**")
+                for species in tree_data.optimal_species:
+                    st.write(f"• {species}")
+        
+                st.write("**Best Locations:**")
+                for location in tree_data.planting_locations:
+                    st.write(f"• {location}")
     
     with tab2:
-        if st.button("📋 Consult Policy Agent", key="policy_agent"):
-            with st.spinner("🏛️ Consulting climate policy advisor..."):
-                message = {"task": "policy_recommendations", "data_summary": "carbon_emissions_analysis"}
-                response = coral.send_agent_message("policy_agent", message, data)
-                
-                if response["status"] == "success":
-                    policy_data = response["response"]
-                    
-                    st.success(f"🤖 **{response['agent']}** Response:")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write("**Priority Countries:**")
-                        for country in policy_data['priority_countries']:
-                            st.write(f"• {country}")
-                            
-                        st.write(f"**Estimated Reduction:** {policy_data['estimated_reduction']}")
-                        st.write(f"**Implementation Cost:** {policy_data['implementation_cost']}")
-                    
-                    with col2:
-                        st.write("**Recommended Policies:**")
-                        for policy in policy_data['recommended_policies']:
-                            st.write(f"• {policy}")
+        message = AgentMessage("policy_agent", AGENT_TASKS["policy_agent"])
+        response = consult_agent(coral, scheduler, "policy_agent", message, data,
+                                 "📋 Consult Policy Agent", "policy_agent", "🏛️ Consulting climate policy advisor...")
+
+        if response is not None and response.ok:
+            policy_data = response.result
+        
+            st.success(f"🤖 **{response.agent}** Response:")
+        
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**Priority Countries:**")
+                for country in policy_data.priority_countries:
+                    st.write(f"• {country}")
+        
+                st.write(f"**Estimated Reduction:** {format_range(policy_data.reduction_range, '%', 100)} over {policy_data.reduction_years} years")
+                st.write(f"**Implementation Cost:** {format_usd(policy_data.implementation_cost_usd)} globally")
+                if policy_data.baseline_growth_rate is not None:
+                    st.write(f"**Baseline Trend:** {policy_data.baseline_growth_rate:+.1f}% over the period")
+        
+            with col2:
+                st.write("**Recommended Policies:**")
+                for policy in policy_data.recommended_policies:
+                    st.write(f"• {policy}")
     
     with tab3:
-        if st.button("⚡ Consult Energy Agent", key="energy_agent"):
-            with st.spinner("🔋 Consulting renewable energy planner..."):
-                message = {"task": "renewable_energy_planning", "data_summary": "carbon_emissions_analysis"}
-                response = coral.send_agent_message("renewable_energy_agent", message, data)
-                
-                if response["status"] == "success":
-                    energy_data = response["response"]
-                    
-                    st.success(f"🤖 **{response['agent']}** Response:")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Renewable Potential:** {energy_data['renewable_potential']}")
-                        st.write(f"**Investment Needed:** {energy_data['investment_needed']}")
-                        st.write(f"**Timeline:** {energy_data['timeline']}")
-                        st.write(f"**Job Creation:** {energy_data['job_creation']}")
-                    
-                    with col2:
-                        st.write("**Recommended Energy Mix:**")
-                        for source, percentage in energy_data['recommended_mix'].items():
-                            st.write(f"• {source}: {percentage}")
+        message = AgentMessage("renewable_energy_agent", AGENT_TASKS["renewable_energy_agent"])
+        response = consult_agent(coral, scheduler, "renewable_energy_agent", message, data,
+                                 "⚡ Consult Energy Agent", "energy_agent", "🔋 Consulting renewable energy planner...")
+
+        if response is not None and response.ok:
+            energy_data = response.result
+        
+            st.success(f"🤖 **{response.agent}** Response:")
+        
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"**Renewable Potential:** {energy_data.offset_share:.0%} of current emissions could be offset")
+                st.write(f"**Investment Needed:** {format_usd(energy_data.investment_usd)} globally")
+                st.write(f"**Timeline:** {format_range(energy_data.timeline_years)} years for full deployment")
+                st.write(f"**Job Creation:** {energy_data.jobs_created / 1e6:g} million jobs globally")
+        
+            with col2:
+                st.write("**Recommended Energy Mix:**")
+                for source, share in energy_data.recommended_mix.items():
+                    st.write(f"• {source}: {share:.0%}")
     
     with tab4:
-        if st.button("💰 Consult Trading Agent", key="trading_agent"):
-            with st.spinner("📈 Consulting carbon credit optimizer..."):
-                message = {"task": "carbon_credit_optimization", "data_summary": "carbon_emissions_analysis"}
-                response = coral.send_agent_message("carbon_trading_agent", message, data)
-                
-                if response["status"] == "success":
-                    trading_data = response["response"]
-                    
-                    st.success(f"🤖 **{response['agent']}** Response:")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Current Carbon Price:** {trading_data['current_carbon_price']}")
-                        st.write(f"**Total Offset Cost:** {trading_data['total_offset_cost']}")
-                        st.write(f"**Market Trend:** {trading_data['market_trend']}")
-                    
-                    with col2:
-                        st.write(f"**Strategy:** {trading_data['recommended_strategy']}")
-                        st.write("**Best Credit Sources:**")
-                        for source in trading_data['best_credit_sources']:
-                            st.write(f"• {source}")
+        message = AgentMessage("carbon_trading_agent", AGENT_TASKS["carbon_trading_agent"])
+        response = consult_agent(coral, scheduler, "carbon_trading_agent", message, data,
+                                 "💰 Consult Trading Agent", "trading_agent", "📈 Consulting carbon credit optimizer...")
+
+        if response is not None and response.ok:
+            trading_data = response.result
+        
+            st.success(f"🤖 **{response.agent}** Response:")
+        
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"**Current Carbon Price:** ${trading_data.carbon_price_usd:g}/ton CO2")
+                st.write(f"**Total Offset Cost:** ${trading_data.total_offset_cost_usd:,.2f}")
+                st.write(f"**Market Trend:** Increasing demand, prices rising {trading_data.annual_price_growth:.0%} annually")
+        
+            with col2:
+                st.write(f"**Strategy:** Buy {trading_data.verified_credit_share:.0%} verified credits, "
+                         f"invest {1 - trading_data.verified_credit_share:.0%} in projects")
+                st.write("**Best Credit Sources:**")
+                for source in trading_data.best_credit_sources:
+                    st.write(f"• {source}")
+
+@st.fragment
+def charts_section(data: pd.DataFrame, bundle: ArtifactBundle, cache: ResultCache):
+    """Charts, world map and intensity rankings; their widgets rerun only this fragment"""
+    # Create visualizations
+    if bundle is not None and bundle.is_bundled(data):
+        bar_fig, pie_fig, line_fig, area_fig = bundle.figure_tuple()
+    else:
+        bar_fig, pie_fig, line_fig, area_fig = cached_visualizations(data, cache)
+    
+    # Region levels are lookups in the precomputed rollup; the area chart stays global
+    chart_level = st.radio("Group emissions by", LEVELS[:-1], horizontal=True, key="chart_level")
+    anomalies = anomalies_for(data)
+    if chart_level != "Country":
+        bar_fig, pie_fig, line_fig = level_figures(rollup_for(data, bundle), chart_level)
+    else:
+        line_fig = flag_trend_figure(line_fig, anomalies)
+    
+    # Display charts in tabs
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Bar Chart", "🥧 Pie Chart", "📈 Line Graph", "📏 Area Chart",
+                                            "🗺️ World Map"])
+    
+    with tab1:
+        st.plotly_chart(bar_fig, use_container_width=True)
+    
+    with tab2:
+        st.plotly_chart(pie_fig, use_container_width=True)
+    
+    with tab3:
+        st.plotly_chart(line_fig, use_container_width=True)
+    
+    with tab4:
+        st.plotly_chart(area_fig, use_container_width=True)
+    
+    with tab5:
+        map_section(rollup_for(data, bundle), frame_fingerprint(data), cache)
+    
+    # Per-capita, per-GDP and per-energy rankings from the local reference tables
+    st.subheader("📐 Emission Intensity")
+    intensity_section(enrichment_for(data, cache=cache), chart_level)
+    
+    # Zeros, jumps, duplicate years and outliers that would skew the numbers above
+    st.subheader("🚩 Data Anomalies")
+    anomaly_section(anomalies)
+
+@st.fragment
+def focus_section(analyzer: CarbonEmissionAnalyzer, data: pd.DataFrame):
+    """Analysis of a chosen subset; changing the filters reruns only this fragment"""
+    index = panel_index_for(data)
+    first, last = int(index.years[0]), int(index.years[-1])
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        countries = st.multiselect("Countries", index.countries, key="focus_countries", placeholder="All countries")
+    with col2:
+        years = st.select_slider("Years", options=index.years.tolist(), value=(first, last),
+                                 key="focus_years") if first < last else (first, last)
+    min_emissions = None
+    if st.checkbox("Only records at or above a threshold", key="focus_threshold",
+                   help="A record-level filter cannot use the cached aggregates and scans the rows"):
+        min_emissions = st.number_input("Minimum emissions per record", min_value=0.0, value=0.0, key="focus_min")
+    if not countries and tuple(years) == (first, last) and min_emissions is None:
+        st.caption("Pick countries, a year window or a threshold to analyze a subset")
+        return
+    
+    analysis = analyzer.analyze_subset(data, countries, tuple(years), min_emissions)
+    if analysis.get("error"):
+        st.warning(f"⚠️ {analysis['error']}; showing basic statistics instead")
+    subset = analysis["subset"]
+    stats = subset["summary"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Subset Emissions", f"{stats['total_emissions']:,.2f}")
+    col2.metric("Countries", f"{stats['total_countries']:,}")
+    col3.metric("Records", f"{stats['records']:,}")
+    col4.metric("Growth Rate", f"{stats['trend_analysis']['growth_rate']:+.1f}%")
+    icon = "⚡" if subset["path"] == PATH_CACHED else "🔍"
+    st.caption(f"{icon} From {subset['path']} ({subset['reason']}) in {subset['milliseconds']:.1f} ms")
+    if stats["top_emitters"]:
+        st.bar_chart(pd.Series(stats["top_emitters"], name="Carbon_Emissions"))
+    st.write(f"🌳 **{analysis['tree_impact']['trees_needed']:,} trees** would offset this subset")
+
+@st.fragment
+def voice_section(voice: VoiceSynthesizer, data: pd.DataFrame, analysis: Dict):
+    """Voice summary button; generating audio reruns only this fragment"""
+    if st.button("🔊 Generate Voice Summary", key="voice_summary"):
+        with st.spinner("🎵 Generating voice summary..."):
+            metrics = dataset_metrics(data)
+            summary_text = f"Multi-agent analysis complete. Total emissions: {metrics['total_emissions']:.2f} units across {metrics['countries']} countries. {analysis['tree_impact']['trees_needed']:,} trees needed for offset. Four specialized agents provided coordinated recommendations for climate action."
+            play_summary(voice, summary_text)
+
+@st.fragment
+def ledger_section(ledger: LedgerWriter, scheduler: JobScheduler, data: pd.DataFrame, analysis: Dict):
+    """Blockchain and NFT buttons and receipts"""
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("💾 Store Analysis on Blockchain", key="blockchain_store"):
+            submit_ledger_record(ledger, "analysis", {
+                "dataset": frame_fingerprint(data),
+                "analysis": analysis,
+            }, "📦 Analysis queued for the next blockchain batch")
+    
+    with col2:
+        if st.button("🏆 Mint Carbon Credit NFT", key="mint_nft"):
+            submit_ledger_record(ledger, "carbon_credit_nft", {
+                "dataset": frame_fingerprint(data),
+                "tree_impact": analysis['tree_impact'],
+            }, "🎨 Carbon credit NFT queued for minting")
+    
+    with col3:
+        if st.button("🤝 Create Agent Collaboration NFT", key="agent_nft"):
+            consulted = {key: scheduler.result(st.session_state.get(f"{key}_job"))
+                         for key in ("tree_agent", "policy_agent", "energy_agent", "trading_agent")}
+            submit_ledger_record(ledger, "agent_collaboration_nft", {
+                "dataset": frame_fingerprint(data),
+                "session": st.session_state.coral_session_id,
+                "agents": {key: result.to_list() for key, result in consulted.items() if result is not None},
+            }, "🤖 Multi-agent collaboration NFT queued for minting")
+    show_ledger_receipts(ledger, st.session_state.ledger_owner)
+
+@st.fragment
+def thread_section(coral: CoralProtocolIntegration, scheduler: JobScheduler, data: pd.DataFrame):
+    """Launch button and results of the collaboration thread"""
+    if st.button("🤝 Launch Climate Action Thread", key="create_thread"):
+        thread_config = coral.create_agent_collaboration_thread([
+            "carbon_analyzer_agent",
+            "tree_planting_agent", 
+            "policy_agent",
+            "renewable_energy_agent",
+            "carbon_trading_agent"
+        ], st.session_state.coral_session_id)
+        st.session_state.threads_launched += 1
+        scheduler.cancel(st.session_state.get("thread_job"))
+        st.session_state.thread_job = scheduler.submit(
+            run_thread_job, coral, thread_config, data, kind="thread"
+        )
+    
+    job = poll_job(scheduler, st.session_state.get("thread_job"), "🌐 Running multi-agent collaboration thread...")
+    if job is not None and job.status == FAILED:
+        st.error(f"Collaboration thread failed: {job.error}")
+    elif job is not None and job.status == DONE:
+        display_thread_run(*job.result)
+
+@st.fragment
+def downloads_section(coral: CoralProtocolIntegration, data: pd.DataFrame, analysis: Dict):
+    """Download buttons; payloads are built and serialized on click and cached by content"""
+    session_id = st.session_state.coral_session_id
+    
+    def enhanced_results():
+        # Analysis plus the Coral Protocol info of this session
+        results = analysis.copy()
+        results['coral_protocol'] = {
+            "agents_used": ["tree_planting_agent", "policy_agent", "renewable_energy_agent", "carbon_trading_agent"],
+            "collaboration_session": session_id,
+            "server_url": coral.coral_server_url,
+            "mcp_protocol": "enabled"
+        }
+        return results
+    
+    threads_launched = st.session_state.threads_launched
+    
+    def agent_report():
+        # Usage and timestamp are read when the report is downloaded
+        usage = coral.calls.usage(session_id).to_dict()
+        return {
+            "session_id": session_id,
+            "agents_consulted": usage["agents_consulted"],
+            "total_recommendations": 15,
+            "collaboration_timestamp": datetime.now().isoformat(),
+            "coral_tokens_used": usage["tokens_used"],
+            "collaboration_threads": threads_launched,
+            "agent_usage": usage
+        }
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        pretty_json = st.checkbox("Pretty-print JSON", value=False, key="pretty_json")
+        st.download_button(
+            label="📊 Download Analysis (JSON)",
+            data=lazy_json(enhanced_results, (input_key(analysis), session_id, coral.coral_server_url),
+                           compact=not pretty_json),
+            file_name="carbon_analysis_coral_enhanced.json",
+            mime="application/json"
+        )
+    
+    with col2:
+        export_formats = available_export_formats()
+        export_format = st.selectbox(
+            "Data format",
+            list(export_formats),
+            format_func=lambda fmt: export_formats[fmt]["label"],
+            key="export_format"
+        )
+        st.download_button(
+            label=f"📈 Download Data ({export_formats[export_format]['label']})",
+            data=lazy_export(data, export_format),
+            file_name=export_file_name("carbon_emissions_data", export_format),
+            mime=export_formats[export_format]["mime"]
+        )
+    
+    with col3:
+        st.download_button(
+            label="🤖 Download Agent Report",
+            data=lazy_json(agent_report, None, compact=not pretty_json),
+            file_name="coral_agent_collaboration_report.json",
+            mime="application/json"
+        )
 
 def main():
     # Header
@@ -592,7 +990,11 @@ def main():
     st.markdown("### Powered by Coral Protocol Multi-Agent System")
     
     # Initialize analyzer
-    analyzer = CarbonEmissionAnalyzer()
+    bundle = get_bundled_artifacts()
+    analyzer = get_analyzer()
+    scheduler = get_job_scheduler()
+    cache = get_result_cache()
+    ledger = get_ledger_writer()
     
     # Initialize session state
     if 'data_uploaded' not in st.session_state:
@@ -601,6 +1003,16 @@ def main():
         st.session_state.data_analyzed = False
     if 'analysis_results' not in st.session_state:
         st.session_state.analysis_results = None
+    if 'analysis_job' not in st.session_state:
+        st.session_state.analysis_job = None
+    if 'threads_launched' not in st.session_state:
+        st.session_state.threads_launched = 0
+    if 'ledger_owner' not in st.session_state:
+        st.session_state.ledger_owner = uuid.uuid4().hex
+    # The Coral integration is shared by the whole process, so the
+    # collaboration session id lives with the user's session instead
+    if 'coral_session_id' not in st.session_state:
+        st.session_state.coral_session_id = analyzer.coral.new_session_id()
     
     # Sidebar
     with st.sidebar:
@@ -647,34 +1059,47 @@ ELEVENLABS_API_KEY = "your_key_here"''')
     
     # Option 2: Sample Data
     if st.button("🎯 Use Sample Data", key="sample_data"):
-        # Create sample data
-        sample_data = {
-            'Country': ['USA', 'China', 'India', 'Russia', 'Japan'] * 10,
-            'Year': [2020, 2021, 2022, 2020, 2021] * 10,
-            'Carbon_Emissions': np.random.uniform(100, 1000, 50)
-        }
-        st.session_state.df = pd.DataFrame(sample_data)
+        # Seeded synthetic panel, identical on every click
+        st.session_state.df = pin_frame(synthetic_frame(SAMPLE_ROWS, seed=SAMPLE_SEED))
         st.session_state.data_uploaded = True
-        st.success("✅ Sample data loaded successfully!")
+        st.success(f"✅ Sample data loaded ({SAMPLE_ROWS:,} synthetic records)!")
+    
+    # Option 3: Bundled Dataset
+    if st.button("🌍 Use Bundled Dataset", key="bundled_data"):
+        st.session_state.df = pin_frame(bundle.data if bundle is not None else pd.read_csv(BUNDLED_CSV))
+        st.session_state.data_uploaded = True
+        st.success(f"✅ Bundled dataset loaded ({len(st.session_state.df):,} records)!")
     
     if uploaded_file is not None:
         try:
             df = pd.read_csv(uploaded_file)
             
-            # Validate columns
-            required_columns = ['Country', 'Year', 'Carbon_Emissions']
-            if all(col in df.columns for col in required_columns):
-                st.session_state.df = df
+            # Validate and clean in one pass
+            df, report = validate_emissions(df)
+            if len(df) == 0:
+                st.error(f"❌ No valid rows found in {report.rows_in:,} uploaded rows")
+            else:
+                st.session_state.df = pin_frame(df)
                 st.session_state.data_uploaded = True
+                if report.errors:
+                    st.warning(f"⚠️ {report.rows_dropped:,} of {report.rows_in:,} rows were dropped during validation")
                 st.success("✅ Data uploaded successfully!")
                 st.write("Data Preview:", df.head())
-            else:
-                st.error(f"❌ Missing required columns. Found: {list(df.columns)}")
+            
+            if report.has_issues:
+                with st.expander("🧹 Validation Report", expanded=len(df) == 0):
+                    st.dataframe(report.to_frame(), hide_index=True)
                 
+        except ValidationError as e:
+            st.error(f"❌ {str(e)}")
         except Exception as e:
             st.error(f"❌ Error loading file: {str(e)}")
     
     st.markdown('</div>', unsafe_allow_html=True)
+
+    # Revision comparison across several inventories
+    with st.expander("🔀 Compare Inventories"):
+        st.fragment(comparison_section)(st.session_state.df if st.session_state.data_uploaded else None)
     
     # Section 2: Data Analysis
     if st.session_state.data_uploaded:
@@ -682,11 +1107,28 @@ ELEVENLABS_API_KEY = "your_key_here"''')
         st.header("🔍 Step 2: Analyze Data with AI Agents")
         
         if st.button("🤖 Analyze with Multi-Agent System", key="analyze_data"):
-            with st.spinner("🧠 AI agents are collaborating on your data..."):
-                # Perform AI analysis
-                st.session_state.analysis_results = analyzer.analyze_with_mistral(st.session_state.df)
+            # Run the analysis in the background so the page stays responsive
+            scheduler.cancel(st.session_state.analysis_job)
+            st.session_state.analysis_job = scheduler.submit(
+                run_analysis_job, analyzer, cache, st.session_state.df, kind="analysis"
+            )
+        
+        job = poll_job(scheduler, st.session_state.analysis_job, "🧠 AI agents are collaborating on your data...")
+        if job is not None and job.finished:
+            if job.status == DONE:
+                st.session_state.analysis_results = job.result
                 st.session_state.data_analyzed = True
+                if job.result.get("error"):
+                    st.warning(f"⚠️ {job.result['error']}; showing basic statistics instead")
                 st.success("✅ Multi-agent analysis completed!")
+            elif job.status == FAILED:
+                st.error(f"❌ Analysis failed: {job.error}")
+            else:
+                st.info("Analysis cancelled")
+            st.session_state.analysis_job = None
+        elif job is not None and wants_preview(st.session_state.df):
+            # Large upload: approximate numbers right away, replaced by the exact results when the job finishes
+            preview_section(preview_for(st.session_state.df))
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -697,29 +1139,17 @@ ELEVENLABS_API_KEY = "your_key_here"''')
         
         # Metric Cards
         create_metric_cards(st.session_state.df, st.session_state.analysis_results)
+        headline_warning(st.session_state.analysis_results.get("anomalies", {}))
         
         st.subheader("📈 Data Visualizations")
         
-        # Create visualizations
-        bar_fig, pie_fig, line_fig, area_fig = create_visualizations(st.session_state.df)
+        charts_section(st.session_state.df, bundle, cache)
         
-        # Display charts in tabs
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Bar Chart", "🥧 Pie Chart", "📈 Line Graph", "📏 Area Chart"])
-        
-        with tab1:
-            st.plotly_chart(bar_fig, use_container_width=True)
-        
-        with tab2:
-            st.plotly_chart(pie_fig, use_container_width=True)
-        
-        with tab3:
-            st.plotly_chart(line_fig, use_container_width=True)
-        
-        with tab4:
-            st.plotly_chart(area_fig, use_container_width=True)
+        st.subheader("🔎 Focus on a Subset")
+        focus_section(analyzer, st.session_state.df)
         
         # Multi-Agent Insights Section
-        display_multi_agent_insights(analyzer.coral, st.session_state.df)
+        display_multi_agent_insights(analyzer.coral, scheduler, st.session_state.df)
         
         # AI Insights
         st.subheader("🧠 Primary AI Analysis")
@@ -746,48 +1176,35 @@ ELEVENLABS_API_KEY = "your_key_here"''')
             for sector, priority in st.session_state.analysis_results['sector_priorities'].items():
                 st.write(f"• **{sector}**: {priority}")
         
+        context_section(st.session_state.analysis_results.get('llm_context'))
+        
+        # Offset planning: re-solved as the sliders move, without rerunning the page
+        st.subheader("🌲 Offset Planting Plan")
+        st.fragment(planting_section)(dataset_metrics(st.session_state.df)['total_emissions'])
+        
         # Coral Protocol Agent Collaboration
         st.subheader("🐠 Agent Collaboration Summary")
         if st.session_state.analysis_results.get('coral_agents_engaged', False):
             st.success("✅ Multi-agent system successfully engaged!")
             
+            usage = analyzer.coral.calls.usage(st.session_state.coral_session_id)
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Agents Consulted", "4", "🤖")
+                st.metric("Agents Consulted", usage.agents_consulted, "🤖")
             with col2:
-                st.metric("Collaboration Threads", "1", "🧵")
+                st.metric("Collaboration Threads", st.session_state.threads_launched, "🧵")
             with col3:
-                st.metric("CORAL Tokens Used", "0.7", "🪙")
+                st.metric("CORAL Tokens Used", f"{usage.spent:g}", f"{usage.remaining:g} left", delta_color="off")
         else:
             st.info("💡 Enable Coral Protocol server for full multi-agent collaboration")
         
-        # Voice Summary (ElevenLabs integration placeholder)
+        # Voice Summary (ElevenLabs text-to-speech, cached on disk)
         st.subheader("🎙️ Voice Summary")
-        if st.button("🔊 Generate Voice Summary", key="voice_summary"):
-            with st.spinner("🎵 Generating voice summary..."):
-                summary_text = f"Multi-agent analysis complete. Total emissions: {st.session_state.df['Carbon_Emissions'].sum():.2f} units across {len(st.session_state.df['Country'].unique())} countries. {st.session_state.analysis_results['tree_impact']['trees_needed']:,} trees needed for offset. Four specialized agents provided coordinated recommendations for climate action."
-                st.success("🎵 Voice summary ready!")
-                st.write("**Summary Text:**", summary_text)
-                st.info("💡 Connect ElevenLabs API to generate actual voice audio")
-        
-        # Blockchain Integration (Crossmint placeholder)
-        st.subheader("⛓️ Blockchain & NFT Integration")
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if st.button("💾 Store Analysis on Blockchain", key="blockchain_store"):
-                st.success("📦 Analysis data stored on blockchain via Crossmint!")
-                st.info("Hash: 0x1a2b3c4d5e6f...")
-        
-        with col2:
-            if st.button("🏆 Mint Carbon Credit NFT", key="mint_nft"):
-                st.success("🎨 Carbon credit NFT minted!")
-                st.info("NFT ID: #CC2024001")
+        voice_section(analyzer.voice, st.session_state.df, st.session_state.analysis_results)
         
-        with col3:
-            if st.button("🤝 Create Agent Collaboration NFT", key="agent_nft"):
-                st.success("🤖 Multi-agent collaboration NFT created!")
-                st.info("Agents: 5 | Session: CC-COLLAB-001")
+        # Blockchain Integration (Merkle-batched ledger records via Crossmint)
+        st.subheader("⛓️ Blockchain & NFT Integration")
+        ledger_section(ledger, scheduler, st.session_state.df, st.session_state.analysis_results)
         
         # Coral Protocol Specific Features
         st.subheader("🐠 Coral Protocol Features")
@@ -811,69 +1228,13 @@ ELEVENLABS_API_KEY = "your_key_here"''')
             
         # Create Agent Collaboration Thread
         st.subheader("🧵 Create Multi-Agent Thread")
-        if st.button("🤝 Launch Climate Action Thread", key="create_thread"):
-            with st.spinner("🌐 Creating multi-agent collaboration thread..."):
-                thread_config = analyzer.coral.create_agent_collaboration_thread([
-                    "carbon_analyzer_agent",
-                    "tree_planting_agent", 
-                    "policy_agent",
-                    "renewable_energy_agent",
-                    "carbon_trading_agent"
-                ])
-                st.success(f"✅ Climate action thread created: {thread_config['thread_id']}")
-                st.json(thread_config)
+        thread_section(analyzer.coral, scheduler, st.session_state.df)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Download Results
         st.subheader("⬇️ Download Results")
-        
-        # Prepare enhanced download data with Coral Protocol info
-        enhanced_results = st.session_state.analysis_results.copy()
-        enhanced_results['coral_protocol'] = {
-            "agents_used": ["tree_planting_agent", "policy_agent", "renewable_energy_agent", "carbon_trading_agent"],
-            "collaboration_session": analyzer.coral.session_id,
-            "server_url": analyzer.coral.coral_server_url,
-            "mcp_protocol": "enabled"
-        }
-        
-        results_json = json.dumps(enhanced_results, indent=2)
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.download_button(
-                label="📊 Download Analysis (JSON)",
-                data=results_json,
-                file_name="carbon_analysis_coral_enhanced.json",
-                mime="application/json"
-            )
-        
-        with col2:
-            csv_buffer = io.StringIO()
-            st.session_state.df.to_csv(csv_buffer, index=False)
-            st.download_button(
-                label="📈 Download Data (CSV)",
-                data=csv_buffer.getvalue(),
-                file_name="carbon_emissions_data.csv",
-                mime="text/csv"
-            )
-        
-        with col3:
-            # Create agent collaboration report
-            agent_report = {
-                "session_id": analyzer.coral.session_id,
-                "agents_consulted": 4,
-                "total_recommendations": 15,
-                "collaboration_timestamp": datetime.now().isoformat(),
-                "coral_tokens_used": 0.7
-            }
-            st.download_button(
-                label="🤖 Download Agent Report",
-                data=json.dumps(agent_report, indent=2),
-                file_name="coral_agent_collaboration_report.json",
-                mime="application/json"
-            )
+        downloads_section(analyzer.coral, st.session_state.df, st.session_state.analysis_results)
 
 # Coral Protocol Setup Instructions
 def show_coral_setup():
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+# Sustained queries per second, and burst size, allowed per agent across all sessions
+AGENT_RATE = float(os.environ.get("CARBON_AGENT_RATE", "2"))
+AGENT_BURST = float(os.environ.get("CARBON_AGENT_BURST", "5"))
+# CORAL tokens one session may spend on agent queries
+SESSION_BUDGET = float(os.environ.get("CARBON_SESSION_BUDGET", "5"))
+# Longest a call waits for its agent's rate limit before giving up
+MAX_WAIT = float(os.environ.get("CARBON_AGENT_MAX_WAIT", "10"))
+# Usage of a session idle this long (seconds) is forgotten, so the table stays bounded
+SESSION_IDLE_SECONDS = float(os.environ.get("CARBON_SESSION_IDLE_SECONDS", "3600"))
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised when a query would take a session over its token budget"""
+
+
+class RateLimited(RuntimeError):
+    """Raised when an agent's rate limit would delay a call beyond MAX_WAIT"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a slot and sleep until it is due"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token, returning how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class SessionUsage:
+    """Per-session record of what agent queries actually cost"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.spent = 0.0
+        self.queries: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+        self.cached: Dict[str, int] = {}
+        self.last_used = time.monotonic()
+
+    @property
+    def remaining(self) -> float:
+        return max(self.budget - self.spent, 0.0)
+
+    @property
+    def agents_consulted(self) -> int:
+        return len(set(self.queries) | set(self.coalesced) | set(self.cached))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "agents_consulted": self.agents_consulted,
+            "tokens_used": round(self.spent, 6),
+            "budget": self.budget,
+            "budget_remaining": round(self.remaining, 6),
+            "queries": dict(self.queries),
+            "coalesced": dict(self.coalesced),
+            "cached": dict(self.cached),
+        }
+
+
+class AgentCallScheduler:
+    """Gatekeeper for paid agent queries
+
+    Every query is charged its agent's cost_per_query against the calling
+    session's budget and waits for a token from the agent's bucket. A query
+    identical to one already in flight waits for that result instead of
+    calling the agent again, and is not charged, but only if the session
+    could have paid for it.
+    """
+
+    def __init__(self, costs: Dict[str, float], rate: float = AGENT_RATE, burst: float = AGENT_BURST,
+                 budget: float = SESSION_BUDGET, max_wait: float = MAX_WAIT,
+                 idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.costs = dict(costs)
+        self.rate = rate
+        self.burst = burst
+        self.budget = budget
+        self.max_wait = max_wait
+        self.idle_seconds = idle_seconds
+        self._buckets: Dict[str, TokenBucket] = {}
+        # Least recently used first, so idle sessions are expired from the front
+        self._sessions: "OrderedDict[str, SessionUsage]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def usage(self, session_id: str) -> SessionUsage:
+        with self._lock:
+            now = time.monotonic()
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if now - oldest.last_used < self.idle_seconds:
+                    break
+                self._sessions.popitem(last=False)
+            usage = self._sessions.get(session_id)
+            if usage is None:
+                usage = self._sessions[session_id] = SessionUsage(self.budget)
+            usage.last_used = now
+            self._sessions.move_to_end(session_id)
+            return usage
+
+    def record_cached(self, session_id: str, agent_id: str):
+        """Count a response served from the result cache (free)"""
+        usage = self.usage(session_id)
+        with self._lock:
+            usage.cached[agent_id] = usage.cached.get(agent_id, 0) + 1
+
+    def call(self, session_id: str, agent_id: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn as one query to agent_id, subject to coalescing, budget and rate limit"""
+        usage = self.usage(session_id)
+        with self._lock:
+            leader = self._inflight.get(key)
+            if leader is not None:
+                # Joining another session's call must not get around this session's budget
+                self._check_budget(usage, agent_id)
+            else:
+                future = Future()
+                self._inflight[key] = future
+        if leader is not None:
+            result = leader.result()
+            with self._lock:
+                usage.coalesced[agent_id] = usage.coalesced.get(agent_id, 0) + 1
+            return result
+
+        try:
+            result = self._charged_call(usage, agent_id, fn)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _check_budget(self, usage: SessionUsage, agent_id: str) -> float:
+        """Cost of one query to agent_id, raising if the session cannot afford it; call under the lock"""
+        cost = self.costs.get(agent_id, 0.0)
+        if usage.spent + cost > usage.budget + 1e-9:
+            raise BudgetExceeded(
+                f"{agent_id} costs {cost:g} CORAL tokens but only {usage.remaining:g} remain in this session"
+            )
+        return cost
+
+    def _charged_call(self, usage: SessionUsage, agent_id: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            cost = self._check_budget(usage, agent_id)
+            # Charge up front so concurrent calls cannot overshoot the budget
+            usage.spent += cost
+            bucket = self._buckets.setdefault(agent_id, TokenBucket(self.rate, self.burst))
+
+        try:
+            delay = bucket.reserve()
+            if delay > self.max_wait:
+                bucket.refund()
+                raise RateLimited(f"{agent_id} is rate limited; retry in {delay:.1f}s")
+            if delay:
+                time.sleep(delay)
+            result = fn()
+        except BaseException:
+            with self._lock:
+                usage.spent -= cost
+            raise
+
+        with self._lock:
+            usage.queries[agent_id] = usage.queries.get(agent_id, 0) + 1
+        return result
@@ -0,0 +1,210 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Longest a single agent call may take before its branch is abandoned
+NODE_TIMEOUT = float(os.environ.get("CARBON_AGENT_TIMEOUT", "30"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"
+
+
+class TaskNode:
+    """One task in an orchestration DAG
+
+    fn receives a dict of upstream outputs keyed by dependency name.
+    """
+
+    __slots__ = ("name", "fn", "depends_on", "timeout")
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], depends_on: Sequence[str] = (),
+                 timeout: float = NODE_TIMEOUT):
+        self.name = name
+        self.fn = fn
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+
+class NodeResult:
+    """Outcome and timing of one node, relative to the start of the run"""
+
+    __slots__ = ("name", "status", "output", "error", "started", "finished")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = PENDING
+        self.output: Any = None
+        self.error: Optional[str] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "node": self.name,
+            "status": self.status,
+            "start_ms": round((self.started or 0.0) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+            "error": self.error,
+        }
+
+
+class DagRun:
+    """Results of one DAG execution"""
+
+    def __init__(self, nodes: Dict[str, TaskNode], results: Dict[str, NodeResult], wall_time: float):
+        self.nodes = nodes
+        self.results = results
+        self.wall_time = wall_time
+
+    @property
+    def succeeded(self) -> bool:
+        return all(r.status == DONE for r in self.results.values())
+
+    def outputs(self) -> Dict[str, Any]:
+        return {name: r.output for name, r in self.results.items() if r.status == DONE}
+
+    @property
+    def serial_time(self) -> float:
+        """What the same calls would have cost one after another"""
+        return sum(r.duration for r in self.results.values())
+
+    def critical_path(self) -> List[str]:
+        """Chain of nodes that determined when the run finished
+
+        Walks back from the last node to finish, each step taking the
+        dependency that finished latest.
+        """
+        finished = [r for r in self.results.values() if r.finished is not None]
+        if not finished:
+            return []
+        node = max(finished, key=lambda r: r.finished).name
+        path = [node]
+        while True:
+            deps = [self.results[d] for d in self.nodes[node].depends_on if self.results[d].finished is not None]
+            if not deps:
+                break
+            node = max(deps, key=lambda r: r.finished).name
+            path.append(node)
+        return path[::-1]
+
+    @property
+    def critical_path_latency(self) -> float:
+        path = self.critical_path()
+        return self.results[path[-1]].finished if path else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "nodes": [self.results[name].to_dict() for name in self.nodes],
+            "critical_path": self.critical_path(),
+            "critical_path_ms": round(self.critical_path_latency * 1000, 1),
+            "serial_ms": round(self.serial_time * 1000, 1),
+            "wall_ms": round(self.wall_time * 1000, 1),
+        }
+
+
+def topological_order(nodes: Sequence[TaskNode]) -> List[str]:
+    """Kahn's algorithm; raises ValueError on unknown dependencies or cycles"""
+    by_name = {node.name: node for node in nodes}
+    if len(by_name) != len(nodes):
+        raise ValueError("Duplicate node names in DAG")
+    indegree = {name: 0 for name in by_name}
+    for node in nodes:
+        for dep in node.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Node {node.name!r} depends on unknown node {dep!r}")
+            indegree[node.name] += 1
+    ready = [name for name, degree in indegree.items() if degree == 0]
+    order = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for node in nodes:
+            if name in node.depends_on:
+                indegree[node.name] -= 1
+                if indegree[node.name] == 0:
+                    ready.append(node.name)
+    if len(order) != len(nodes):
+        raise ValueError("DAG contains a cycle")
+    return order
+
+
+def run_dag(nodes: Sequence[TaskNode], max_workers: Optional[int] = None,
+            on_progress: Optional[Callable[[int, int], None]] = None) -> DagRun:
+    """Run every node as soon as its dependencies have produced output
+
+    Independent branches run concurrently. A node that fails or exceeds its
+    timeout marks everything downstream as skipped; other branches carry on.
+    """
+    order = topological_order(nodes)
+    by_name = {node.name: node for node in nodes}
+    results = {name: NodeResult(name) for name in order}
+    running: Dict[Future, str] = {}
+    deadlines: Dict[str, float] = {}
+    start = time.perf_counter()
+    settled = 0
+
+    def _settle(name: str, status: str, error: Optional[str] = None):
+        nonlocal settled
+        result = results[name]
+        result.status = status
+        result.error = error
+        if result.started is not None and result.finished is None:
+            result.finished = time.perf_counter() - start
+        settled += 1
+        if on_progress is not None:
+            on_progress(settled, len(order))
+
+    def _launch(executor: ThreadPoolExecutor):
+        for name in order:
+            result = results[name]
+            if result.status != PENDING:
+                continue
+            deps = [results[d] for d in by_name[name].depends_on]
+            if any(d.status in (FAILED, TIMEOUT, SKIPPED) for d in deps):
+                failed = next(d.name for d in deps if d.status in (FAILED, TIMEOUT, SKIPPED))
+                _settle(name, SKIPPED, f"Upstream {failed} did not complete")
+                continue
+            if all(d.status == DONE for d in deps):
+                inputs = {d.name: d.output for d in deps}
+                result.status = RUNNING
+                result.started = time.perf_counter() - start
+                deadlines[name] = time.perf_counter() + by_name[name].timeout
+                running[executor.submit(by_name[name].fn, inputs)] = name
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(order), thread_name_prefix="carbon-dag")
+    try:
+        _launch(executor)
+        while running:
+            timeout = max(min(deadlines[name] for name in running.values()) - time.perf_counter(), 0)
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name].finished = time.perf_counter() - start
+                try:
+                    results[name].output = future.result()
+                    _settle(name, DONE)
+                except Exception as e:
+                    _settle(name, FAILED, f"{type(e).__name__}: {e}")
+            now = time.perf_counter()
+            for future, name in list(running.items()):
+                if now >= deadlines[name]:
+                    # Threads cannot be killed; the call is abandoned and its result ignored
+                    running.pop(future)
+                    future.cancel()
+                    _settle(name, TIMEOUT, f"Timed out after {by_name[name].timeout:g}s")
+            _launch(executor)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return DagRun(by_name, results, time.perf_counter() - start)
@@ -0,0 +1,206 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import msgpack
+
+# Bump when a record's field layout changes; old payloads are rejected
+WIRE_VERSION = 2
+
+SUCCESS = "success"
+FAILED = "failed"
+
+
+class WireFormatError(ValueError):
+    """Raised when a payload cannot be decoded into a known record"""
+
+
+class _Record:
+    """Slotted record with a positional, msgpack-friendly form
+
+    Fields are raw numbers and strings; units and wording are applied only
+    when a record is rendered.
+    """
+
+    __slots__ = ()
+
+    def to_list(self) -> List[Any]:
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any]):
+        return cls(*values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_list() == other.to_list()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class AgentMessage(_Record):
+    """Request sent to a Coral agent"""
+
+    __slots__ = ("agent_id", "task", "data_summary", "context")
+
+    def __init__(self, agent_id: str, task: str, data_summary: str = "carbon_emissions_analysis",
+                 context: Optional[Dict[str, float]] = None):
+        self.agent_id = agent_id
+        self.task = task
+        self.data_summary = data_summary
+        # Numeric outputs of upstream agents in a collaboration thread
+        self.context = {str(k): float(v) for k, v in (context or {}).items()}
+
+
+class TreePlantingResult(_Record):
+    __slots__ = ("recommended_trees", "optimal_species", "planting_locations", "cost_per_tree",
+                 "co2_lbs_per_tree", "planting_months")
+
+    def __init__(self, recommended_trees: int, optimal_species: Sequence[str], planting_locations: Sequence[str],
+                 cost_per_tree: float, co2_lbs_per_tree: float, planting_months: Sequence[int]):
+        self.recommended_trees = int(recommended_trees)
+        self.optimal_species = tuple(optimal_species)
+        self.planting_locations = tuple(planting_locations)
+        self.cost_per_tree = float(cost_per_tree)
+        self.co2_lbs_per_tree = float(co2_lbs_per_tree)
+        self.planting_months = tuple(int(m) for m in planting_months)
+
+    @property
+    def cost_estimate(self) -> float:
+        return self.recommended_trees * self.cost_per_tree
+
+
+class PolicyResult(_Record):
+    __slots__ = ("priority_countries", "recommended_policies", "reduction_range", "reduction_years",
+                 "implementation_cost_usd", "key_sectors", "baseline_growth_rate")
+
+    def __init__(self, priority_countries: Sequence[str], recommended_policies: Sequence[str],
+                 reduction_range: Sequence[float], reduction_years: int, implementation_cost_usd: float,
+                 key_sectors: Sequence[str], baseline_growth_rate: Optional[float] = None):
+        self.priority_countries = tuple(str(c) for c in priority_countries)
+        self.recommended_policies = tuple(recommended_policies)
+        self.reduction_range = tuple(float(r) for r in reduction_range)
+        self.reduction_years = int(reduction_years)
+        self.implementation_cost_usd = float(implementation_cost_usd)
+        self.key_sectors = tuple(key_sectors)
+        # Percent change over the dataset, when a trend was supplied upstream
+        self.baseline_growth_rate = None if baseline_growth_rate is None else float(baseline_growth_rate)
+
+
+class EnergyResult(_Record):
+    __slots__ = ("offset_share", "recommended_mix", "investment_usd", "timeline_years", "jobs_created")
+
+    def __init__(self, offset_share: float, recommended_mix: Dict[str, float], investment_usd: float,
+                 timeline_years: Sequence[int], jobs_created: int):
+        self.offset_share = float(offset_share)
+        self.recommended_mix = {str(k): float(v) for k, v in dict(recommended_mix).items()}
+        self.investment_usd = float(investment_usd)
+        self.timeline_years = tuple(int(y) for y in timeline_years)
+        self.jobs_created = int(jobs_created)
+
+
+class TradingResult(_Record):
+    __slots__ = ("carbon_price_usd", "total_offset_cost_usd", "verified_credit_share", "annual_price_growth",
+                 "best_credit_sources")
+
+    def __init__(self, carbon_price_usd: float, total_offset_cost_usd: float, verified_credit_share: float,
+                 annual_price_growth: float, best_credit_sources: Sequence[str]):
+        self.carbon_price_usd = float(carbon_price_usd)
+        self.total_offset_cost_usd = float(total_offset_cost_usd)
+        self.verified_credit_share = float(verified_credit_share)
+        self.annual_price_growth = float(annual_price_growth)
+        self.best_credit_sources = tuple(best_credit_sources)
+
+
+class AgentResponse(_Record):
+    """Envelope for one agent's answer; result is one of the *Result records"""
+
+    __slots__ = ("agent_id", "agent", "status", "result", "error")
+
+    def __init__(self, agent_id: str, agent: str = "", status: str = SUCCESS, result: Optional[_Record] = None,
+                 error: Optional[str] = None):
+        self.agent_id = agent_id
+        self.agent = agent
+        self.status = status
+        self.result = result
+        self.error = error
+
+    @classmethod
+    def failure(cls, agent_id: str, error: str) -> "AgentResponse":
+        return cls(agent_id, status=FAILED, error=error)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == SUCCESS and self.result is not None
+
+    def to_list(self) -> List[Any]:
+        result = None
+        if self.result is not None:
+            result = [RECORD_CODES[type(self.result)], self.result.to_list()]
+        return [self.agent_id, self.agent, self.status, result, self.error]
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any]) -> "AgentResponse":
+        agent_id, agent, status, result, error = values
+        if result is not None:
+            code, fields = result
+            if code not in RECORD_TYPES:
+                raise WireFormatError(f"Unknown result type code {code}")
+            result = RECORD_TYPES[code].from_list(fields)
+        return cls(agent_id, agent, status, result, error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "agent_id": self.agent_id,
+            "agent": self.agent,
+            "status": self.status,
+            "result": self.result.to_dict() if self.result is not None else None,
+            "error": self.error,
+        }
+
+
+# Type codes on the wire; never reuse a retired code
+RECORD_TYPES = {
+    1: AgentMessage,
+    2: AgentResponse,
+    10: TreePlantingResult,
+    11: PolicyResult,
+    12: EnergyResult,
+    13: TradingResult,
+}
+RECORD_CODES = {cls: code for code, cls in RECORD_TYPES.items()}
+
+
+def encode(record: _Record) -> bytes:
+    """Serialize a record as a msgpack array: [version, type code, fields]"""
+    return msgpack.packb([WIRE_VERSION, RECORD_CODES[type(record)], record.to_list()], use_bin_type=True)
+
+
+def decode(payload: bytes) -> _Record:
+    """Inverse of encode()"""
+    try:
+        version, code, fields = msgpack.unpackb(payload, raw=False)
+    except (ValueError, TypeError, msgpack.UnpackException) as e:
+        raise WireFormatError(f"Malformed agent payload: {e}") from e
+    if version != WIRE_VERSION:
+        raise WireFormatError(f"Unsupported wire version {version}")
+    if code not in RECORD_TYPES:
+        raise WireFormatError(f"Unknown record type code {code}")
+    return RECORD_TYPES[code].from_list(fields)
+
+
+def format_usd(value: float) -> str:
+    """Dollar amount with a T/B/M suffix for large values"""
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= threshold:
+            return f"${value / threshold:g}{suffix}"
+    return f"${value:,.2f}"
+
+
+def format_range(bounds: Tuple[float, float], unit: str = "", scale: float = 1.0) -> str:
+    """'15-30%' style range"""
+    low, high = bounds
+    return f"{low * scale:g}-{high * scale:g}{unit}"
+
@@ -0,0 +1,133 @@
+import json
+from typing import Dict
+
+import pandas as pd
+
+from parallel_aggregation import groupby_sum
+from result_cache import ResultCache, frame_fingerprint
+
+# Bump when the layout of analysis results changes; cached results keyed on
+# an older version are recomputed
+ANALYSIS_VERSION = 4
+
+# Average tree absorbs 48 pounds of CO2 per year
+CO2_LBS_PER_TREE = 48
+# Assuming 1666 trees per acre
+ACRES_PER_TREE = 0.0006
+
+
+def calculate_trends(data: pd.DataFrame) -> Dict:
+    """Calculate emission trends"""
+    yearly_data = groupby_sum(data, 'Year')
+    if len(yearly_data) > 1:
+        growth_rate = ((yearly_data.iloc[-1] - yearly_data.iloc[0]) / yearly_data.iloc[0]) * 100
+        return {"growth_rate": growth_rate, "trend": "increasing" if growth_rate > 0 else "decreasing"}
+    return {"growth_rate": 0, "trend": "stable"}
+
+
+def calculate_tree_impact(total_emissions: float) -> Dict:
+    """Calculate how many trees needed to offset emissions"""
+    trees_needed = int(total_emissions * 1000 / CO2_LBS_PER_TREE)  # Assuming emissions in tons
+    forest_area = trees_needed * ACRES_PER_TREE
+
+    return {
+        "trees_needed": trees_needed,
+        "forest_area_acres": forest_area,
+        "annual_absorption": trees_needed * CO2_LBS_PER_TREE
+    }
+
+
+def create_visualizations(data: pd.DataFrame):
+    """Create comprehensive data visualizations"""
+    # Plotly is only imported once a chart section actually renders
+    import plotly.express as px
+
+    # 1. Bar Chart - Top Countries by Emissions
+    country_emissions = groupby_sum(data, 'Country').nlargest(10)
+    bar_fig = px.bar(
+        x=country_emissions.index,
+        y=country_emissions.values,
+        title="Top 10 Countries by Carbon Emissions",
+        labels={'x': 'Country', 'y': 'Carbon Emissions (units)'},
+        color=country_emissions.values,
+        color_continuous_scale="Reds"
+    )
+    bar_fig.update_layout(showlegend=False)
+
+    # 2. Pie Chart - Emission Distribution
+    pie_fig = px.pie(
+        values=country_emissions.values,
+        names=country_emissions.index,
+        title="Carbon Emission Distribution by Country"
+    )
+
+    # 3. Line Graph - Emissions Over Time
+    yearly_emissions = groupby_sum(data, 'Year').reset_index()
+    line_fig = px.line(
+        yearly_emissions,
+        x='Year',
+        y='Carbon_Emissions',
+        title="Carbon Emissions Trend Over Time",
+        markers=True
+    )
+    line_fig.update_traces(line=dict(width=3))
+
+    # 4. Area Chart - Cumulative Emissions
+    yearly_emissions['Cumulative'] = yearly_emissions['Carbon_Emissions'].cumsum()
+    area_fig = px.area(
+        yearly_emissions,
+        x='Year',
+        y='Cumulative',
+        title="Cumulative Carbon Emissions Over Time"
+    )
+
+    return bar_fig, pie_fig, line_fig, area_fig
+
+
+def level_visualizations(rollup, level: str, top_n: int = 10):
+    """Bar, pie and line charts for one level of a RegionRollup"""
+    import plotly.express as px
+
+    from regions import LEVEL_PLURALS
+
+    totals = rollup.top(level, top_n)
+    plural = LEVEL_PLURALS[level]
+    bar_fig = px.bar(
+        x=totals.index,
+        y=totals.values,
+        title=f"Top {len(totals)} {plural} by Carbon Emissions",
+        labels={'x': level, 'y': 'Carbon Emissions (units)'},
+        color=totals.values,
+        color_continuous_scale="Reds"
+    )
+    bar_fig.update_layout(showlegend=False)
+
+    pie_fig = px.pie(
+        values=totals.values,
+        names=totals.index,
+        title=f"Carbon Emission Distribution by {level}"
+    )
+
+    yearly = rollup.by_year(level, totals.index).reset_index().melt(
+        id_vars='Year', var_name=level, value_name='Carbon_Emissions')
+    line_fig = px.line(
+        yearly,
+        x='Year',
+        y='Carbon_Emissions',
+        color=level,
+        title=f"Carbon Emissions Trend by {level}",
+        markers=True
+    )
+    return bar_fig, pie_fig, line_fig
+
+
+def cached_visualizations(data: pd.DataFrame, cache: ResultCache):
+    """create_visualizations() backed by the persistent result cache"""
+    key = cache.key("figures", frame_fingerprint(data))
+    cached = cache.get(key)
+    if cached is not None:
+        import plotly.graph_objects as go
+        return tuple(go.Figure(fig) for fig in cached)
+    figures = create_visualizations(data)
+    cache.put(key, [json.loads(fig.to_json()) for fig in figures])
+    return figures
@@ -0,0 +1,54 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from analysis_core import calculate_trends
+from anomalies import anomalies_for
+from artifacts import ArtifactBundle
+from digest import prompt_context
+from parallel_aggregation import groupby_sum
+from regions import rollup_for
+
+
+def summarize_emissions(data: pd.DataFrame, bundle: Optional[ArtifactBundle] = None,
+                        summary: Optional[Dict[str, Any]] = None,
+                        progress: Optional[Callable[[float, str], None]] = None
+                        ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Data summary and model context behind an analysis, stage by stage
+
+    The analyzers and bench_load both run this, so load numbers measure
+    the stages a real analysis pays for. summary replaces the part computed
+    from `data` (a subset's summary, which also means no model context);
+    progress(fraction, message) is called before each stage.
+    """
+    report = progress or (lambda fraction, message: None)
+    report(0.3, "Summarizing emissions")
+    if summary is not None:
+        data_summary = dict(summary)
+    elif bundle is not None and bundle.is_bundled(data):
+        data_summary = {key: bundle.stats[key] for key in (
+            "total_countries", "year_range", "total_emissions",
+            "avg_emissions", "top_emitters", "trend_analysis"
+        )}
+    else:
+        data_summary = {
+            "total_countries": len(data['Country'].unique()),
+            "year_range": f"{data['Year'].min()} - {data['Year'].max()}",
+            "total_emissions": data['Carbon_Emissions'].sum(),
+            "avg_emissions": data['Carbon_Emissions'].mean(),
+            "top_emitters": groupby_sum(data, 'Country').nlargest(5).to_dict(),
+            "trend_analysis": calculate_trends(data)
+        }
+    if "regional_emitters" not in data_summary:
+        report(0.45, "Rolling up regions")
+        rollup = rollup_for(data, bundle)
+        data_summary["regional_emitters"] = {
+            level: rollup.top(level, 5).to_dict() for level in ("Sub-region", "Continent")
+        }
+    if "anomalies" not in data_summary:
+        report(0.6, "Checking for anomalies")
+        data_summary["anomalies"] = anomalies_for(data).summary()
+    # Fixed-size digest of the whole dataset for the model prompt
+    report(0.8, "Building the model context")
+    llm_context = prompt_context(data, data_summary["anomalies"]) if summary is None else None
+    return data_summary, llm_context
@@ -0,0 +1,299 @@
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from result_cache import frame_fingerprint
+
+# Centered window of reporting years used for the rolling median and MAD
+ANOMALY_WINDOW = 7
+# Robust z-score (in log space) above which a value is an outlier
+ROBUST_Z_THRESHOLD = 3.5
+# A year-on-year change by this factor or more, either way, is a jump
+JUMP_RATIO = 10.0
+# Floor for the MAD so flat series do not turn tiny wiggles into outliers
+MIN_MAD = 0.05
+# Values a window needs before its median and MAD are trusted
+MIN_WINDOW_POINTS = 4
+
+# Multivariate IsolationForest pass; off unless enabled, since scikit-learn is optional
+ISOLATION_FOREST = os.environ.get("CARBON_ANOMALY_ISOLATION_FOREST", "0") == "1"
+ISOLATION_CONTAMINATION = 0.005
+ISOLATION_MAX_FIT_ROWS = 100_000
+
+# Countries scored per block; bounds the memory of the rolling windows
+ANOMALY_BLOCK_ROWS = 4_096
+
+CHECKS = {
+    "duplicate_year": "Several rows for the same country and year",
+    "zero": "Zero emissions in a series that is otherwise non-zero",
+    "jump": f"Changed {JUMP_RATIO:g}x or more from the previous reported year",
+    "outlier": f"More than {ROBUST_Z_THRESHOLD:g} robust deviations from the rolling median",
+    "isolation": "Unusual combination of level, change and deviation (IsolationForest)",
+}
+
+# Anomaly reports kept for recently seen uploads
+ANOMALY_CACHE_SIZE = 8
+
+_reports: "OrderedDict[tuple, AnomalyReport]" = OrderedDict()
+_reports_lock = threading.Lock()
+
+
+def _nan_median(windows: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Median along the last axis ignoring NaN, by sorting (NaN sorts last)"""
+    ordered = np.sort(windows, axis=-1)
+    low = np.maximum((counts - 1) // 2, 0)[..., None]
+    high = np.maximum(counts // 2, 0)[..., None]
+    return ((np.take_along_axis(ordered, low, axis=-1) + np.take_along_axis(ordered, high, axis=-1)) / 2)[..., 0]
+
+
+def _rolling_robust_z(logs: np.ndarray) -> np.ndarray:
+    """Robust z-score of each cell against its centered rolling window, NaN where undefined"""
+    half = ANOMALY_WINDOW // 2
+    padded = np.pad(logs, ((0, 0), (half, half)), constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, ANOMALY_WINDOW, axis=1)
+    counts = np.sum(~np.isnan(windows), axis=2)
+    median = _nan_median(windows, counts)
+    mad = _nan_median(np.abs(windows - median[..., None]), counts)
+    z = (logs - median) / (1.4826 * np.maximum(mad, MIN_MAD))
+    return np.where(counts >= MIN_WINDOW_POINTS, z, np.nan)
+
+
+def _previous_reported(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """Value of the previous reported year of each cell, NaN for the first"""
+    columns = np.arange(values.shape[1])
+    last = np.maximum.accumulate(np.where(present, columns, -1), axis=1)
+    previous = np.concatenate([np.full((len(values), 1), -1), last[:, :-1]], axis=1)
+    rows = np.arange(len(values))[:, None]
+    return np.where(previous >= 0, values[rows, np.maximum(previous, 0)], np.nan)
+
+
+class AnomalyReport:
+    """Suspicious cells of a Country x Year emissions matrix
+
+    Every check is an array operation over the whole matrix: duplicate
+    years, zeros inside non-zero series, 10x jumps between reported years
+    and rolling robust z-scores (median and MAD in log space), plus an
+    optional IsolationForest over those features.
+    """
+
+    def __init__(self, countries: pd.Index, years: np.ndarray, values: np.ndarray, counts: np.ndarray,
+                 isolation_forest: bool = ISOLATION_FOREST):
+        self.countries = countries
+        self.years = years
+        self.values = values
+        present = counts > 0
+        self.present = present
+        self.isolation_forest = isolation_forest
+
+        positive = present & (values > 0)
+        logs = np.where(positive, np.log(np.where(positive, values, 1.0)), np.nan)
+        previous = _previous_reported(values, present)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.log(values / previous)
+        z = np.full(values.shape, np.nan)
+        for start in range(0, len(values), ANOMALY_BLOCK_ROWS):
+            z[start:start + ANOMALY_BLOCK_ROWS] = _rolling_robust_z(logs[start:start + ANOMALY_BLOCK_ROWS])
+
+        scores = {
+            "duplicate_year": np.where(counts > 1, counts.astype(np.float64), np.nan),
+            "zero": np.where(present & (values == 0) & positive.any(axis=1, keepdims=True), 1.0, np.nan),
+            "jump": np.where(positive & (previous > 0) & (np.abs(change) >= np.log(JUMP_RATIO)),
+                             np.abs(change) / np.log(10), np.nan),
+            "outlier": np.where(np.abs(z) > ROBUST_Z_THRESHOLD, np.abs(z), np.nan),
+        }
+        if isolation_forest:
+            scores["isolation"] = self._isolation_scores(logs, change, z, positive)
+
+        flags = []
+        for check, score in scores.items():
+            c, y = np.nonzero(~np.isnan(score))
+            flags.append(pd.DataFrame({
+                "Country": countries[c],
+                "Year": years[y],
+                "Check": check,
+                "Carbon_Emissions": values[c, y],
+                "Score": score[c, y],
+            }))
+        self.flags = pd.concat(flags, ignore_index=True).sort_values(["Country", "Year"], kind="stable",
+                                                                     ignore_index=True)
+        self.checks: List[str] = list(scores)
+
+    @staticmethod
+    def _isolation_scores(logs: np.ndarray, change: np.ndarray, z: np.ndarray, positive: np.ndarray) -> np.ndarray:
+        """Negated IsolationForest score of the cells it isolates, NaN elsewhere"""
+        try:
+            from sklearn.ensemble import IsolationForest
+        except ImportError:
+            raise RuntimeError("The IsolationForest check requires the 'scikit-learn' package")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            country_median = np.nanmedian(logs, axis=1, keepdims=True)
+        c, y = np.nonzero(positive)
+        features = np.column_stack([
+            logs[c, y],
+            np.nan_to_num(change[c, y], nan=0.0, posinf=0.0, neginf=0.0),
+            np.nan_to_num(z[c, y], nan=0.0),
+            (logs - country_median)[c, y],
+        ])
+        scores = np.full(logs.shape, np.nan)
+        if len(features) < 2:
+            return scores
+        forest = IsolationForest(contamination=ISOLATION_CONTAMINATION, random_state=0)
+        rng = np.random.default_rng(0)
+        sample = features if len(features) <= ISOLATION_MAX_FIT_ROWS else \
+            features[rng.choice(len(features), ISOLATION_MAX_FIT_ROWS, replace=False)]
+        forest.fit(sample)
+        outlier = forest.predict(features) == -1
+        scores[c[outlier], y[outlier]] = -forest.score_samples(features[outlier])
+        return scores
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, isolation_forest: bool = ISOLATION_FOREST) -> "AnomalyReport":
+        """Build the matrix from a frame in one pass; duplicate rows are summed and counted"""
+        country_codes, countries = pd.factorize(data['Country'], sort=True)
+        year_codes, years = pd.factorize(data['Year'], sort=True)
+        shape = (len(countries), len(years))
+        flat = country_codes * shape[1] + year_codes
+        values = np.bincount(flat, weights=data['Carbon_Emissions'].fillna(0).to_numpy(dtype=np.float64),
+                             minlength=shape[0] * shape[1]).reshape(shape)
+        counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+        return cls(pd.Index(np.asarray(countries, dtype=str), name="Country"), np.asarray(years, dtype=np.int64),
+                   values, counts, isolation_forest)
+
+    def counts(self) -> pd.Series:
+        """Number of flags per check, including checks that found nothing"""
+        return self.flags["Check"].value_counts().reindex(self.checks, fill_value=0)
+
+    def year_flags(self) -> pd.Series:
+        """Number of flagged cells per year"""
+        return self.flags.drop_duplicates(["Country", "Year"])["Year"].value_counts().sort_index()
+
+    def flagged_countries(self) -> pd.Series:
+        """Countries with flags and how many, most flagged first"""
+        return self.flags["Country"].value_counts()
+
+    def series(self, country: str) -> pd.DataFrame:
+        """One country's reported values with the checks that flagged each year"""
+        row = self.countries.get_loc(country)
+        present = self.present[row]
+        frame = pd.DataFrame({"Year": self.years[present], "Carbon_Emissions": self.values[row, present]})
+        checks = self.flags[self.flags["Country"] == country].groupby("Year")["Check"].agg(", ".join)
+        frame["Checks"] = frame["Year"].map(checks).fillna("")
+        return frame
+
+    def summary(self, top_n: int = 10, countries: Optional[Iterable[str]] = None,
+                years: Optional[Tuple[int, int]] = None) -> Dict:
+        """JSON-ready digest for the analysis results
+
+        Also says whether flags touch what the headline numbers rest on: the
+        top five emitters and the first and last year of the growth rate.
+        countries (all if empty) and an inclusive year window restrict the
+        digest to a subset; the checks themselves always see whole series.
+        """
+        rows = np.ones(len(self.countries), dtype=bool) if not countries else self.countries.isin(list(countries))
+        columns = np.ones(len(self.years), dtype=bool) if years is None else \
+            (self.years >= years[0]) & (self.years <= years[1])
+        flags = self.flags
+        if countries or years is not None:
+            flags = flags[flags["Country"].isin(self.countries[rows]) & flags["Year"].isin(self.years[columns])]
+        flagged = set(flags["Country"])
+        totals = pd.Series(self.values[rows][:, columns].sum(axis=1), index=self.countries[rows])
+        top_emitters = totals.nlargest(5).index
+        reported = self.years[columns & self.present[rows].any(axis=0)]
+        endpoints = [int(reported[0]), int(reported[-1])] if len(reported) else []
+        counts = flags["Check"].value_counts().reindex(self.checks, fill_value=0)
+        worst = flags.sort_values("Score", ascending=False).head(top_n)
+        return {
+            "total_flags": int(len(flags)),
+            "by_check": {check: int(n) for check, n in counts.items()},
+            "countries_flagged": len(flagged),
+            "top_emitters_flagged": [country for country in top_emitters if country in flagged],
+            "trend_years_flagged": [year for year in endpoints if year in set(flags["Year"])],
+            "top_flags": [
+                {"country": row.Country, "year": int(row.Year), "check": row.Check,
+                 "emissions": float(row.Carbon_Emissions), "score": round(float(row.Score), 3)}
+                for row in worst.itertuples()
+            ],
+        }
+
+
+def anomalies_for(data: pd.DataFrame, isolation_forest: bool = ISOLATION_FOREST) -> AnomalyReport:
+    """AnomalyReport of a frame, reused across reruns and sessions by content hash"""
+    key = (frame_fingerprint(data), isolation_forest)
+    with _reports_lock:
+        report = _reports.get(key)
+        if report is not None:
+            _reports.move_to_end(key)
+            return report
+    report = AnomalyReport.from_frame(data, isolation_forest)
+    with _reports_lock:
+        _reports[key] = report
+        while len(_reports) > ANOMALY_CACHE_SIZE:
+            _reports.popitem(last=False)
+    return report
+
+
+def flag_trend_figure(line_fig, report: AnomalyReport):
+    """Copy of the yearly total trend figure with a marker on every year that has flags"""
+    import plotly.graph_objects as go
+
+    figure = go.Figure(line_fig)
+    year_flags = report.year_flags()
+    yearly = pd.Series(report.values.sum(axis=0), index=report.years)
+    years = year_flags.index
+    if len(years):
+        figure.add_trace(go.Scatter(
+            x=years, y=yearly.loc[years], mode="markers", name="Anomalies",
+            marker=dict(color="crimson", size=11, symbol="x"),
+            customdata=year_flags.loc[years],
+            hovertemplate="%{x}: %{customdata} flagged value(s)<extra></extra>",
+        ))
+    return figure
+
+
+def headline_warning(summary: Dict):
+    """Warn when flags touch the top emitters or the years behind the growth rate"""
+    import streamlit as st
+
+    notes = []
+    if summary.get("top_emitters_flagged"):
+        notes.append(f"top emitters {', '.join(summary['top_emitters_flagged'])}")
+    if summary.get("trend_years_flagged"):
+        notes.append(f"growth-rate years {', '.join(map(str, summary['trend_years_flagged']))}")
+    if notes:
+        st.warning(f"🚩 Suspicious values affect the {' and the '.join(notes)}; see Data Anomalies below")
+
+
+def anomaly_section(report: AnomalyReport):
+    """Flag counts, a flagged country's series with its anomalies marked, and the flag table"""
+    import plotly.graph_objects as go
+    import streamlit as st
+
+    counts = report.counts()
+    columns = st.columns(len(counts))
+    for column, (check, n) in zip(columns, counts.items()):
+        column.metric(check.replace("_", " ").title(), f"{n:,}", help=CHECKS[check])
+    if not len(report.flags):
+        st.success("✅ No suspicious values found")
+        return
+
+    flagged = report.flagged_countries()
+    country = st.selectbox("Country", flagged.index, format_func=lambda name: f"{name} ({flagged[name]} flags)",
+                           key="anomaly_country")
+    series = report.series(country)
+    marked = series[series["Checks"] != ""]
+    figure = go.Figure([
+        go.Scatter(x=series["Year"], y=series["Carbon_Emissions"], mode="lines+markers", name=country),
+        go.Scatter(x=marked["Year"], y=marked["Carbon_Emissions"], mode="markers", name="Anomalies",
+                   marker=dict(color="crimson", size=12, symbol="x"), text=marked["Checks"],
+                   hovertemplate="%{x}: %{y:,.3f}<br>%{text}<extra></extra>"),
+    ])
+    figure.update_layout(title=f"Carbon Emissions of {country}", xaxis_title="Year",
+                         yaxis_title="Carbon Emissions (units)")
+    st.plotly_chart(figure, use_container_width=True)
+    st.dataframe(report.flags, width="stretch", hide_index=True)
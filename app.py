@@ -1,13 +1,31 @@
+import os
+import sqlite3
+import tempfile
+import uuid
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import requests
-import json
-import io
-from typing import Dict, List, Any
-import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from regions import LEVELS, rollup_for
+from panel_index import PATH_CACHED, panel_index_for
+from anomalies import anomalies_for, anomaly_section, flag_trend_figure, headline_warning
+from digest import context_section, prompt_context
+from offsets import planting_section
+from preview import preview_for, preview_section, wants_preview
+from enrichment import enrichment_for, intensity_section
+from world_map import map_section
+from sections import dataset_metrics, input_key, level_figures
+from synthetic import SAMPLE_ROWS, SAMPLE_SEED, synthetic_frame
+from analysis_summary import summarize_emissions
+from analysis_core import (ANALYSIS_VERSION, cached_visualizations, calculate_tree_impact,
+                           calculate_trends)
+from artifacts import ArtifactBundle, BUNDLED_CSV, load_artifacts
+from validation import ValidationError, validate_emissions
+from jobs import DONE, FAILED, Job, JobCancelled, JobScheduler, poll_job
+from result_cache import ResultCache, frame_fingerprint, pin_frame
+from voice import VoiceSynthesizer, play_summary
+from ledger import LedgerWriter, show_ledger_receipts
+from comparison import comparison_section
+from export import available_export_formats, export_file_name, lazy_export, lazy_json
 
 # Configure page
 st.set_page_config(
@@ -66,7 +84,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 class CarbonEmissionAnalyzer:
-    def __init__(self):
+    def __init__(self, bundle: ArtifactBundle = None):
+        # Precomputed artifacts for the bundled dataset, if available
+        self.bundle = bundle
+        
         # Make API keys optional - use fallback if secrets not available
         try:
             self.mistral_api_key = st.secrets.get("MISTRAL_API_KEY", "")
@@ -75,19 +96,23 @@ class CarbonEmissionAnalyzer:
             self.mistral_api_key = ""
             self.elevenlabs_api_key = ""
             st.info("💡 Running in demo mode. For full AI features, add API keys to secrets.toml")
+
+        self.voice = VoiceSynthesizer(self.elevenlabs_api_key)
         
-    def analyze_with_mistral(self, data: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze carbon emissions data using Mistral AI"""
+    def analyze_with_mistral(self, data: pd.DataFrame, summary: Optional[Dict[str, Any]] = None,
+                             progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """Analyze carbon emissions data using Mistral AI
+
+        summary replaces the data summary computed from `data`, e.g. one
+        derived for a subset by analyze_subset. progress(fraction, message)
+        is called between stages; a background job passes Job.update so
+        each stage is also a cancellation point. A failed analysis falls
+        back to basic statistics and reports why in analysis["error"].
+        """
+        report = progress or (lambda fraction, message: None)
         try:
             # Prepare data summary for AI analysis
-            data_summary = {
-                "total_countries": len(data['Country'].unique()),
-                "year_range": f"{data['Year'].min()} - {data['Year'].max()}",
-                "total_emissions": data['Carbon_Emissions'].sum(),
-                "avg_emissions": data['Carbon_Emissions'].mean(),
-                "top_emitters": data.groupby('Country')['Carbon_Emissions'].sum().nlargest(5).to_dict(),
-                "trend_analysis": self._calculate_trends(data)
-            }
+            data_summary, llm_context = summarize_emissions(data, self.bundle, summary, report)
             
             # Simulate Mistral AI response (replace with actual API call)
             analysis = {
@@ -104,6 +129,9 @@ class CarbonEmissionAnalyzer:
                     "Promote sustainable transportation"
                 ],
                 "tree_impact": self._calculate_tree_impact(data_summary["total_emissions"]),
+                "regional_emitters": data_summary["regional_emitters"],
+                "anomalies": data_summary["anomalies"],
+                "llm_context": llm_context,
                 "sector_priorities": {
                     "Energy": "Critical - 45% of emissions",
                     "Transportation": "High - 25% of emissions", 
@@ -114,38 +142,65 @@ class CarbonEmissionAnalyzer:
             
             return analysis
             
+        except JobCancelled:
+            raise
         except Exception as e:
-            st.error(f"Error in Mistral analysis: {str(e)}")
-            return self._get_fallback_analysis(data)
+            # Usually runs in a job thread, where st.error would be dropped; the caller shows it
+            analysis = self._get_fallback_analysis(data, summary)
+            analysis["error"] = f"Error in Mistral analysis: {str(e)}"
+            return analysis
+    
+    def analyze_subset(self, data: pd.DataFrame, countries: Optional[List[str]] = None,
+                       years: Optional[Tuple[int, int]] = None,
+                       min_emissions: Optional[float] = None) -> Dict[str, Any]:
+        """Analyze a subset of countries and an inclusive year window
+        
+        The summary comes from the cached full-dataset aggregates unless a
+        record-level filter forces a raw scan; analysis["subset"] records
+        the filters, the summary and which path produced it. The model
+        context is a digest of the subset's own rows and anomalies.
+        """
+        index = panel_index_for(data)
+        subset = index.summary(countries, years, min_emissions)
+        summary = dict(subset.stats)
+        summary["anomalies"] = anomalies_for(data).summary(countries=countries, years=years)
+        analysis = self.analyze_with_mistral(data, summary)
+        if "error" not in analysis:
+            analysis["llm_context"] = prompt_context(index.records(countries, years, min_emissions),
+                                                     summary["anomalies"])
+        analysis["subset"] = {
+            "countries": list(countries or []),
+            "years": list(years) if years is not None else None,
+            "min_emissions": min_emissions,
+            "summary": subset.stats,
+            **subset.to_dict()
+        }
+        return analysis
     
     def _calculate_trends(self, data: pd.DataFrame) -> Dict:
         """Calculate emission trends"""
-        yearly_data = data.groupby('Year')['Carbon_Emissions'].sum()
-        if len(yearly_data) > 1:
-            growth_rate = ((yearly_data.iloc[-1] - yearly_data.iloc[0]) / yearly_data.iloc[0]) * 100
-            return {"growth_rate": growth_rate, "trend": "increasing" if growth_rate > 0 else "decreasing"}
-        return {"growth_rate": 0, "trend": "stable"}
+        return calculate_trends(data)
     
     def _calculate_tree_impact(self, total_emissions: float) -> Dict:
         """Calculate how many trees needed to offset emissions"""
-        # Average tree absorbs 48 pounds of CO2 per year
-        trees_needed = int(total_emissions * 1000 / 48)  # Assuming emissions in tons
-        forest_area = trees_needed * 0.0006  # Assuming 1666 trees per acre
-        
-        return {
-            "trees_needed": trees_needed,
-            "forest_area_acres": forest_area,
-            "annual_absorption": trees_needed * 48
-        }
+        return calculate_tree_impact(total_emissions)
     
-    def _get_fallback_analysis(self, data: pd.DataFrame) -> Dict:
-        """Fallback analysis if AI service fails"""
+    def _get_fallback_analysis(self, data: pd.DataFrame, summary: Optional[Dict[str, Any]] = None) -> Dict:
+        """Fallback analysis if AI service fails; reads a given summary instead of scanning `data`"""
+        if summary is None:
+            summary = {
+                "records": len(data),
+                "avg_emissions": data['Carbon_Emissions'].mean(),
+                "max_emissions": data['Carbon_Emissions'].max(),
+                "total_years": data['Year'].nunique(),
+                "total_emissions": data['Carbon_Emissions'].sum()
+            }
         return {
             "key_insights": [
-                f"Data covers {len(data)} emission records",
-                f"Average emission per record: {data['Carbon_Emissions'].mean():.2f} units",
-                f"Highest emission: {data['Carbon_Emissions'].max():.2f} units",
-                f"Data spans {data['Year'].nunique()} years"
+                f"Data covers {summary['records']} emission records",
+                f"Average emission per record: {summary['avg_emissions']:.2f} units",
+                f"Highest emission: {summary['max_emissions']:.2f} units",
+                f"Data spans {summary['total_years']} years"
             ],
             "recommendations": [
                 "Focus on countries with highest emissions",
@@ -153,7 +208,7 @@ class CarbonEmissionAnalyzer:
                 "Invest in renewable energy",
                 "Monitor emission trends closely"
             ],
-            "tree_impact": self._calculate_tree_impact(data['Carbon_Emissions'].sum()),
+            "tree_impact": self._calculate_tree_impact(summary['total_emissions']),
             "sector_priorities": {
                 "Energy": "Critical Priority",
                 "Transportation": "High Priority",
@@ -162,52 +217,66 @@ class CarbonEmissionAnalyzer:
             }
         }
 
-def create_visualizations(data: pd.DataFrame):
-    """Create comprehensive data visualizations"""
-    
-    # 1. Bar Chart - Top Countries by Emissions
-    country_emissions = data.groupby('Country')['Carbon_Emissions'].sum().nlargest(10)
-    bar_fig = px.bar(
-        x=country_emissions.index,
-        y=country_emissions.values,
-        title="Top 10 Countries by Carbon Emissions",
-        labels={'x': 'Country', 'y': 'Carbon Emissions (units)'},
-        color=country_emissions.values,
-        color_continuous_scale="Reds"
-    )
-    bar_fig.update_layout(showlegend=False)
-    
-    # 2. Pie Chart - Emission Distribution
-    pie_fig = px.pie(
-        values=country_emissions.values,
-        names=country_emissions.index,
-        title="Carbon Emission Distribution by Country"
-    )
-    
-    # 3. Line Graph - Emissions Over Time
-    yearly_emissions = data.groupby('Year')['Carbon_Emissions'].sum().reset_index()
-    line_fig = px.line(
-        yearly_emissions,
-        x='Year',
-        y='Carbon_Emissions',
-        title="Carbon Emissions Trend Over Time",
-        markers=True
-    )
-    line_fig.update_traces(line=dict(width=3))
-    
-    # 4. Area Chart - Cumulative Emissions
-    yearly_emissions['Cumulative'] = yearly_emissions['Carbon_Emissions'].cumsum()
-    area_fig = px.area(
-        yearly_emissions,
-        x='Year',
-        y='Cumulative',
-        title="Cumulative Carbon Emissions Over Time"
-    )
-    
-    return bar_fig, pie_fig, line_fig, area_fig
+@st.cache_resource(show_spinner=False)
+def get_bundled_artifacts():
+    """Load the precomputed artifacts for the bundled dataset once per process"""
+    return load_artifacts()
+
+@st.cache_resource(show_spinner=False)
+def get_job_scheduler() -> JobScheduler:
+    """Background job scheduler shared by every session in this process"""
+    return JobScheduler()
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    """Persistent result cache shared by every session and worker process"""
+    try:
+        return ResultCache()
+    except (OSError, sqlite3.Error):
+        # Read-only app directory: keep the cache in the temp dir instead
+        return ResultCache(os.path.join(tempfile.gettempdir(), "carbon_results.sqlite"))
+
+@st.cache_resource(show_spinner=False)
+def get_ledger_writer() -> LedgerWriter:
+    """Process-wide ledger batcher, so records from every session share batches"""
+    try:
+        api_key = st.secrets.get("CROSSMINT_API_KEY", "")
+    except Exception:
+        api_key = ""
+    return LedgerWriter(api_key=api_key)
+
+def run_analysis_job(job: Job, analyzer: CarbonEmissionAnalyzer, cache: ResultCache,
+                     data: pd.DataFrame) -> Dict[str, Any]:
+    """Background job wrapper around the analyzer, served from the cache when possible"""
+    job.update(0.1, "Checking result cache")
+    key = cache.key("analysis", "basic", ANALYSIS_VERSION, frame_fingerprint(data))
+    results = cache.get(key)
+    if results is None:
+        job.update(0.2, "Analyzing emissions data")
+        results = analyzer.analyze_with_mistral(data, progress=job.update)
+        job.update(0.95, "Saving results")
+        # A fallback after a failure is not cached, so the next run tries again
+        if "error" not in results:
+            cache.put(key, results)
+    return results
+
+@st.cache_resource(show_spinner=False)
+def get_analyzer() -> CarbonEmissionAnalyzer:
+    """Build the analyzer once per process and share it across sessions"""
+    return CarbonEmissionAnalyzer(get_bundled_artifacts())
+
+def submit_ledger_record(ledger: LedgerWriter, kind: str, payload: Dict, message: str):
+    """Queue a record for the ledger and confirm with its record hash"""
+    if not ledger.enabled:
+        st.info("💡 Set CARBON_LEDGER_URL to submit records to the blockchain ledger")
+        return
+    record_id = ledger.submit(kind, payload, owner=st.session_state.ledger_owner)
+    st.success(message)
+    st.caption(f"Record hash: 0x{record_id}")
 
 def create_metric_cards(data: pd.DataFrame, analysis: Dict):
     """Create metric cards for key statistics"""
+    metrics = dataset_metrics(data)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -216,7 +285,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Total Emissions</h3>
             <h2>{:.2f} units</h2>
         </div>
-        """.format(data['Carbon_Emissions'].sum()), unsafe_allow_html=True)
+        """.format(metrics['total_emissions']), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
@@ -224,7 +293,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Countries Analyzed</h3>
             <h2>{}</h2>
         </div>
-        """.format(len(data['Country'].unique())), unsafe_allow_html=True)
+        """.format(metrics['countries']), unsafe_allow_html=True)
     
     with col3:
         st.markdown("""
@@ -232,7 +301,7 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
             <h3>Years Covered</h3>
             <h2>{}</h2>
         </div>
-        """.format(data['Year'].nunique()), unsafe_allow_html=True)
+        """.format(metrics['years']), unsafe_allow_html=True)
     
     with col4:
         st.markdown("""
@@ -242,12 +311,150 @@ def create_metric_cards(data: pd.DataFrame, analysis: Dict):
         </div>
         """.format(analysis['tree_impact']['trees_needed']), unsafe_allow_html=True)
 
+@st.fragment
+def charts_section(data: pd.DataFrame, bundle: ArtifactBundle, cache: ResultCache):
+    """Charts, world map and intensity rankings; their widgets rerun only this fragment"""
+    # Create visualizations
+    if bundle is not None and bundle.is_bundled(data):
+        bar_fig, pie_fig, line_fig, area_fig = bundle.figure_tuple()
+    else:
+        bar_fig, pie_fig, line_fig, area_fig = cached_visualizations(data, cache)
+    
+    # Region levels are lookups in the precomputed rollup; the area chart stays global
+    chart_level = st.radio("Group emissions by", LEVELS[:-1], horizontal=True, key="chart_level")
+    anomalies = anomalies_for(data)
+    if chart_level != "Country":
+        bar_fig, pie_fig, line_fig = level_figures(rollup_for(data, bundle), chart_level)
+    else:
+        line_fig = flag_trend_figure(line_fig, anomalies)
+    
+    # Display charts in tabs
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Bar Chart", "🥧 Pie Chart", "📈 Line Graph", "📏 Area Chart",
+                                            "🗺️ World Map"])
+    
+    with tab1:
+        st.plotly_chart(bar_fig, use_container_width=True)
+    
+    with tab2:
+        st.plotly_chart(pie_fig, use_container_width=True)
+    
+    with tab3:
+        st.plotly_chart(line_fig, use_container_width=True)
+    
+    with tab4:
+        st.plotly_chart(area_fig, use_container_width=True)
+    
+    with tab5:
+        map_section(rollup_for(data, bundle), frame_fingerprint(data), cache)
+    
+    # Per-capita, per-GDP and per-energy rankings from the local reference tables
+    st.subheader("📐 Emission Intensity")
+    intensity_section(enrichment_for(data, cache=cache), chart_level)
+    
+    # Zeros, jumps, duplicate years and outliers that would skew the numbers above
+    st.subheader("🚩 Data Anomalies")
+    anomaly_section(anomalies)
+
+@st.fragment
+def focus_section(analyzer: CarbonEmissionAnalyzer, data: pd.DataFrame):
+    """Analysis of a chosen subset; changing the filters reruns only this fragment"""
+    index = panel_index_for(data)
+    first, last = int(index.years[0]), int(index.years[-1])
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        countries = st.multiselect("Countries", index.countries, key="focus_countries", placeholder="All countries")
+    with col2:
+        years = st.select_slider("Years", options=index.years.tolist(), value=(first, last),
+                                 key="focus_years") if first < last else (first, last)
+    min_emissions = None
+    if st.checkbox("Only records at or above a threshold", key="focus_threshold",
+                   help="A record-level filter cannot use the cached aggregates and scans the rows"):
+        min_emissions = st.number_input("Minimum emissions per record", min_value=0.0, value=0.0, key="focus_min")
+    if not countries and tuple(years) == (first, last) and min_emissions is None:
+        st.caption("Pick countries, a year window or a threshold to analyze a subset")
+        return
+    
+    analysis = analyzer.analyze_subset(data, countries, tuple(years), min_emissions)
+    if analysis.get("error"):
+        st.warning(f"⚠️ {analysis['error']}; showing basic statistics instead")
+    subset = analysis["subset"]
+    stats = subset["summary"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Subset Emissions", f"{stats['total_emissions']:,.2f}")
+    col2.metric("Countries", f"{stats['total_countries']:,}")
+    col3.metric("Records", f"{stats['records']:,}")
+    col4.metric("Growth Rate", f"{stats['trend_analysis']['growth_rate']:+.1f}%")
+    icon = "⚡" if subset["path"] == PATH_CACHED else "🔍"
+    st.caption(f"{icon} From {subset['path']} ({subset['reason']}) in {subset['milliseconds']:.1f} ms")
+    if stats["top_emitters"]:
+        st.bar_chart(pd.Series(stats["top_emitters"], name="Carbon_Emissions"))
+    st.write(f"🌳 **{analysis['tree_impact']['trees_needed']:,} trees** would offset this subset")
+
+@st.fragment
+def voice_section(voice: VoiceSynthesizer, data: pd.DataFrame, analysis: Dict):
+    """Voice summary button; generating audio reruns only this fragment"""
+    if st.button("🔊 Generate Voice Summary", key="voice_summary"):
+        with st.spinner("🎵 Generating voice summary..."):
+            metrics = dataset_metrics(data)
+            summary_text = f"Analysis complete. Total emissions: {metrics['total_emissions']:.2f} units across {metrics['countries']} countries. {analysis['tree_impact']['trees_needed']:,} trees needed for offset."
+            play_summary(voice, summary_text)
+
+@st.fragment
+def ledger_section(ledger: LedgerWriter, data: pd.DataFrame, analysis: Dict):
+    """Blockchain buttons and receipts"""
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("💾 Store on Blockchain", key="blockchain_store"):
+            submit_ledger_record(ledger, "analysis", {
+                "dataset": frame_fingerprint(data),
+                "analysis": analysis,
+            }, "📦 Analysis queued for the next blockchain batch")
+    with col2:
+        if st.button("🏆 Mint Carbon Credit NFT", key="mint_nft"):
+            submit_ledger_record(ledger, "carbon_credit_nft", {
+                "dataset": frame_fingerprint(data),
+                "tree_impact": analysis['tree_impact'],
+            }, "🎨 Carbon credit NFT queued for minting")
+    show_ledger_receipts(ledger, st.session_state.ledger_owner)
+
+@st.fragment
+def downloads_section(data: pd.DataFrame, analysis: Dict):
+    """Download buttons; payloads are serialized on click and cached by content"""
+    col1, col2 = st.columns(2)
+    with col1:
+        pretty_json = st.checkbox("Pretty-print JSON", value=False, key="pretty_json")
+        st.download_button(
+            label="📊 Download Analysis (JSON)",
+            data=lazy_json(lambda: analysis, input_key(analysis), compact=not pretty_json),
+            file_name="carbon_analysis_results.json",
+            mime="application/json"
+        )
+    
+    with col2:
+        export_formats = available_export_formats()
+        export_format = st.selectbox(
+            "Data format",
+            list(export_formats),
+            format_func=lambda fmt: export_formats[fmt]["label"],
+            key="export_format"
+        )
+        st.download_button(
+            label=f"📈 Download Data ({export_formats[export_format]['label']})",
+            data=lazy_export(data, export_format),
+            file_name=export_file_name("carbon_emissions_data", export_format),
+            mime=export_formats[export_format]["mime"]
+        )
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🌍 AI Carbon Emissions Analyzer</h1>', unsafe_allow_html=True)
     
     # Initialize analyzer
-    analyzer = CarbonEmissionAnalyzer()
+    bundle = get_bundled_artifacts()
+    analyzer = get_analyzer()
+    scheduler = get_job_scheduler()
+    cache = get_result_cache()
+    ledger = get_ledger_writer()
     
     # Initialize session state
     if 'data_uploaded' not in st.session_state:
@@ -256,6 +463,10 @@ def main():
         st.session_state.data_analyzed = False
     if 'analysis_results' not in st.session_state:
         st.session_state.analysis_results = None
+    if 'analysis_job' not in st.session_state:
+        st.session_state.analysis_job = None
+    if 'ledger_owner' not in st.session_state:
+        st.session_state.ledger_owner = uuid.uuid4().hex
     
     # Sidebar
     with st.sidebar:
@@ -286,34 +497,47 @@ ELEVENLABS_API_KEY = "your_key_here"''')
     
     # Option 2: Sample Data
     if st.button("🎯 Use Sample Data", key="sample_data"):
-        # Create sample data
-        sample_data = {
-            'Country': ['USA', 'China', 'India', 'Russia', 'Japan'] * 10,
-            'Year': [2020, 2021, 2022, 2020, 2021] * 10,
-            'Carbon_Emissions': np.random.uniform(100, 1000, 50)
-        }
-        st.session_state.df = pd.DataFrame(sample_data)
+        # Seeded synthetic panel, identical on every click
+        st.session_state.df = pin_frame(synthetic_frame(SAMPLE_ROWS, seed=SAMPLE_SEED))
+        st.session_state.data_uploaded = True
+        st.success(f"✅ Sample data loaded ({SAMPLE_ROWS:,} synthetic records)!")
+    
+    # Option 3: Bundled Dataset
+    if st.button("🌍 Use Bundled Dataset", key="bundled_data"):
+        st.session_state.df = pin_frame(bundle.data if bundle is not None else pd.read_csv(BUNDLED_CSV))
         st.session_state.data_uploaded = True
-        st.success("✅ Sample data loaded successfully!")
+        st.success(f"✅ Bundled dataset loaded ({len(st.session_state.df):,} records)!")
     
     if uploaded_file is not None:
         try:
             df = pd.read_csv(uploaded_file)
             
-            # Validate columns
-            required_columns = ['Country', 'Year', 'Carbon_Emissions']
-            if all(col in df.columns for col in required_columns):
-                st.session_state.df = df
+            # Validate and clean in one pass
+            df, report = validate_emissions(df)
+            if len(df) == 0:
+                st.error(f"❌ No valid rows found in {report.rows_in:,} uploaded rows")
+            else:
+                st.session_state.df = pin_frame(df)
                 st.session_state.data_uploaded = True
+                if report.errors:
+                    st.warning(f"⚠️ {report.rows_dropped:,} of {report.rows_in:,} rows were dropped during validation")
                 st.success("✅ Data uploaded successfully!")
                 st.write("Data Preview:", df.head())
-            else:
-                st.error(f"❌ Missing required columns. Found: {list(df.columns)}")
+            
+            if report.has_issues:
+                with st.expander("🧹 Validation Report", expanded=len(df) == 0):
+                    st.dataframe(report.to_frame(), hide_index=True)
                 
+        except ValidationError as e:
+            st.error(f"❌ {str(e)}")
         except Exception as e:
             st.error(f"❌ Error loading file: {str(e)}")
     
     st.markdown('</div>', unsafe_allow_html=True)
+
+    # Revision comparison across several inventories
+    with st.expander("🔀 Compare Inventories"):
+        st.fragment(comparison_section)(st.session_state.df if st.session_state.data_uploaded else None)
     
     # Section 2: Data Analysis
     if st.session_state.data_uploaded:
@@ -321,11 +545,28 @@ ELEVENLABS_API_KEY = "your_key_here"''')
         st.header("🔍 Step 2: Analyze Data")
         
         if st.button("🤖 Analyze with AI", key="analyze_data"):
-            with st.spinner("🧠 AI is analyzing your data..."):
-                # Perform AI analysis
-                st.session_state.analysis_results = analyzer.analyze_with_mistral(st.session_state.df)
+            # Run the analysis in the background so the page stays responsive
+            scheduler.cancel(st.session_state.analysis_job)
+            st.session_state.analysis_job = scheduler.submit(
+                run_analysis_job, analyzer, cache, st.session_state.df, kind="analysis"
+            )
+        
+        job = poll_job(scheduler, st.session_state.analysis_job, "🧠 AI is analyzing your data...")
+        if job is not None and job.finished:
+            if job.status == DONE:
+                st.session_state.analysis_results = job.result
                 st.session_state.data_analyzed = True
+                if job.result.get("error"):
+                    st.warning(f"⚠️ {job.result['error']}; showing basic statistics instead")
                 st.success("✅ Analysis completed!")
+            elif job.status == FAILED:
+                st.error(f"❌ Analysis failed: {job.error}")
+            else:
+                st.info("Analysis cancelled")
+            st.session_state.analysis_job = None
+        elif job is not None and wants_preview(st.session_state.df):
+            # Large upload: approximate numbers right away, replaced by the exact results when the job finishes
+            preview_section(preview_for(st.session_state.df))
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -336,26 +577,14 @@ ELEVENLABS_API_KEY = "your_key_here"''')
         
         # Metric Cards
         create_metric_cards(st.session_state.df, st.session_state.analysis_results)
+        headline_warning(st.session_state.analysis_results.get("anomalies", {}))
         
         st.subheader("📈 Data Visualizations")
         
-        # Create visualizations
-        bar_fig, pie_fig, line_fig, area_fig = create_visualizations(st.session_state.df)
-        
-        # Display charts in tabs
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Bar Chart", "🥧 Pie Chart", "📈 Line Graph", "📏 Area Chart"])
-        
-        with tab1:
-            st.plotly_chart(bar_fig, use_container_width=True)
-        
-        with tab2:
-            st.plotly_chart(pie_fig, use_container_width=True)
+        charts_section(st.session_state.df, bundle, cache)
         
-        with tab3:
-            st.plotly_chart(line_fig, use_container_width=True)
-        
-        with tab4:
-            st.plotly_chart(area_fig, use_container_width=True)
+        st.subheader("🔎 Focus on a Subset")
+        focus_section(analyzer, st.session_state.df)
         
         # AI Insights
         st.subheader("🧠 AI-Powered Insights")
@@ -382,52 +611,25 @@ ELEVENLABS_API_KEY = "your_key_here"''')
             for sector, priority in st.session_state.analysis_results['sector_priorities'].items():
                 st.write(f"• **{sector}**: {priority}")
         
-        # Voice Summary (ElevenLabs integration placeholder)
+        context_section(st.session_state.analysis_results.get('llm_context'))
+        
+        # Offset planning: re-solved as the sliders move, without rerunning the page
+        st.subheader("🌲 Offset Planting Plan")
+        st.fragment(planting_section)(dataset_metrics(st.session_state.df)['total_emissions'])
+        
+        # Voice Summary (ElevenLabs text-to-speech, cached on disk)
         st.subheader("🎙️ Voice Summary")
-        if st.button("🔊 Generate Voice Summary", key="voice_summary"):
-            with st.spinner("🎵 Generating voice summary..."):
-                # Placeholder for ElevenLabs integration
-                summary_text = f"Analysis complete. Total emissions: {st.session_state.df['Carbon_Emissions'].sum():.2f} units across {len(st.session_state.df['Country'].unique())} countries. {st.session_state.analysis_results['tree_impact']['trees_needed']:,} trees needed for offset."
-                st.success("🎵 Voice summary ready!")
-                st.write("**Summary Text:**", summary_text)
-                st.info("💡 Connect ElevenLabs API to generate actual voice audio")
+        voice_section(analyzer.voice, st.session_state.df, st.session_state.analysis_results)
         
-        # Blockchain Integration (Crossmint placeholder)
+        # Blockchain Integration (Merkle-batched ledger records via Crossmint)
         st.subheader("⛓️ Blockchain Integration")
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("💾 Store on Blockchain", key="blockchain_store"):
-                st.success("📦 Data stored on blockchain via Crossmint!")
-        with col2:
-            if st.button("🏆 Mint Carbon Credit NFT", key="mint_nft"):
-                st.success("🎨 Carbon credit NFT minted!")
+        ledger_section(ledger, st.session_state.df, st.session_state.analysis_results)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Download Results
         st.subheader("⬇️ Download Results")
-        
-        # Prepare download data
-        results_json = json.dumps(st.session_state.analysis_results, indent=2)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.download_button(
-                label="📊 Download Analysis (JSON)",
-                data=results_json,
-                file_name="carbon_analysis_results.json",
-                mime="application/json"
-            )
-        
-        with col2:
-            csv_buffer = io.StringIO()
-            st.session_state.df.to_csv(csv_buffer, index=False)
-            st.download_button(
-                label="📈 Download Data (CSV)",
-                data=csv_buffer.getvalue(),
-                file_name="carbon_emissions_data.csv",
-                mime="text/csv"
-            )
+        downloads_section(st.session_state.df, st.session_state.analysis_results)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis_core import calculate_tree_impact, calculate_trends, create_visualizations
+from regions import RegionRollup
+from result_cache import pin_frame
+from validation import COUNTRIES_CSV, validate_emissions
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_CSV = os.path.join(BASE_DIR, "carbon_emissions_data.csv")
+ARTIFACT_DIR = os.path.join(BASE_DIR, "artifacts")
+
+# Bump whenever the layout or meaning of any artifact file changes
+ARTIFACT_FORMAT_VERSION = 2
+
+FIGURE_NAMES = ["bar", "pie", "line", "area"]
+
+
+class ArtifactBundle:
+    """Precomputed analysis artifacts for one source dataset
+
+    Only the manifest and the small stats file are read up front; the frame,
+    cube, region rollup and figures are loaded on first access.
+    """
+
+    def __init__(self, out_dir: str, manifest: Dict[str, Any]):
+        self.out_dir = out_dir
+        self.manifest = manifest
+        self.stats = self._read_json("stats")
+        self._data = None
+        self._cube = None
+        self._rollup = None
+        self._figures = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.out_dir, self.manifest["files"][key]["path"])
+
+    def _read_json(self, key: str) -> Any:
+        with open(self._path(key)) as f:
+            return json.load(f)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        if self._data is None:
+            self._data = pin_frame(pd.read_parquet(self._path("data")))
+        return self._data
+
+    @property
+    def cube(self) -> Dict[str, np.ndarray]:
+        if self._cube is None:
+            with np.load(self._path("cube")) as npz:
+                self._cube = {key: npz[key] for key in npz.files}
+        return self._cube
+
+    @property
+    def rollup(self) -> RegionRollup:
+        """Region hierarchy aggregates, built from the cube without touching the frame"""
+        if self._rollup is None:
+            self._rollup = RegionRollup.from_cube(self.cube)
+        return self._rollup
+
+    @property
+    def figures(self) -> Dict[str, Any]:
+        if self._figures is None:
+            import plotly.graph_objects as go
+            self._figures = {name: go.Figure(fig) for name, fig in self._read_json("figures").items()}
+        return self._figures
+
+    def is_bundled(self, data: pd.DataFrame) -> bool:
+        """True if `data` is the frame loaded from this bundle"""
+        return self._data is not None and data is self._data
+
+    def figure_tuple(self):
+        """Figures in the order returned by create_visualizations"""
+        return tuple(self.figures[name] for name in FIGURE_NAMES)
+
+
+def _sha256(path: str) -> str:
+    """Hex digest of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _aggregate_cube(data: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Country x Year matrix of summed emissions and record counts"""
+    country_codes, countries = pd.factorize(data['Country'], sort=True)
+    year_codes, years = pd.factorize(data['Year'], sort=True)
+    flat = country_codes * len(years) + year_codes
+    shape = (len(countries), len(years))
+    values = data['Carbon_Emissions'].fillna(0).to_numpy(dtype=np.float64)
+    sums = np.bincount(flat, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+    counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+    return {
+        "countries": np.asarray(countries, dtype=str),
+        "years": np.asarray(years, dtype=np.int64),
+        "sums": sums,
+        "counts": counts.astype(np.int32),
+    }
+
+
+def _summary_stats(data: pd.DataFrame, cube: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Scalar statistics, trends and tree impact used by the analyzers"""
+    country_totals = pd.Series(cube["sums"].sum(axis=1), index=cube["countries"])
+    total_emissions = float(data['Carbon_Emissions'].sum())
+    trend = calculate_trends(data)
+    return {
+        "records": int(len(data)),
+        "total_countries": int(len(cube["countries"])),
+        "total_years": int(len(cube["years"])),
+        "year_range": f"{data['Year'].min()} - {data['Year'].max()}",
+        "total_emissions": total_emissions,
+        "avg_emissions": float(data['Carbon_Emissions'].mean()),
+        "max_emissions": float(data['Carbon_Emissions'].max()),
+        "top_emitters": {k: float(v) for k, v in country_totals.nlargest(5).items()},
+        "trend_analysis": {"growth_rate": float(trend["growth_rate"]), "trend": trend["trend"]},
+        "tree_impact": calculate_tree_impact(total_emissions),
+    }
+
+
+def _plotly_version() -> str:
+    import plotly
+    return plotly.__version__
+
+
+def build_artifacts(csv_path: str = BUNDLED_CSV, out_dir: str = ARTIFACT_DIR) -> Dict[str, Any]:
+    """Compute every artifact for a CSV and write the bundle with its manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    data, report = validate_emissions(pd.read_csv(csv_path))
+    cube = _aggregate_cube(data)
+    stats = _summary_stats(data, cube)
+    stats["validation"] = report.to_dict()
+    figures = dict(zip(FIGURE_NAMES, create_visualizations(data)))
+
+    files = {
+        "data": "data.parquet",
+        "cube": "cube.npz",
+        "stats": "stats.json",
+        "figures": "figures.json",
+    }
+    data.to_parquet(os.path.join(out_dir, files["data"]), index=False, compression="zstd")
+    np.savez_compressed(os.path.join(out_dir, files["cube"]), **cube)
+    with open(os.path.join(out_dir, files["stats"]), "w") as f:
+        json.dump(stats, f, separators=(",", ":"))
+    with open(os.path.join(out_dir, files["figures"]), "w") as f:
+        f.write("{" + ",".join(
+            f"{json.dumps(name)}:{fig.to_json()}" for name, fig in figures.items()
+        ) + "}")
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "source": os.path.basename(csv_path),
+        "source_sha256": _sha256(csv_path),
+        "countries_sha256": _sha256(COUNTRIES_CSV),
+        "plotly_version": _plotly_version(),
+        "files": {key: {"path": name, "sha256": _sha256(os.path.join(out_dir, name))}
+                  for key, name in files.items()},
+    }
+    # Write the manifest last so a partial build never validates
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def verify_artifacts(csv_path: str = BUNDLED_CSV, out_dir: str = ARTIFACT_DIR) -> Optional[Dict[str, Any]]:
+    """Return the manifest if the bundle is complete and matches its source, else None"""
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+            return None
+        if manifest.get("source_sha256") != _sha256(csv_path):
+            return None
+        if manifest.get("countries_sha256") != _sha256(COUNTRIES_CSV):
+            return None
+        for entry in manifest["files"].values():
+            if _sha256(os.path.join(out_dir, entry["path"])) != entry["sha256"]:
+                return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return manifest
+
+
+def load_artifacts(csv_path: str = BUNDLED_CSV, out_dir: str = ARTIFACT_DIR,
+                   rebuild: bool = True) -> Optional[ArtifactBundle]:
+    """Load a verified bundle, rebuilding it first if it is missing or stale"""
+    manifest = verify_artifacts(csv_path, out_dir)
+    if manifest is None:
+        if not rebuild:
+            return None
+        try:
+            build_artifacts(csv_path, out_dir)
+        except OSError:
+            # Read-only deployments without a shipped bundle compute per session
+            return None
+        manifest = verify_artifacts(csv_path, out_dir)
+        if manifest is None:
+            return None
+    return ArtifactBundle(out_dir, manifest)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build precomputed analysis artifacts for a dataset")
+    parser.add_argument("--csv", default=BUNDLED_CSV, help="Source CSV file")
+    parser.add_argument("--out", default=ARTIFACT_DIR, help="Output directory")
+    args = parser.parse_args()
+    result = build_artifacts(args.csv, args.out)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,47 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+
+def _median_seconds(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the pandas groupby with the process-pool groupby, to pick CARBON_PARALLEL_ROW_THRESHOLD")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 2_000_000, 5_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the median is reported")
+    args = parser.parse_args()
+
+    from parallel_aggregation import parallel_groupby_sum
+    from synthetic import synthetic_frame
+
+    # Start the pool before anything is timed
+    parallel_groupby_sum(synthetic_frame(1000, seed=0), "Country", workers=max(args.workers))
+
+    print(f"Country sums with string keys on {os.cpu_count()} CPUs (median of {args.repeat})")
+    print(f"  {'rows':>10} {'pandas ms':>10} " + " ".join(f"{f'{w} workers':>11}" for w in args.workers))
+    for rows in args.rows:
+        data = synthetic_frame(rows, seed=0)
+        data = data.assign(Country=data["Country"].astype(str))
+        serial = _median_seconds(lambda: data.groupby("Country")["Carbon_Emissions"].sum(), args.repeat)
+        parallel = [_median_seconds(lambda: parallel_groupby_sum(data, "Country", workers=w), args.repeat)
+                    for w in args.workers]
+        print(f"  {rows:>10,} {serial * 1000:10.1f} " + " ".join(f"{p * 1000:11.1f}" for p in parallel))
+        del data
+
+
+if __name__ == "__main__":
+    main()
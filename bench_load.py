@@ -0,0 +1,306 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+STEPS = ["upload", "analyze", "charts", "download"]
+SETTLE_TIMEOUT = 120
+
+
+class RSSSampler:
+    """Samples the process resident set size in the background"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline = self.peak = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def _rss() -> int:
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            # ru_maxrss is a high-water mark in KiB on Linux; good enough for peaks
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def dataset_path(dataset: str, rows: int, seed: int, directory: str) -> str:
+    """CSV upload for a session; synthetic panels are streamed to `directory` once per seed
+
+    Sessions read uploads from disk, so upload bytes are never held by the
+    harness and do not count towards any session's memory.
+    """
+    if dataset == "bundled":
+        from artifacts import BUNDLED_CSV
+        return BUNDLED_CSV
+    from synthetic import write_synthetic
+
+    path = os.path.join(directory, f"synthetic-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        write_synthetic(path, rows, seed)
+    return path
+
+
+@functools.lru_cache(maxsize=1)
+def _bundle():
+    """The app's artifact bundle, loaded once per process as get_bundled_artifacts does"""
+    from artifacts import load_artifacts
+    return load_artifacts(rebuild=False)
+
+
+def core_session(payload: str, export_format: str) -> Dict[str, float]:
+    """One session against the analysis core, without Streamlit
+
+    The analyze step runs the same stages as a background analysis job
+    (summary, region rollups, anomalies, the prompt digest) plus the panel
+    index the focus section builds, so the numbers size real deployments.
+    """
+    from analysis_core import calculate_tree_impact, create_visualizations
+    from analysis_summary import summarize_emissions
+    from export import iter_export
+    from panel_index import panel_index_for
+    from result_cache import pin_frame
+    from validation import validate_emissions
+
+    timings = {}
+    start = time.perf_counter()
+    data, _ = validate_emissions(pd.read_csv(payload))
+    data = pin_frame(data)
+    timings["upload"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary, _ = summarize_emissions(data, _bundle())
+    calculate_tree_impact(summary["total_emissions"])
+    panel_index_for(data)
+    timings["analyze"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for fig in create_visualizations(data):
+        fig.to_json()
+    timings["charts"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in iter_export(data, export_format):
+        pass
+    timings["download"] = time.perf_counter() - start
+    return timings
+
+
+def app_session(script: str, payload: str, export_format: str) -> Dict[str, float]:
+    """One headless session of an app script driven through AppTest"""
+    from streamlit.testing.v1 import AppTest
+    from export import iter_export
+    from result_cache import pin_frame
+    from validation import validate_emissions
+
+    at = AppTest.from_file(os.path.join(BASE_DIR, script), default_timeout=SETTLE_TIMEOUT)
+    at.run()
+
+    # AppTest cannot drive st.file_uploader, so replay what the upload branch does
+    timings = {}
+    start = time.perf_counter()
+    data, _ = validate_emissions(pd.read_csv(payload))
+    at.session_state["df"] = pin_frame(data)
+    at.session_state["data_uploaded"] = True
+    at.run()
+    timings["upload"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    at.button(key="analyze_data").click().run()
+    deadline = time.time() + SETTLE_TIMEOUT
+    while not at.session_state["data_analyzed"] or at.session_state["analysis_job"] is not None:
+        if time.time() > deadline:
+            raise TimeoutError("Analysis did not finish")
+        time.sleep(0.05)
+        at.run()
+    timings["analyze"] = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    # A rerun with results in place renders the full results page and charts
+    start = time.perf_counter()
+    at.run()
+    timings["charts"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in iter_export(at.session_state["df"], export_format):
+        pass
+    timings["download"] = time.perf_counter() - start
+    return timings
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values else (0.0, 0.0, 0.0)
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _timed_session(target: str, payload: str, export_format: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    if target == "core":
+        timings = core_session(payload, export_format)
+    else:
+        timings = app_session(target, payload, export_format)
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def _warm_up(target: str, export_format: str):
+    """Pay for imports and singletons on a tiny file before anything is measured"""
+    with tempfile.TemporaryDirectory(prefix="carbon-warmup-") as directory:
+        _timed_session(target, dataset_path("synthetic", 1000, 2 ** 32 - 1, directory), export_format)
+
+
+def _app_worker_session(target: str, payload: str, export_format: str) -> Dict[str, float]:
+    timings = _timed_session(target, payload, export_format)
+    timings["rss_mb"] = RSSSampler._rss() / 2 ** 20
+    return timings
+
+
+def run_load(target: str, dataset: str, sessions: int, concurrency: int, rows: int,
+             export_format: str, distinct: bool, directory: str, first_seed: int = 0) -> Dict:
+    """Run `sessions` sessions with at most `concurrency` in flight
+
+    Core sessions share one process, like sessions on one Streamlit server.
+    AppTest keeps process-global runtime state, so app sessions run in one
+    worker process per concurrent session and RSS is reported per worker.
+    Uploads are written to `directory` before the baseline is taken; with
+    `distinct` false every session reads the same file, otherwise seeds
+    start at `first_seed` so no run reuses another run's in-process caches.
+    """
+    payloads = [dataset_path(dataset, rows, first_seed + seed if distinct else 0, directory)
+                for seed in range(sessions if distinct and dataset == "synthetic" else 1)]
+
+    if target == "core":
+        _warm_up(target, export_format)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        session_fn = _timed_session
+    else:
+        # Workers resolve functions by module name; AppTest swaps out __main__
+        # in the worker, so refer to this file as an importable module
+        import bench_load
+        executor = ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=bench_load._warm_up, initargs=(target, export_format))
+        session_fn = bench_load._app_worker_session
+        # Start every worker and let it warm up before the clock starts
+        list(executor.map(time.sleep, [0.5] * concurrency))
+
+    errors = []
+    results = []
+    with RSSSampler() as rss, executor:
+        start = time.perf_counter()
+        futures = [executor.submit(session_fn, target, payloads[i % len(payloads)], export_format)
+                   for i in range(sessions)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+        wall = time.perf_counter() - start
+
+    if target == "core":
+        rss_per_session = (rss.peak - rss.baseline) / 2 ** 20 / max(min(concurrency, sessions), 1)
+    else:
+        rss_per_session = float(np.median([r["rss_mb"] for r in results])) if results else 0.0
+
+    return {
+        "target": target,
+        "dataset": dataset,
+        "rows": rows if dataset == "synthetic" else None,
+        "payload_bytes": os.path.getsize(payloads[0]),
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "completed": len(results),
+        "errors": errors[:5],
+        "wall_seconds": wall,
+        "throughput_per_min": len(results) / wall * 60 if wall else 0.0,
+        "latency": {step: percentiles([r[step] for r in results]) for step in STEPS + ["total"]},
+        "rss_baseline_mb": rss.baseline / 2 ** 20,
+        "rss_peak_mb": rss.peak / 2 ** 20,
+        "rss_per_session_mb": rss_per_session,
+    }
+
+
+def print_report(report: Dict):
+    rows = f", {report['rows']:,} rows" if report["rows"] else ""
+    print(f"\n{report['target']} | {report['dataset']}{rows} ({report['payload_bytes'] / 2 ** 20:.1f} MB CSV) | "
+          f"{report['sessions']} sessions, {report['concurrency']} concurrent")
+    print(f"  {'step':<10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for step, stats in report["latency"].items():
+        print(f"  {step:<10} {stats['p50'] * 1000:10.1f} {stats['p95'] * 1000:10.1f} {stats['p99'] * 1000:10.1f}")
+    print(f"  completed {report['completed']}/{report['sessions']} in {report['wall_seconds']:.1f}s "
+          f"-> {report['throughput_per_min']:.1f} sessions/min")
+    if report["target"] == "core":
+        print(f"  RSS baseline {report['rss_baseline_mb']:.0f} MB, peak {report['rss_peak_mb']:.0f} MB, "
+              f"~{report['rss_per_session_mb']:.1f} MB per concurrent session")
+    else:
+        print(f"  RSS per session worker (median) {report['rss_per_session_mb']:.0f} MB")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent dashboard sessions and report latency and memory")
+    parser.add_argument("--target", default="core", choices=["core", "app.py", "_app.py"],
+                        help="Analysis core only, or a full app script under AppTest")
+    parser.add_argument("--dataset", default="bundled", choices=["bundled", "synthetic"])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows per synthetic upload")
+    parser.add_argument("--sessions", type=int, default=20, help="Total sessions to run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8],
+                        help="Concurrent sessions; one report per value")
+    parser.add_argument("--format", default="csv.gz", help="Export format downloaded by each session")
+    parser.add_argument("--same-data", action="store_true",
+                        help="Give every synthetic session the same file (exercises the result cache)")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Use the configured result cache instead of a fresh temporary one")
+    parser.add_argument("--json", help="Also write the reports to this file")
+    args = parser.parse_args()
+
+    if not args.warm_cache:
+        os.environ["CARBON_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="carbon-load-"), "results.sqlite")
+
+    reports = []
+    # Each concurrency level gets its own uploads, since analyses are cached in-process by content
+    with tempfile.TemporaryDirectory(prefix="carbon-load-data-") as directory:
+        for level, concurrency in enumerate(args.concurrency):
+            report = run_load(args.target, args.dataset, args.sessions, concurrency, args.rows,
+                              args.format, not args.same_data, directory, level * args.sessions)
+            print_report(report)
+            reports.append(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
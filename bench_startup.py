@@ -0,0 +1,116 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+APPS = ["app.py", "_app.py"]
+
+# Modules that should not be loaded until a section needs them. Streamlit
+# and pandas pull in the top-level plotly and pyarrow packages themselves.
+HEAVY_MODULES = ["plotly.express", "pyarrow.parquet", "zstandard", "requests", "websockets"]
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {base!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+APP_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {base!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({script!r}, default_timeout=120)
+at.run()
+cold = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+warm = time.perf_counter() - start
+print(json.dumps({{
+    "cold": cold,
+    "warm": warm,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+    "exceptions": [str(e.value) for e in at.exception],
+}}))
+"""
+
+
+def _run(snippet: str) -> str:
+    """Run a snippet in a fresh interpreter and return its last stdout line"""
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        capture_output=True, text=True, cwd=BASE_DIR, check=True
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def project_modules(scripts: List[str]) -> List[str]:
+    """Project modules the app scripts import at top level, in first-import order"""
+    modules = []
+    for script in scripts:
+        with open(os.path.join(BASE_DIR, script)) as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            modules += [name for name in names if name not in modules
+                        and os.path.exists(os.path.join(BASE_DIR, f"{name}.py"))]
+    return modules
+
+
+def bench_module_imports(modules: List[str], repeat: int):
+    """Median cold import time of each project module"""
+    rows = []
+    for module in modules:
+        times = [float(_run(IMPORT_SNIPPET.format(base=BASE_DIR, module=module))) for _ in range(repeat)]
+        rows.append((module, statistics.median(times)))
+    return rows
+
+
+def bench_app_startup(script: str, repeat: int):
+    """Cold first run and warm rerun of an app script under AppTest"""
+    path = os.path.join(BASE_DIR, script)
+    runs = [json.loads(_run(APP_SNIPPET.format(base=BASE_DIR, script=path, heavy=HEAVY_MODULES)))
+            for _ in range(repeat)]
+    return {
+        "cold": statistics.median(r["cold"] for r in runs),
+        "warm": statistics.median(r["warm"] for r in runs),
+        "loaded": runs[-1]["loaded"],
+        "exceptions": runs[-1]["exceptions"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and cold start of the apps")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--apps", nargs="*", default=APPS, help="App scripts to start")
+    args = parser.parse_args()
+
+    print("Module import time (median of fresh interpreters)")
+    # Whatever the apps import at top level, so new modules are measured without editing this file
+    for module, seconds in bench_module_imports(project_modules(args.apps or APPS), args.repeat):
+        print(f"  {module:<22} {seconds * 1000:8.1f} ms")
+
+    print("\nApp startup (AppTest, first run includes all imports)")
+    for script in args.apps:
+        result = bench_app_startup(script, args.repeat)
+        print(f"  {script:<10} cold {result['cold'] * 1000:8.1f} ms   warm rerun {result['warm'] * 1000:8.1f} ms")
+        print(f"  {'':<10} heavy modules loaded on first page: {', '.join(result['loaded']) or 'none'}")
+        if result["exceptions"]:
+            print(f"  {'':<10} exceptions: {result['exceptions']}")
+
+
+if __name__ == "__main__":
+    main()
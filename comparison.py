@@ -0,0 +1,213 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Relative change below which two revisions of a cell count as equal
+CHANGE_TOLERANCE = 1e-9
+
+
+class AlignedPanel:
+    """Several emissions inventories on one shared (Country, Year) grid
+
+    values[d, c, y] holds dataset d's emissions for country c and year y;
+    present marks which cells each dataset actually reports. Every
+    comparison is an array operation over this grid.
+    """
+
+    def __init__(self, names: List[str], countries: pd.Index, years: np.ndarray,
+                 values: np.ndarray, present: np.ndarray):
+        self.names = names
+        self.countries = countries
+        self.years = years
+        self.values = values
+        self.present = present
+
+    def _index(self, name: str) -> int:
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError(f"Unknown dataset {name!r}; have {self.names}") from None
+
+    def diff(self, base: str, other: str) -> np.ndarray:
+        """other - base for every cell both datasets report, NaN elsewhere"""
+        b, o = self._index(base), self._index(other)
+        both = self.present[b] & self.present[o]
+        return np.where(both, self.values[o] - self.values[b], np.nan)
+
+    def ratio(self, base: str, other: str) -> np.ndarray:
+        """other / base for every cell both report with a non-zero base"""
+        b, o = self._index(base), self._index(other)
+        valid = self.present[b] & self.present[o] & (self.values[b] != 0)
+        return np.divide(self.values[o], self.values[b], out=np.full(self.values[b].shape, np.nan), where=valid)
+
+    def summary(self) -> pd.DataFrame:
+        """Coverage and totals of each dataset"""
+        return pd.DataFrame({
+            "Records": self.present.sum(axis=(1, 2)),
+            "Countries": self.present.any(axis=2).sum(axis=1),
+            "Years": self.present.any(axis=1).sum(axis=1),
+            "Total Emissions": self.values.sum(axis=(1, 2)),
+        }, index=pd.Index(self.names, name="Dataset"))
+
+    def year_totals(self) -> pd.DataFrame:
+        """Emissions per year, one column per dataset"""
+        totals = np.where(self.present.any(axis=1), self.values.sum(axis=1), np.nan)
+        return pd.DataFrame(totals.T, index=pd.Index(self.years, name="Year"), columns=self.names)
+
+    def country_deltas(self, base: str, other: str, tolerance: float = CHANGE_TOLERANCE) -> pd.DataFrame:
+        """Per-country totals in both datasets and how the cells changed"""
+        b, o = self._index(base), self._index(other)
+        base_values, other_values = self.values[b], self.values[o]
+        base_present, other_present = self.present[b], self.present[o]
+        both = base_present & other_present
+        changed = both & ~np.isclose(other_values, base_values, rtol=tolerance, atol=0)
+
+        base_total = base_values.sum(axis=1)
+        other_total = other_values.sum(axis=1)
+        delta = other_total - base_total
+        frame = pd.DataFrame({
+            base: base_total,
+            other: other_total,
+            "Delta": delta,
+            "Delta %": np.divide(delta * 100, base_total, out=np.full(delta.shape, np.nan), where=base_total != 0),
+            "Changed Years": changed.sum(axis=1),
+            f"Only in {base}": (base_present & ~other_present).sum(axis=1),
+            f"Only in {other}": (other_present & ~base_present).sum(axis=1),
+        }, index=self.countries.rename("Country"))
+        touched = base_present.any(axis=1) | other_present.any(axis=1)
+        return frame[touched].sort_values("Delta", key=np.abs, ascending=False)
+
+    def changes(self, base: str, other: str, tolerance: float = CHANGE_TOLERANCE) -> pd.DataFrame:
+        """Long table of every cell that was revised, added or removed"""
+        b, o = self._index(base), self._index(other)
+        base_present, other_present = self.present[b], self.present[o]
+        revised = base_present & other_present & ~np.isclose(self.values[o], self.values[b], rtol=tolerance, atol=0)
+        mask = revised | (base_present ^ other_present)
+        c, y = np.nonzero(mask)
+        base_values = np.where(base_present[c, y], self.values[b][c, y], np.nan)
+        other_values = np.where(other_present[c, y], self.values[o][c, y], np.nan)
+        kind = np.select([revised[c, y], base_present[c, y]], ["revised", "removed"], "added")
+        return pd.DataFrame({
+            "Country": self.countries[c],
+            "Year": self.years[y],
+            "Change": kind,
+            base: base_values,
+            other: other_values,
+            "Delta": other_values - base_values,
+        })
+
+
+def align_datasets(datasets: Dict[str, pd.DataFrame]) -> AlignedPanel:
+    """Place every dataset on the union (Country, Year) grid in one pass each
+
+    Countries share one sorted categorical index, so each frame maps to grid
+    cells through its category codes; duplicate rows are summed.
+    """
+    if not datasets:
+        raise ValueError("Nothing to align")
+    names = list(datasets)
+    frames = list(datasets.values())
+
+    countries = pd.Index(sorted(set().union(*(pd.unique(f['Country'].astype(str)) for f in frames))))
+    first_year = int(min(f['Year'].min() for f in frames))
+    last_year = int(max(f['Year'].max() for f in frames))
+    years = np.arange(first_year, last_year + 1, dtype=np.int64)
+
+    shape = (len(countries), len(years))
+    values = np.zeros((len(frames),) + shape, dtype=np.float64)
+    present = np.zeros((len(frames),) + shape, dtype=bool)
+    for i, frame in enumerate(frames):
+        codes = pd.Categorical(frame['Country'].astype(str), categories=countries).codes.astype(np.int64)
+        flat = codes * shape[1] + (frame['Year'].to_numpy(dtype=np.int64) - first_year)
+        emissions = frame['Carbon_Emissions'].to_numpy(dtype=np.float64)
+        values[i] = np.bincount(flat, weights=emissions, minlength=shape[0] * shape[1]).reshape(shape)
+        present[i] = (np.bincount(flat, minlength=shape[0] * shape[1]) > 0).reshape(shape)
+    return AlignedPanel(names, countries, years, values, present)
+
+
+def _unique_name(name: str, taken: Dict) -> str:
+    """name, or name with a counter when another dataset already uses it ("data.csv (2)")"""
+    candidate, counter = name, 1
+    while candidate in taken:
+        counter += 1
+        candidate = f"{name} ({counter})"
+    return candidate
+
+
+def comparison_section(current: Optional[pd.DataFrame] = None, top_n: int = 15):
+    """Upload several inventories and compare any two of them"""
+    import streamlit as st
+
+    from export import lazy_export
+    from validation import ValidationError, validate_emissions
+
+    uploads = st.file_uploader(
+        "Upload inventories to compare (CSV)",
+        type=['csv'],
+        accept_multiple_files=True,
+        key="compare_files",
+        help="Each file needs Country, Year, Carbon_Emissions columns; names are taken from the file names"
+    )
+
+    # Parse each upload once per session rather than on every rerun; forget removed files
+    parsed = st.session_state.setdefault("compare_parsed", {})
+    live = {upload.file_id for upload in uploads or []}
+    for file_id in [file_id for file_id in parsed if file_id not in live]:
+        del parsed[file_id]
+    datasets = {}
+    if current is not None:
+        datasets["Current dataset"] = current
+    for upload in uploads or []:
+        if upload.file_id not in parsed:
+            try:
+                parsed[upload.file_id] = validate_emissions(pd.read_csv(upload))[0]
+            except (ValidationError, ValueError) as e:
+                parsed[upload.file_id] = str(e)
+        frame = parsed[upload.file_id]
+        if isinstance(frame, str):
+            st.error(f"❌ {upload.name}: {frame}")
+        elif len(frame):
+            datasets[_unique_name(upload.name, datasets)] = frame
+
+    if len(datasets) < 2:
+        st.info("💡 Add at least two inventories (or one alongside the current dataset) to compare revisions")
+        return
+
+    panel = align_datasets(datasets)
+    st.dataframe(panel.summary(), width="stretch")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        base = st.selectbox("Baseline", panel.names, index=0, key="compare_base")
+    with col2:
+        other = st.selectbox("Compare with", panel.names, index=1, key="compare_other")
+    if base == other:
+        st.warning("Pick two different datasets")
+        return
+
+    deltas = panel.country_deltas(base, other)
+    changes = panel.changes(base, other)
+    counts = changes["Change"].value_counts()
+    col1, col2, col3, col4 = st.columns(4)
+    base_total, other_total = deltas[base].sum(), deltas[other].sum()
+    col1.metric("Total Change", f"{other_total - base_total:,.2f}",
+                f"{(other_total - base_total) / base_total:+.2%}" if base_total else None)
+    col2.metric("Revised Cells", f"{counts.get('revised', 0):,}")
+    col3.metric("Added Cells", f"{counts.get('added', 0):,}")
+    col4.metric("Removed Cells", f"{counts.get('removed', 0):,}")
+
+    st.write(f"**Largest country deltas ({other} vs {base}):**")
+    st.bar_chart(deltas["Delta"].head(top_n))
+    st.dataframe(deltas.head(top_n), width="stretch")
+
+    st.write("**Emissions per year:**")
+    st.line_chart(panel.year_totals()[[base, other]])
+
+    st.download_button(
+        label="📥 Download Cell Changes (CSV)",
+        data=lazy_export(changes, "csv"),
+        file_name="emissions_revision_changes.csv",
+        mime="text/csv",
+        key="compare_download"
+    )
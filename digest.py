@@ -0,0 +1,404 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from regions import UNASSIGNED, load_region_hierarchy
+from result_cache import frame_fingerprint
+from sections import input_key
+from validation import MAX_YEAR, MIN_YEAR, load_canonical_countries
+
+# Token budget of the rendered prompt context, whatever the dataset size
+PROMPT_TOKEN_BUDGET = int(os.environ.get("CARBON_PROMPT_TOKENS", "1200"))
+# Rough characters per token for English text and numbers; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+# Rows read per streaming step
+DIGEST_CHUNK_ROWS = 1_000_000
+
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# Digests kept for recently seen uploads
+DIGEST_CACHE_SIZE = 8
+
+_digests: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+class TDigest:
+    """Merging t-digest of a stream of values
+
+    Each batch is merged with the current centroids in one sort; centroids
+    that fall in the same unit of the arcsine scale function are combined,
+    which keeps about compression / 2 centroids, smallest at the tails.
+    """
+
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        clusters = np.floor(scale - scale[0]).astype(np.int64)
+        merged_weights = np.bincount(clusters, weights=weights)
+        merged_sums = np.bincount(clusters, weights=means * weights)
+        keep = merged_weights > 0
+        self.weights = merged_weights[keep]
+        self.means = merged_sums[keep] / self.weights
+
+    def quantile(self, q: float) -> float:
+        if not len(self.weights):
+            return math.nan
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - self.weights / 2
+        xp = np.concatenate([[0.0], centers, [cumulative[-1]]])
+        fp = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * cumulative[-1], xp, fp))
+
+
+class CountMinSketch:
+    """Count-min sketch of weights per key, over 64-bit key hashes
+
+    Estimates never undercount; with probability 1 - exp(-depth) each one
+    overcounts by at most e / width of the total weight added.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, seed: int = 0):
+        self.width = width
+        self.depth = depth
+        self.salts = np.random.default_rng(seed).integers(1, 2 ** 63, depth, dtype=np.uint64)
+        self.table = np.zeros((depth, width))
+        self.total = 0.0
+
+    def _buckets(self, hashes: np.ndarray) -> np.ndarray:
+        mixed = hashes[None, :] ^ self.salts[:, None]
+        mixed *= np.uint64(0x9E3779B97F4A7C15)
+        mixed ^= mixed >> np.uint64(29)
+        return (mixed % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, hashes: np.ndarray, weights: np.ndarray):
+        for row, buckets in enumerate(self._buckets(hashes)):
+            self.table[row] += np.bincount(buckets, weights=weights, minlength=self.width)
+        self.total += float(weights.sum())
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        buckets = self._buckets(hashes)
+        return self.table[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    @property
+    def error_bound(self) -> float:
+        return math.e / self.width * self.total
+
+
+def hash_names(names: np.ndarray) -> np.ndarray:
+    """Stable 64-bit hashes of country names, the keys of the sketches"""
+    return pd.util.hash_array(np.asarray(names, dtype=object))
+
+
+def valid_records(chunk: pd.DataFrame, yearly: np.ndarray,
+                  yearly_counts: np.ndarray) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """Rows of a chunk with emissions and a year in range, added to the per-year totals in place
+
+    Returns the rows, their emissions and their years as offsets from MIN_YEAR.
+    """
+    values = chunk['Carbon_Emissions'].to_numpy(dtype=np.float64)
+    years = chunk['Year'].to_numpy(dtype=np.int64)
+    valid = ~np.isnan(values) & (years >= MIN_YEAR) & (years <= MAX_YEAR)
+    if not valid.all():
+        chunk, values, years = chunk[valid], values[valid], years[valid]
+    years = years - MIN_YEAR
+    yearly += np.bincount(years, weights=values, minlength=len(yearly))
+    yearly_counts += np.bincount(years, minlength=len(yearly_counts))
+    return chunk, values, years
+
+
+class TopCountries:
+    """Country totals in a count-min sketch, with the largest estimates kept as top-K candidates"""
+
+    def __init__(self, top_k: int = 10, width: int = 4096, depth: int = 4):
+        self.top_k = top_k
+        self.sketch = CountMinSketch(width, depth)
+        self._candidates: Dict[str, float] = {}
+
+    def add(self, names: np.ndarray, hashes: np.ndarray, totals: np.ndarray):
+        """Add one chunk's totals of distinct countries `names`, hashed by hash_names"""
+        self.sketch.add(hashes, totals)
+        keys = list(self._candidates) + [name for name in names if name not in self._candidates]
+        estimates = self.sketch.estimate(hash_names(np.asarray(keys, dtype=object)))
+        keep = np.argsort(-estimates, kind="stable")[:max(4 * self.top_k, 64)]
+        self._candidates = {keys[i]: float(estimates[i]) for i in keep}
+
+    def top(self) -> List[Tuple[str, float]]:
+        return sorted(self._candidates.items(), key=lambda item: -item[1])[:self.top_k]
+
+    @property
+    def error_bound(self) -> float:
+        return self.sketch.error_bound
+
+
+class DigestBuilder:
+    """Fixed-size summary of an emissions stream, fed one chunk at a time
+
+    Memory is set by the sketch sizes and the bounded region and year grids,
+    never by the number of rows or distinct countries: a t-digest of record
+    values, a count-min sketch with top-K candidates for country totals,
+    the K largest and smallest records, and exact region x year totals.
+    """
+
+    def __init__(self, top_k: int = 10, bottom_k: int = 5, compression: float = 200,
+                 cms_width: int = 16384, cms_depth: int = 4):
+        self.top_k = top_k
+        self.bottom_k = bottom_k
+        self.values = TDigest(compression)
+        self.countries = TopCountries(top_k, cms_width, cms_depth)
+        self._largest: Optional[pd.DataFrame] = None
+        self._smallest: Optional[pd.DataFrame] = None
+        self.rows = 0
+        self.total = 0.0
+
+        # Exact totals on bounded grids: every possible year, every region
+        n_years = MAX_YEAR - MIN_YEAR + 1
+        self.yearly = np.zeros(n_years)
+        self.yearly_counts = np.zeros(n_years, dtype=np.int64)
+        hierarchy = load_region_hierarchy()
+        self.sub_regions = pd.Index(sorted(hierarchy['Sub_Region'].unique()) + [UNASSIGNED])
+        self.continents = pd.Index(sorted(hierarchy['Continent'].unique()) + [UNASSIGNED])
+        self._sub_region_of = dict(zip(hierarchy['Country'], hierarchy['Sub_Region']))
+        self._continent_of = dict(zip(hierarchy['Sub_Region'], hierarchy['Continent']))
+        self._continent_of[UNASSIGNED] = UNASSIGNED
+        canonical = load_canonical_countries()
+        self._aggregates = set(canonical.loc[canonical['Kind'] == 'aggregate', 'Country'])
+        self.sub_region_years = np.zeros((len(self.sub_regions), n_years))
+        self.continent_years = np.zeros((len(self.continents), n_years))
+
+    def update(self, chunk: pd.DataFrame):
+        chunk, values, years = valid_records(chunk, self.yearly, self.yearly_counts)
+        if not len(chunk):
+            return
+        self.rows += len(chunk)
+        self.total += float(values.sum())
+        self.values.update(values)
+
+        # Country totals of this chunk, so names are hashed once per distinct country
+        codes, names = pd.factorize(chunk['Country'])
+        names = np.asarray(names, dtype=object)
+        chunk_totals = np.bincount(codes, weights=values, minlength=len(names))
+        self.countries.add(names, hash_names(names), chunk_totals)
+
+        # Region x year totals, leaving out aggregate rows as the rollups do
+        sub_regions = np.array([self._sub_region_of.get(name, UNASSIGNED) for name in names], dtype=object)
+        sub_codes = self.sub_regions.get_indexer(sub_regions)
+        continent_codes = self.continents.get_indexer([self._continent_of[name] for name in sub_regions])
+        country = np.array([name not in self._aggregates for name in names])
+        rows = country[codes]
+        np.add.at(self.sub_region_years, (sub_codes[codes][rows], years[rows]), values[rows])
+        np.add.at(self.continent_years, (continent_codes[codes][rows], years[rows]), values[rows])
+
+        n, positive = len(values), np.flatnonzero(values > 0)
+        top = np.argpartition(values, n - self.top_k)[n - self.top_k:] if n > self.top_k else np.arange(n)
+        bottom = positive[np.argpartition(values[positive], self.bottom_k)[:self.bottom_k]] \
+            if len(positive) > self.bottom_k else positive
+        largest = pd.DataFrame({"Country": names[codes[top]], "Year": years[top] + MIN_YEAR,
+                                "Carbon_Emissions": values[top]}).nlargest(self.top_k, "Carbon_Emissions")
+        smallest = pd.DataFrame({"Country": names[codes[bottom]], "Year": years[bottom] + MIN_YEAR,
+                                 "Carbon_Emissions": values[bottom]}).nsmallest(self.bottom_k, "Carbon_Emissions")
+        if self._largest is not None:
+            largest = pd.concat([self._largest, largest]).nlargest(self.top_k, "Carbon_Emissions")
+            smallest = pd.concat([self._smallest, smallest]).nsmallest(self.bottom_k, "Carbon_Emissions")
+        self._largest, self._smallest = largest, smallest
+
+    def _region_trends(self, names: pd.Index, grid: np.ndarray, limit: int) -> List[Dict[str, Any]]:
+        reported = np.flatnonzero(self.yearly_counts)
+        if not len(reported):
+            return []
+        first, last = reported[0], reported[-1]
+        totals = grid.sum(axis=1)
+        trends = []
+        for i in np.argsort(-totals, kind="stable")[:limit]:
+            if totals[i] <= 0:
+                continue
+            start, end = grid[i, first], grid[i, last]
+            trends.append({
+                "region": names[i],
+                "total": round(float(totals[i]), 4),
+                "share": round(float(totals[i] / totals.sum()), 4),
+                "growth_rate": round(float((end - start) / start * 100), 1) if start > 0 else None,
+                "latest": round(float(end), 4),
+            })
+        return trends
+
+    def result(self) -> Dict[str, Any]:
+        reported = np.flatnonzero(self.yearly_counts)
+        yearly = pd.Series(self.yearly[reported], index=reported + MIN_YEAR)
+        top = self.countries.top()
+        digest = {
+            "rows": self.rows,
+            "emissions": {
+                "total": round(self.total, 4),
+                "mean": round(self.total / self.rows, 6) if self.rows else 0.0,
+                "min": self.values.min if self.rows else None,
+                "max": self.values.max if self.rows else None,
+                "quantiles": {f"p{round(q * 100):02d}": round(self.values.quantile(q), 6) for q in QUANTILES},
+            },
+            "years": {
+                "first": int(yearly.index[0]) if len(yearly) else None,
+                "last": int(yearly.index[-1]) if len(yearly) else None,
+                "reporting": int(len(yearly)),
+            },
+            "trend": {},
+            "top_emitters": [{"country": name, "total": round(total, 4)} for name, total in top],
+            "top_emitters_error": round(self.countries.error_bound, 4),
+            "largest_records": self._records(self._largest),
+            "smallest_records": self._records(self._smallest),
+            "continent_trends": self._region_trends(self.continents, self.continent_years, len(self.continents)),
+            "sub_region_trends": self._region_trends(self.sub_regions, self.sub_region_years, 8),
+        }
+        if len(yearly) > 1 and yearly.iloc[0] > 0:
+            span = yearly.index[-1] - yearly.index[0]
+            digest["trend"] = {
+                "growth_rate": round(float((yearly.iloc[-1] - yearly.iloc[0]) / yearly.iloc[0] * 100), 1),
+                "cagr": round(float((yearly.iloc[-1] / yearly.iloc[0]) ** (1 / span) - 1) * 100, 2),
+                "recent": {int(year): round(float(total), 4) for year, total in yearly.tail(5).items()},
+            }
+        return digest
+
+    @staticmethod
+    def _records(frame: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+        if frame is None:
+            return []
+        return [{"country": row.Country, "year": int(row.Year), "emissions": round(float(row.Carbon_Emissions), 6)}
+                for row in frame.itertuples()]
+
+
+def build_digest(data: pd.DataFrame, chunk_rows: int = DIGEST_CHUNK_ROWS, anomalies: Optional[Dict] = None,
+                 **options) -> Dict[str, Any]:
+    """Stream a frame through a DigestBuilder; anomalies is an anomaly summary to include"""
+    builder = DigestBuilder(**options)
+    for start in range(0, len(data), chunk_rows):
+        builder.update(data.iloc[start:start + chunk_rows])
+    digest = builder.result()
+    if anomalies is not None:
+        digest["anomalies"] = {"by_check": anomalies["by_check"], "top_flags": anomalies["top_flags"]}
+    return digest
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _format(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:,.4g}"
+
+
+def _sections(digest: Dict[str, Any]) -> List[Tuple[str, List[str], int]]:
+    """(header, items, minimum items) per prompt section, most important first"""
+    emissions, years, trend = digest["emissions"], digest["years"], digest["trend"]
+    overview = [
+        f"{digest['rows']:,} records, years {years['first']}-{years['last']} ({years['reporting']} reporting)",
+        f"total {_format(emissions['total'])}, mean {_format(emissions['mean'])}, "
+        f"min {_format(emissions['min'])}, max {_format(emissions['max'])}",
+        "quantiles " + ", ".join(f"{k} {_format(v)}" for k, v in emissions["quantiles"].items()),
+    ]
+    if trend:
+        overview.append(f"growth {trend['growth_rate']:+.1f}% first to last year, CAGR {trend['cagr']:+.2f}%")
+        overview.append("recent " + ", ".join(f"{y}: {_format(v)}" for y, v in trend["recent"].items()))
+
+    def regions(trends):
+        return [f"{t['region']} {_format(t['total'])} ({t['share']:.0%}, "
+                f"{'n/a' if t['growth_rate'] is None else format(t['growth_rate'], '+.1f') + '%'})" for t in trends]
+
+    sections = [
+        ("Dataset", overview, len(overview)),
+        (f"Top emitters (totals may overcount by up to {_format(digest['top_emitters_error'])})",
+         [f"{e['country']} {_format(e['total'])}" for e in digest["top_emitters"]], 3),
+        ("Continents (total, share, growth)", regions(digest["continent_trends"]), 3),
+    ]
+    if "anomalies" in digest:
+        counts = ", ".join(f"{check} {n}" for check, n in digest["anomalies"]["by_check"].items())
+        flags = [f"{f['country']} {f['year']} {f['check']} {_format(f['emissions'])}"
+                 for f in digest["anomalies"]["top_flags"]]
+        sections.append(("Anomalies", [counts] + flags, 1))
+    sections += [
+        ("Sub-regions (total, share, growth)", regions(digest["sub_region_trends"]), 0),
+        ("Largest records", [f"{r['country']} {r['year']} {_format(r['emissions'])}"
+                             for r in digest["largest_records"]], 0),
+        ("Smallest records", [f"{r['country']} {r['year']} {_format(r['emissions'])}"
+                              for r in digest["smallest_records"]], 0),
+    ]
+    return sections
+
+
+def render_prompt(digest: Dict[str, Any], budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Digest as compact prompt context that fits the token budget
+
+    Over budget, list items are dropped from the least important section
+    first, down to each section's minimum, then whole optional sections.
+    """
+    sections = [(header, list(items), minimum) for header, items, minimum in _sections(digest)]
+
+    def render() -> str:
+        return "\n".join(f"{header}: " + "; ".join(items) for header, items, _ in sections if items)
+
+    text = render()
+    while estimate_tokens(text) > budget:
+        trimmable = [i for i, (_, items, minimum) in enumerate(sections) if len(items) > minimum]
+        if not trimmable:
+            break
+        sections[trimmable[-1]][1].pop()
+        text = render()
+    return text
+
+
+def digest_for(data: pd.DataFrame, anomalies: Optional[Dict] = None) -> Dict[str, Any]:
+    """Digest of a frame and anomaly summary, reused across reruns and sessions by content hash"""
+    key = (frame_fingerprint(data), input_key(anomalies))
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+            return digest
+    digest = build_digest(data, anomalies=anomalies)
+    with _digests_lock:
+        _digests[key] = digest
+        while len(_digests) > DIGEST_CACHE_SIZE:
+            _digests.popitem(last=False)
+    return digest
+
+
+def prompt_context(data: pd.DataFrame, anomalies: Optional[Dict] = None,
+                   budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """The model prompt of a frame and its estimated size, stored as analysis["llm_context"]"""
+    prompt = render_prompt(digest_for(data, anomalies), budget)
+    return {"prompt": prompt, "estimated_tokens": estimate_tokens(prompt), "budget": budget}
+
+
+def context_section(context: Optional[Dict[str, Any]]):
+    """Expander showing the digest sent to the model"""
+    import streamlit as st
+
+    if not context:
+        return
+    with st.expander(f"🧾 Model Context (~{context['estimated_tokens']:,} of {context['budget']:,} tokens)"):
+        st.code(context["prompt"], language=None)
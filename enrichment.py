@@ -0,0 +1,266 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from regions import LEVELS, RegionRollup
+from result_cache import ResultCache, frame_fingerprint
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Directory holding the optional per country-year reference tables
+REFERENCE_DIR = os.environ.get("CARBON_REFERENCE_DIR", os.path.join(BASE_DIR, "reference"))
+
+# Reference column -> file name; each file has Country, Year and that column
+REFERENCE_TABLES = {
+    "Population": "population.csv",
+    "GDP": "gdp.csv",
+    "Energy_Use": "energy.csv",
+}
+
+# Intensity metric -> (reference column, label shown next to values)
+METRICS = {
+    "Emissions_Per_Capita": ("Population", "per person"),
+    "Emissions_Per_GDP": ("GDP", "per unit of GDP"),
+    "Emissions_Per_Energy": ("Energy_Use", "per unit of energy used"),
+}
+
+# Enriched datasets kept in memory for recently seen uploads
+ENRICHMENT_CACHE_SIZE = 8
+# Bump when the persisted enrichment aggregates change
+ENRICHMENT_VERSION = 1
+
+_reference_cache: Dict[str, "ReferenceIndex"] = {}
+_reference_lock = threading.Lock()
+_enriched: "OrderedDict[Tuple[str, str], EnrichedEmissions]" = OrderedDict()
+_enriched_lock = threading.Lock()
+
+
+class ReferenceIndex:
+    """Reference tables laid out on a dense (country code, year) grid
+
+    Built once per process. Joining a dataset is a lookup of its country
+    categories in this index followed by array indexing, so strings are
+    only hashed once per distinct country rather than once per row.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]):
+        self.columns: List[str] = [column for column in REFERENCE_TABLES if column in tables]
+        names = set()
+        years = []
+        for frame in tables.values():
+            names.update(frame['Country'].astype(str).unique())
+            years.append(frame['Year'].to_numpy(dtype=np.int64))
+        self.countries = pd.Index(sorted(names))
+        all_years = np.concatenate(years) if years else np.zeros(0, dtype=np.int64)
+        self.first_year = int(all_years.min()) if len(all_years) else 0
+        n_years = int(all_years.max()) - self.first_year + 1 if len(all_years) else 0
+
+        digest = hashlib.sha256()
+        self.grids: Dict[str, np.ndarray] = {}
+        for column in self.columns:
+            frame = tables[column]
+            grid = np.full((len(self.countries), n_years), np.nan)
+            codes = self.countries.get_indexer(frame['Country'].astype(str))
+            grid[codes, frame['Year'].to_numpy(dtype=np.int64) - self.first_year] = \
+                pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+            # Zero or negative denominators cannot produce an intensity
+            grid[grid <= 0] = np.nan
+            self.grids[column] = grid
+            digest.update(column.encode("utf-8"))
+            digest.update(frame_fingerprint(frame).encode("utf-8"))
+        self.fingerprint = digest.hexdigest()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.columns)
+
+    @classmethod
+    def load(cls, directory: str = REFERENCE_DIR) -> "ReferenceIndex":
+        """Read whichever reference tables exist in `directory`, once per process"""
+        with _reference_lock:
+            if directory not in _reference_cache:
+                tables = {}
+                for column, file_name in REFERENCE_TABLES.items():
+                    path = os.path.join(directory, file_name)
+                    if os.path.exists(path):
+                        tables[column] = pd.read_csv(path, usecols=['Country', 'Year', column])
+                _reference_cache[directory] = cls(tables)
+            return _reference_cache[directory]
+
+    def _cell_index(self, data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reference grid row and column of every data row, plus a validity mask"""
+        country = data['Country']
+        if isinstance(country.dtype, pd.CategoricalDtype):
+            codes, uniques = country.cat.codes.to_numpy(), country.cat.categories
+        else:
+            codes, uniques = pd.factorize(country)
+        # The hash join: map each distinct country once, then gather per row
+        lookup = np.append(self.countries.get_indexer(pd.Index(uniques).astype(str)), -1)
+        rows = lookup[codes]
+        cols = data['Year'].to_numpy(dtype=np.int64) - self.first_year
+        n_years = next(iter(self.grids.values())).shape[1] if self.grids else 0
+        valid = (rows >= 0) & (cols >= 0) & (cols < n_years)
+        return np.where(valid, rows, 0), np.where(valid, cols, 0), valid
+
+    def join(self, data: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Reference values aligned to the rows of `data`, NaN where unknown"""
+        if not self.available or len(data) == 0:
+            return {column: np.full(len(data), np.nan) for column in self.columns}
+        rows, cols, valid = self._cell_index(data)
+        return {column: np.where(valid, grid[rows, cols], np.nan) for column, grid in self.grids.items()}
+
+
+class EnrichedEmissions:
+    """Intensity aggregates of an emissions dataset joined with its reference values
+
+    Holds, per metric, Country x Year sums of emissions and of the reference
+    value over the rows that have both, plus the share of rows that found
+    each reference value. That is all the rankings need, so it is what gets
+    persisted. Intensity at any region level is the sum of emissions divided
+    by the sum of the reference value, so regions are weighted by size
+    rather than averaging country ratios.
+    """
+
+    def __init__(self, countries: np.ndarray, years: np.ndarray, emissions: Dict[str, np.ndarray],
+                 reference: Dict[str, np.ndarray], coverage: Dict[str, float]):
+        self.countries = np.asarray(countries, dtype=str)
+        self.years = np.asarray(years, dtype=np.int64)
+        self._emissions = emissions
+        self._reference = reference
+        self._coverage = coverage
+        self._rollups: Dict[str, Tuple[RegionRollup, RegionRollup]] = {}
+
+    @classmethod
+    def build(cls, data: pd.DataFrame, reference: ReferenceIndex) -> "EnrichedEmissions":
+        """Join a frame with the reference tables and sum each metric onto a Country x Year grid"""
+        joined = reference.join(data)
+        emissions = data['Carbon_Emissions'].to_numpy(dtype=np.float64)
+        coverage = {column: float(np.mean(~np.isnan(values))) if len(values) else 0.0
+                    for column, values in joined.items()}
+        both = {metric: ~np.isnan(joined[column]) & ~np.isnan(emissions)
+                for metric, (column, _) in METRICS.items() if column in joined}
+
+        # Only country-years with some reference value end up on the grid
+        rows = np.logical_or.reduce(list(both.values())) if both else np.zeros(len(data), dtype=bool)
+        country_codes, countries = pd.factorize(data['Country'].to_numpy()[rows], sort=True)
+        year_codes, years = pd.factorize(data['Year'].to_numpy()[rows], sort=True)
+        cells = country_codes * len(years) + year_codes
+        shape = (len(countries), len(years))
+
+        def grid(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+            return np.bincount(cells[mask], weights=values[rows][mask],
+                               minlength=shape[0] * shape[1]).reshape(shape)
+
+        emission_grids, reference_grids = {}, {}
+        for metric, mask in both.items():
+            emission_grids[metric] = grid(emissions, mask[rows])
+            reference_grids[metric] = grid(joined[METRICS[metric][0]], mask[rows])
+        return cls(np.asarray(countries, dtype=str), np.asarray(years), emission_grids, reference_grids, coverage)
+
+    def to_dict(self) -> Dict:
+        return {
+            "countries": self.countries.tolist(),
+            "years": self.years.tolist(),
+            "emissions": {metric: grid.tolist() for metric, grid in self._emissions.items()},
+            "reference": {metric: grid.tolist() for metric, grid in self._reference.items()},
+            "coverage": self._coverage,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "EnrichedEmissions":
+        shape = (len(state["countries"]), len(state["years"]))
+
+        def grids(key: str) -> Dict[str, np.ndarray]:
+            return {metric: np.asarray(grid, dtype=np.float64).reshape(shape) for metric, grid in state[key].items()}
+
+        return cls(state["countries"], state["years"], grids("emissions"), grids("reference"), state["coverage"])
+
+    @property
+    def metrics(self) -> List[str]:
+        return [metric for metric in METRICS if metric in self._emissions]
+
+    def coverage(self) -> pd.Series:
+        """Share of rows that found a reference value, per reference column"""
+        return pd.Series(self._coverage, dtype=np.float64, name="Coverage")
+
+    def _metric_rollups(self, metric: str) -> Tuple[RegionRollup, RegionRollup]:
+        """Numerator and denominator rolled up over rows that have both"""
+        if metric not in self._rollups:
+            self._rollups[metric] = (
+                RegionRollup(self.countries, self.years, self._emissions[metric]),
+                RegionRollup(self.countries, self.years, self._reference[metric]),
+            )
+        return self._rollups[metric]
+
+    def ranking(self, metric: str, level: str = "Country") -> pd.DataFrame:
+        """Members of a level ordered by intensity, highest first"""
+        if metric not in self.metrics:
+            raise KeyError(f"{metric} needs the {METRICS[metric][0]} reference table")
+        if level not in LEVELS:
+            raise KeyError(f"Unknown level {level!r}; expected one of {LEVELS}")
+        numerator, denominator = self._metric_rollups(metric)
+        emissions = numerator.totals(level)
+        reference = denominator.totals(level).reindex(emissions.index)
+        frame = pd.DataFrame({
+            "Carbon_Emissions": emissions,
+            METRICS[metric][0]: reference,
+            metric: emissions / reference,
+        })
+        frame.index.name = level
+        return frame.sort_values(metric, ascending=False)
+
+
+def enrichment_for(data: pd.DataFrame, reference: Optional[ReferenceIndex] = None,
+                   cache: Optional[ResultCache] = None) -> EnrichedEmissions:
+    """EnrichedEmissions of a frame, reused across reruns and sessions by content hash
+
+    Recent ones are kept in memory; with a result cache the aggregates are
+    also persisted, so restarts and other workers skip the join.
+    """
+    reference = reference if reference is not None else ReferenceIndex.load()
+    key = (frame_fingerprint(data), reference.fingerprint)
+    with _enriched_lock:
+        enriched = _enriched.get(key)
+        if enriched is not None:
+            _enriched.move_to_end(key)
+            return enriched
+    cache_key = cache.key("enrichment", ENRICHMENT_VERSION, *key) if cache is not None else None
+    state = cache.get(cache_key) if cache is not None else None
+    if state is not None:
+        enriched = EnrichedEmissions.from_dict(state)
+    else:
+        enriched = EnrichedEmissions.build(data, reference)
+        if cache is not None:
+            cache.put(cache_key, enriched.to_dict())
+    with _enriched_lock:
+        _enriched[key] = enriched
+        while len(_enriched) > ENRICHMENT_CACHE_SIZE:
+            _enriched.popitem(last=False)
+    return enriched
+
+
+def intensity_section(enriched: EnrichedEmissions, level: str = "Country", top_n: int = 10):
+    """Intensity ranking chart and table for one region level"""
+    import streamlit as st
+
+    if not enriched.metrics:
+        st.info(f"💡 Add {', '.join(REFERENCE_TABLES.values())} (Country, Year and a value column) "
+                f"to `{REFERENCE_DIR}` to rank emissions per capita, per GDP and per unit of energy")
+        return
+
+    metric = st.selectbox(
+        "Intensity metric",
+        enriched.metrics,
+        format_func=lambda name: f"Emissions {METRICS[name][1]}",
+        key="intensity_metric"
+    )
+    ranking = enriched.ranking(metric, level).dropna(subset=[metric])
+    coverage = enriched.coverage()[METRICS[metric][0]]
+    st.caption(f"{coverage:.0%} of records have a {METRICS[metric][0]} value; "
+               f"regions are weighted by their {METRICS[metric][0]}")
+    st.bar_chart(ranking[metric].head(top_n))
+    st.dataframe(ranking.head(top_n), width="stretch")
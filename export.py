@@ -0,0 +1,272 @@
+import io
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from result_cache import frame_fingerprint
+
+# Rows serialized per chunk; keeps each text chunk to a few MB
+CHUNK_ROWS = 50_000
+
+# Memory held by finished download payloads, shared by all sessions
+DOWNLOAD_CACHE_MAX_BYTES = int(float(os.environ.get("CARBON_DOWNLOAD_CACHE_MB", "64")) * 1024 * 1024)
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "extension": ".csv", "mime": "text/csv"},
+    "csv.gz": {"label": "CSV (gzip)", "extension": ".csv.gz", "mime": "application/gzip"},
+    "csv.zst": {"label": "CSV (zstd)", "extension": ".csv.zst", "mime": "application/zstd"},
+    "parquet": {"label": "Parquet", "extension": ".parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def available_export_formats() -> Dict[str, Dict[str, str]]:
+    """Return the export formats whose optional dependencies are installed"""
+    # find_spec checks availability without paying for the import
+    formats = dict(EXPORT_FORMATS)
+    if find_spec("zstandard") is None:
+        formats.pop("csv.zst")
+    if find_spec("pyarrow") is None:
+        formats.pop("parquet")
+    return formats
+
+
+def iter_csv(data: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield the frame as UTF-8 CSV, one block of rows at a time"""
+    for start in range(0, max(len(data), 1), chunk_rows):
+        chunk = data.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_zstd(chunks: Iterable[bytes], level: int = 3) -> Iterator[bytes]:
+    """Zstandard-compress a byte stream incrementally"""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd export requires the 'zstandard' package")
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self._pending = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._pending.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._pending)
+        self._pending = []
+        return data
+
+
+def iter_parquet(data: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield the frame as a Parquet file, one row group at a time"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package")
+    sink = _ChunkSink()
+    schema = pa.Schema.from_pandas(data.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for start in range(0, len(data), chunk_rows):
+            chunk = data.iloc[start:start + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(data: pd.DataFrame, fmt: str = "csv") -> Iterator[bytes]:
+    """Stream the frame in one of the EXPORT_FORMATS"""
+    if fmt == "csv":
+        return iter_csv(data)
+    if fmt == "csv.gz":
+        return iter_gzip(iter_csv(data))
+    if fmt == "csv.zst":
+        return iter_zstd(iter_csv(data))
+    if fmt == "parquet":
+        return iter_parquet(data)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def iter_json(payload: Any, compact: bool = True) -> Iterator[bytes]:
+    """Stream a JSON document, compact by default"""
+    if compact:
+        encoder = json.JSONEncoder(separators=(",", ":"), default=_json_default)
+    else:
+        encoder = json.JSONEncoder(indent=2, default=_json_default)
+    buffer = []
+    size = 0
+    for piece in encoder.iterencode(payload):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= 64 * 1024:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize numpy scalars and arrays that end up in analysis dicts"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class IterStream(io.RawIOBase):
+    """Read-only file object over a byte-chunk iterator
+
+    Lets st.download_button consume an export generator directly, so the
+    payload is only materialized once, as the bytes Streamlit serves.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._leftover = b""
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # Streamlit rewinds file objects before reading; allow that no-op
+        if offset == 0 and whence == io.SEEK_SET and self._position == 0:
+            return 0
+        raise io.UnsupportedOperation("IterStream only supports forward reads")
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, b) -> int:
+        while not self._leftover:
+            try:
+                self._leftover = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._leftover))
+        b[:size] = self._leftover[:size]
+        self._leftover = self._leftover[size:]
+        self._position += size
+        return size
+
+    def readall(self) -> bytes:
+        # BytesIO.getvalue() hands over its buffer without copying, so each
+        # chunk is released as soon as it is appended
+        buffer = io.BytesIO()
+        buffer.write(self._leftover)
+        self._leftover = b""
+        for chunk in self._chunks:
+            buffer.write(chunk)
+        data = buffer.getvalue()
+        self._position += len(data)
+        return data
+
+
+def export_stream(data: pd.DataFrame, fmt: str = "csv") -> IterStream:
+    """File-like stream of the frame in the given export format"""
+    return IterStream(iter_export(data, fmt))
+
+
+def json_stream(payload: Any, compact: bool = True) -> IterStream:
+    """File-like stream of a JSON document"""
+    return IterStream(iter_json(payload, compact=compact))
+
+
+def export_file_name(base_name: str, fmt: str, formats: Optional[Dict[str, Dict[str, str]]] = None) -> str:
+    """File name for a download in the given export format"""
+    formats = formats or EXPORT_FORMATS
+    return f"{base_name}{formats[fmt]['extension']}"
+
+
+class PayloadCache:
+    """Finished download payloads in memory, evicted least-recently-used first
+
+    Payloads larger than the whole budget are served but not kept.
+    """
+
+    def __init__(self, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Optional[Hashable], chunks: Callable[[], Iterable[bytes]]) -> bytes:
+        """Cached payload for key, streaming it from chunks() on a miss; key None never caches"""
+        if key is not None:
+            with self._lock:
+                payload = self._entries.get(key)
+                if payload is not None:
+                    self._entries.move_to_end(key)
+                    return payload
+        payload = IterStream(chunks()).readall()
+        if key is not None and len(payload) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = payload
+                    self._size += len(payload)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return payload
+
+    def lazy(self, key: Optional[Hashable], chunks: Callable[[], Iterable[bytes]]) -> Callable[[], bytes]:
+        """Deferred payload for st.download_button, built when the button is clicked"""
+        return lambda: self.get_or_build(key, chunks)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_payloads = PayloadCache()
+
+
+def lazy_export(data: pd.DataFrame, fmt: str = "csv") -> Callable[[], bytes]:
+    """Download of the frame that is only serialized on click, cached by content and format"""
+    return _payloads.lazy(("data", frame_fingerprint(data), fmt), lambda: iter_export(data, fmt))
+
+
+def lazy_json(payload: Callable[[], Any], key: Optional[Hashable], compact: bool = True) -> Callable[[], bytes]:
+    """Download of a JSON document built by payload() on click
+
+    key identifies the document's inputs; pass None for documents that must
+    be fresh on every click (timestamps, live usage counters).
+    """
+    cache_key = None if key is None else ("json", key, compact)
+    return _payloads.lazy(cache_key, lambda: iter_json(payload(), compact=compact))
@@ -0,0 +1,100 @@
+import argparse
+import io
+import json
+import math
+import struct
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RATE = 16000
+SECONDS_PER_CHARACTER = 0.06
+
+
+def render_tone(text: str) -> bytes:
+    """Deterministic WAV clip whose length follows the text, one tone per word"""
+    words = text.split() or [""]
+    samples_per_word = max(int(len(text) * SECONDS_PER_CHARACTER * SAMPLE_RATE / len(words)), 1)
+    frames = bytearray()
+    for word in words:
+        frequency = 220 + (sum(map(ord, word)) % 440)
+        for i in range(samples_per_word):
+            frames += struct.pack("<h", int(8000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(SAMPLE_RATE)
+        clip.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    """Mimics ElevenLabs' POST /v1/text-to-speech/{voice_id}/stream"""
+
+    protocol_version = "HTTP/1.1"
+    chunk_size = 4096
+    chunk_delay = 0.05
+    requests_served = 0
+
+    def do_POST(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 4 or parts[:2] != ["v1", "text-to-speech"] or parts[3] != "stream":
+            self._error(404, "Unknown endpoint")
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._error(400, "Body must be JSON")
+            return
+        text = body.get("text", "")
+        if not text:
+            self._error(422, "text is required")
+            return
+
+        type(self).requests_served += 1
+        audio = render_tone(text)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Chunked transfer with a delay per chunk, like a real synthesis stream
+        for start in range(0, len(audio), self.chunk_size):
+            chunk = audio[start:start + self.chunk_size]
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _error(self, status: int, message: str):
+        payload = json.dumps({"detail": {"status": "error", "message": message}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the ElevenLabs streaming TTS API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chunk-delay", type=float, default=FakeTTSHandler.chunk_delay,
+                        help="Seconds to wait between streamed chunks")
+    args = parser.parse_args()
+
+    FakeTTSHandler.chunk_delay = args.chunk_delay
+    server = ThreadingHTTPServer((args.host, args.port), FakeTTSHandler)
+    print(f"Fake TTS server on http://{args.host}:{args.port} "
+          f"(set CARBON_ELEVENLABS_URL=http://{args.host}:{args.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
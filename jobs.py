@@ -0,0 +1,204 @@
+import itertools
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Heavy jobs allowed to run at once per server; the rest wait in the queue
+MAX_CONCURRENT_JOBS = int(os.environ.get("CARBON_MAX_CONCURRENT_JOBS", "4"))
+# Finished jobs are kept this long (seconds) so sessions can collect results
+JOB_TTL = float(os.environ.get("CARBON_JOB_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled"""
+
+
+class Job:
+    """One entry in the scheduler's job table"""
+
+    def __init__(self, job_id: str, kind: str, owner: Optional[str] = None):
+        self.job_id = job_id
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """Report progress from inside the job; also a cancellation checkpoint"""
+        self.raise_if_cancelled()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def raise_if_cancelled(self):
+        """Stop the job at a safe point if cancellation was requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.job_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "owner": self.owner,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "elapsed": self.elapsed,
+        }
+
+
+class JobScheduler:
+    """In-process job table backed by a bounded thread pool
+
+    Job functions receive their Job as the first argument so they can report
+    progress and honour cancellation; results are kept by job id.
+    """
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS, ttl: float = JOB_TTL):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="carbon-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def submit(self, fn: Callable[..., Any], *args, kind: str = "job", owner: Optional[str] = None,
+               **kwargs) -> str:
+        """Queue `fn(job, *args, **kwargs)` and return its job id"""
+        self.prune()
+        job = Job(f"{kind}-{int(time.time())}-{next(self._counter)}", kind, owner)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.job_id
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        if job.cancel_requested:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            job.raise_if_cancelled()
+            job.result = result
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.message = traceback.format_exc(limit=3)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if job_id is None:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def result(self, job_id: str) -> Any:
+        """Result of a finished job, or None"""
+        job = self.get(job_id)
+        return job.result if job is not None and job.status == DONE else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job immediately or ask a running one to stop"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel_event.set()
+        if job._future is not None and job._future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return True
+
+    def jobs(self, owner: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if owner is None or job.owner == owner]
+
+    def active_count(self) -> int:
+        return sum(1 for job in self.jobs() if job.status == RUNNING)
+
+    def queued_count(self) -> int:
+        return sum(1 for job in self.jobs() if job.status == QUEUED)
+
+    def prune(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and (job.finished_at or 0) < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = False):
+        for job in self.jobs():
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def poll_job(scheduler: JobScheduler, job_id: Optional[str], label: str,
+             interval: float = 1.0) -> Optional[Job]:
+    """Render a job's progress, refreshing in place until it finishes
+
+    Only the progress fragment reruns while the job is active, so the rest of
+    the page stays interactive; a full rerun is triggered once it finishes.
+    """
+    import streamlit as st
+
+    job = scheduler.get(job_id)
+    if job is None or job.finished:
+        return job
+
+    @st.fragment(run_every=interval)
+    def _progress():
+        current = scheduler.get(job_id)
+        if current is None or current.finished:
+            st.rerun()
+        queued = f" (queued behind {scheduler.active_count()} running jobs)" if current.status == QUEUED else ""
+        st.progress(current.progress, text=f"{label}{queued} {current.message}".strip())
+        if st.button("✖ Cancel", key=f"cancel_{job_id}"):
+            scheduler.cancel(job_id)
+            st.rerun()
+
+    _progress()
+    return job
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Ledger submission endpoint; see mock_ledger_server.py for the protocol
+LEDGER_URL = os.environ.get("CARBON_LEDGER_URL", "")
+# Records per Merkle batch, and the longest a record waits for a batch to fill
+LEDGER_BATCH_SIZE = int(os.environ.get("CARBON_LEDGER_BATCH_SIZE", "256"))
+LEDGER_FLUSH_SECONDS = float(os.environ.get("CARBON_LEDGER_FLUSH_SECONDS", "2"))
+LEDGER_MAX_RETRIES = int(os.environ.get("CARBON_LEDGER_MAX_RETRIES", "5"))
+REQUEST_TIMEOUT = 15
+
+PENDING = "pending"
+SUBMITTING = "submitting"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+# Client errors worth retrying; every other 4xx is final
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+class LedgerError(RuntimeError):
+    """Raised when a batch cannot be submitted"""
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def canonical_json(value: Any) -> bytes:
+    """Stable serialization so equal records always hash the same"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def record_hash(kind: str, payload: Any) -> str:
+    """Leaf hash of one record"""
+    return hashlib.sha256(b"\x00" + canonical_json({"kind": kind, "payload": payload})).hexdigest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    # Domain-separated from leaves so a leaf can never pose as an inner node
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _levels(leaves: List[str]) -> List[List[bytes]]:
+    level = [bytes.fromhex(leaf) for leaf in leaves]
+    levels = [level]
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + [level[-1]]
+        level = [_node(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+
+def merkle_root(leaves: List[str]) -> str:
+    """Root of a binary Merkle tree over hex leaf hashes (odd nodes are paired with themselves)"""
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    return _levels(leaves)[-1][0].hex()
+
+
+def merkle_proof(leaves: List[str], index: int) -> List[Dict[str, str]]:
+    """Sibling path from leaf `index` up to the root"""
+    proof = []
+    for level in _levels(leaves)[:-1]:
+        if len(level) % 2:
+            level = level + [level[-1]]
+        sibling = index ^ 1
+        proof.append({"side": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: str, proof: List[Dict[str, str]], root: str) -> bool:
+    """Check that leaf is committed to by root"""
+    node = bytes.fromhex(leaf)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = _node(sibling, node) if step["side"] == "left" else _node(node, sibling)
+    return node.hex() == root
+
+
+class LedgerReceipt:
+    """Submission state of one record, shared by every owner that submitted it"""
+
+    def __init__(self, record_id: str, kind: str, owners: Iterable[Optional[str]] = ()):
+        self.record_id = record_id
+        self.kind = kind
+        self.owners: Set[Optional[str]] = set(owners)
+        self.status = PENDING
+        self.batch_id: Optional[str] = None
+        self.merkle_root: Optional[str] = None
+        self.proof: List[Dict[str, str]] = []
+        self.transaction: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.confirmed_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record_id": self.record_id,
+            "kind": self.kind,
+            "status": self.status,
+            "batch_id": self.batch_id,
+            "merkle_root": self.merkle_root,
+            "transaction": self.transaction,
+            "error": self.error,
+        }
+
+
+class LedgerWriter:
+    """Collects records and submits them to the ledger in Merkle-rooted batches
+
+    submit() only hashes the record and queues it; a background thread cuts a
+    batch when it is full or the flush interval passes, and posts the leaf
+    hashes with their root. The root doubles as the idempotency key, so a
+    retried batch can never be recorded twice.
+    """
+
+    def __init__(self, url: str = LEDGER_URL, api_key: str = "", batch_size: int = LEDGER_BATCH_SIZE,
+                 flush_seconds: float = LEDGER_FLUSH_SECONDS, max_retries: int = LEDGER_MAX_RETRIES):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self._receipts: Dict[str, LedgerReceipt] = {}
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def submit(self, kind: str, payload: Any, owner: Optional[str] = None) -> str:
+        """Queue a record for the next batch and return its record id (the leaf hash)"""
+        record_id = record_hash(kind, payload)
+        with self._lock:
+            existing = self._receipts.get(record_id)
+            # Identical records are stored once unless an earlier attempt failed,
+            # but each submitting session sees the record among its receipts
+            if existing is not None and existing.status != FAILED:
+                existing.owners.add(owner)
+                return record_id
+            owners = existing.owners | {owner} if existing is not None else {owner}
+            self._receipts[record_id] = LedgerReceipt(record_id, kind, owners)
+            self._ensure_worker()
+        self._queue.put(record_id)
+        return record_id
+
+    def receipt(self, record_id: str) -> Optional[LedgerReceipt]:
+        with self._lock:
+            return self._receipts.get(record_id)
+
+    def receipts(self, owner: Optional[str] = None) -> List[LedgerReceipt]:
+        with self._lock:
+            receipts = list(self._receipts.values())
+        return [r for r in receipts if owner is None or owner in r.owners]
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every queued record has been confirmed or failed"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(r.status in (CONFIRMED, FAILED) for r in self.receipts()):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def shutdown(self):
+        self._stopped.set()
+        self._queue.put(None)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name="carbon-ledger", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    record_id = self._queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if record_id is None:
+                    self._stopped.set()
+                    break
+                batch.append(record_id)
+            self._process(batch)
+
+    def _process(self, leaves: List[str]):
+        leaves = sorted(set(leaves))
+        root = merkle_root(leaves)
+        receipts = [self.receipt(leaf) for leaf in leaves]
+        for receipt in receipts:
+            receipt.status = SUBMITTING
+            receipt.merkle_root = root
+        try:
+            result = self._post_batch(root, leaves, receipts)
+        except Exception as e:
+            # Any failure settles the batch, so the worker carries on and nothing polls forever
+            for receipt in receipts:
+                receipt.status = FAILED
+                receipt.error = str(e) if isinstance(e, LedgerError) else f"{type(e).__name__}: {e}"
+            return
+        now = time.time()
+        for index, receipt in enumerate(receipts):
+            receipt.batch_id = result.get("batch_id")
+            receipt.transaction = result.get("transaction")
+            receipt.proof = merkle_proof(leaves, index)
+            receipt.status = CONFIRMED
+            receipt.confirmed_at = now
+
+    def _post_batch(self, root: str, leaves: List[str], receipts: List[LedgerReceipt]) -> Dict:
+        """POST one batch, retrying transient failures with jittered exponential backoff"""
+        if not self.enabled:
+            raise LedgerError("Ledger endpoint not configured")
+
+        import requests
+
+        body = {
+            "merkle_root": root,
+            "leaves": [{"hash": r.record_id, "kind": r.kind} for r in receipts],
+        }
+        headers = {"Idempotency-Key": root, "Content-Type": "application/json"}
+        if self.api_key:
+            headers["X-API-KEY"] = self.api_key
+
+        last_error = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(min(0.25 * 2 ** (attempt - 1), 8.0) * (0.5 + random.random()))
+            try:
+                response = requests.post(f"{self.url}/v1/batches", data=canonical_json(body),
+                                         headers=headers, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                last_error = f"{type(e).__name__}: {e}"
+                continue
+            if response.status_code in (200, 201):
+                try:
+                    result = response.json()
+                except ValueError:
+                    raise LedgerError(f"Ledger acknowledgement is not JSON: {response.text[:200]}")
+                if not isinstance(result, dict) or result.get("merkle_root") != root:
+                    raise LedgerError("Ledger acknowledged a different Merkle root")
+                return result
+            last_error = f"Ledger returned {response.status_code}: {response.text[:200]}"
+            if response.status_code < 500 and response.status_code not in RETRYABLE_STATUS:
+                break
+        raise LedgerError(last_error)
+
+
+def show_ledger_receipts(writer: LedgerWriter, owner: Optional[str], interval: float = 1.0):
+    """Table of this session's ledger records, refreshing until all have settled"""
+    import pandas as pd
+    import streamlit as st
+
+    if not writer.receipts(owner):
+        return
+
+    def _table():
+        receipts = sorted(writer.receipts(owner), key=lambda r: r.created_at)
+        st.dataframe(pd.DataFrame([{
+            "Record": r.record_id[:16],
+            "Kind": r.kind,
+            "Status": r.status,
+            "Merkle root": (r.merkle_root or "")[:16],
+            "Transaction": r.transaction or r.error or "",
+        } for r in receipts]), hide_index=True)
+        return any(r.status in (PENDING, SUBMITTING) for r in receipts)
+
+    @st.fragment(run_every=interval)
+    def _live():
+        if not _table():
+            st.rerun()
+
+    if any(r.status in (PENDING, SUBMITTING) for r in writer.receipts(owner)):
+        _live()
+    else:
+        _table()
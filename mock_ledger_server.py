@@ -0,0 +1,115 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ledger import merkle_root
+
+
+class MockLedgerHandler(BaseHTTPRequestHandler):
+    """In-memory stand-in for the ledger's batch API
+
+    POST /v1/batches checks the Merkle root against the submitted leaves and
+    honours Idempotency-Key; GET /v1/batches/<id> returns a stored batch.
+    """
+
+    protocol_version = "HTTP/1.1"
+    fail_rate = 0.0
+    latency = 0.05
+    batches = {}
+    idempotency = {}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/batches":
+            self._send(404, {"error": "Unknown endpoint"})
+            return
+        key = self.headers.get("Idempotency-Key")
+        if not key:
+            self._send(400, {"error": "Idempotency-Key header is required"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            leaves = [leaf["hash"] for leaf in body["leaves"]]
+            root = merkle_root(leaves)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": f"Malformed batch: {e}"})
+            return
+        if root != body.get("merkle_root"):
+            self._send(422, {"error": "merkle_root does not match leaves"})
+            return
+
+        time.sleep(self.latency)
+        with self.lock:
+            replay = key in self.idempotency
+            if not replay:
+                batch_id = f"batch-{len(self.batches) + 1}"
+                self.batches[batch_id] = {
+                    "batch_id": batch_id,
+                    "merkle_root": root,
+                    "leaf_count": len(leaves),
+                    "transaction": "0x" + hashlib.sha256(f"{batch_id}:{root}".encode("utf-8")).hexdigest(),
+                    "recorded_at": time.time(),
+                    "attempts": 0,
+                }
+                self.idempotency[key] = batch_id
+            batch = self.batches[self.idempotency[key]]
+            # Submissions seen for this batch, retries included
+            batch["attempts"] += 1
+
+        # Injected failures happen after the batch is recorded, so a client
+        # retry must be answered from the idempotency table, not stored twice
+        if random.random() < self.fail_rate:
+            self._send(503, {"error": "Injected failure"})
+            return
+        self._send(200 if replay else 201, batch)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 3 and parts[:2] == ["v1", "batches"] and parts[2] in self.batches:
+            self._send(200, self.batches[parts[2]])
+        elif self.path.rstrip("/") == "/v1/batches":
+            self._send(200, {"batches": list(self.batches.values())})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the ledger batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of submissions answered with 503")
+    parser.add_argument("--latency", type=float, default=MockLedgerHandler.latency, help="Seconds per submission")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for injected failures, for repeatable runs")
+    args = parser.parse_args()
+
+    MockLedgerHandler.fail_rate = args.fail_rate
+    MockLedgerHandler.latency = args.latency
+    if args.seed is not None:
+        random.seed(args.seed)
+    # Port 0 picks a free port; the line below reports the one bound
+    server = ThreadingHTTPServer((args.host, args.port), MockLedgerHandler)
+    host, port = server.server_address[:2]
+    print(f"Mock ledger on http://{host}:{port} (set CARBON_LEDGER_URL=http://{host}:{port})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from enrichment import REFERENCE_DIR
+from regions import load_region_hierarchy
+from sections import memoized_section
+
+# Optional table of candidate sites replacing the built-in ones; columns as in default_sites()
+SITES_FILE = "planting_sites.csv"
+
+# calculate_tree_impact() reads one emissions unit as 1000 lbs of CO2
+LBS_PER_UNIT = 1000
+
+# Species -> (climate zone, lbs CO2 absorbed per tree per year, planting cost in USD, trees per acre)
+SPECIES = {
+    "Oak": ("temperate", 48, 3.00, 400),
+    "Pine": ("temperate", 35, 1.50, 700),
+    "Maple": ("temperate", 42, 2.50, 450),
+    "Birch": ("temperate", 30, 1.80, 600),
+    "Mahogany": ("tropical", 60, 4.00, 300),
+    "Teak": ("tropical", 52, 3.00, 500),
+    "Eucalyptus": ("tropical", 55, 1.20, 1000),
+    "Mangrove": ("tropical", 70, 5.00, 1500),
+}
+
+TROPICAL_SUB_REGIONS = {
+    "Caribbean", "Central America", "Eastern Africa", "Melanesia", "Micronesia", "Middle Africa", "Polynesia",
+    "South America", "South-eastern Asia", "Southern Asia", "Western Africa",
+}
+
+# Planting cost relative to the species' base cost, by continent
+CONTINENT_COST = {
+    "Africa": 0.6, "Asia": 0.8, "Europe": 1.4, "North America": 1.3, "South America": 0.7, "Oceania": 1.2,
+}
+
+LINEAR_PROGRAM = "linear program"
+GREEDY = "greedy"
+
+_sites: Optional[pd.DataFrame] = None
+_sites_lock = threading.Lock()
+
+
+def default_sites() -> pd.DataFrame:
+    """One candidate site per sub-region and species suited to its climate
+
+    Columns: Region, Continent, Species, CO2_Lbs_Per_Tree, Cost_Per_Tree,
+    Acres_Per_Tree and an optional Land_Acres (land available in the
+    region, shared by its sites; the scenario's land limit when missing).
+    """
+    hierarchy = load_region_hierarchy()[['Sub_Region', 'Continent']].drop_duplicates()
+    hierarchy = hierarchy[hierarchy['Continent'].isin(list(CONTINENT_COST))]
+    rows = []
+    for region, continent in hierarchy.itertuples(index=False):
+        zone = "tropical" if region in TROPICAL_SUB_REGIONS else "temperate"
+        for species, (species_zone, absorption, cost, density) in SPECIES.items():
+            if species_zone == zone:
+                rows.append((region, continent, species, absorption, cost * CONTINENT_COST[continent], 1 / density))
+    return pd.DataFrame(rows, columns=['Region', 'Continent', 'Species', 'CO2_Lbs_Per_Tree', 'Cost_Per_Tree',
+                                       'Acres_Per_Tree'])
+
+
+def load_sites(directory: str = REFERENCE_DIR) -> pd.DataFrame:
+    """Candidate sites from the reference directory if present, else the built-in ones; read once per process"""
+    global _sites
+    with _sites_lock:
+        if _sites is None:
+            path = os.path.join(directory, SITES_FILE)
+            _sites = pd.read_csv(path) if os.path.exists(path) else default_sites()
+        return _sites
+
+
+class PlantingPlan:
+    """Trees per candidate site and what they achieve against the target"""
+
+    def __init__(self, allocation: pd.DataFrame, target_lbs: float, budget: float, method: str, seconds: float):
+        self.allocation = allocation
+        self.target_lbs = target_lbs
+        self.budget = budget
+        self.method = method
+        self.seconds = seconds
+
+    @property
+    def trees(self) -> int:
+        return int(self.allocation['Trees'].sum())
+
+    @property
+    def cost(self) -> float:
+        return float(self.allocation['Cost'].sum())
+
+    @property
+    def absorbed_lbs(self) -> float:
+        return float(self.allocation['CO2_Lbs'].sum())
+
+    @property
+    def residual_lbs(self) -> float:
+        return max(self.target_lbs - self.absorbed_lbs, 0.0)
+
+    def by(self, column: str) -> pd.DataFrame:
+        """Trees, cost, absorption and land per region, continent or species, largest first"""
+        return (self.allocation.groupby(column)[['Trees', 'Cost', 'CO2_Lbs', 'Acres']].sum()
+                .sort_values('CO2_Lbs', ascending=False))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trees": self.trees,
+            "cost": round(self.cost, 2),
+            "target_lbs": round(self.target_lbs, 2),
+            "absorbed_lbs": round(self.absorbed_lbs, 2),
+            "residual_lbs": round(self.residual_lbs, 2),
+            "method": self.method,
+            "milliseconds": round(self.seconds * 1000, 2),
+        }
+
+
+def _solve_lp(absorption: np.ndarray, cost: np.ndarray, acres: np.ndarray, regions: np.ndarray,
+              land: np.ndarray, target: float, budget: float) -> np.ndarray:
+    """Trees per site maximizing absorption up to the target, then at the lowest cost"""
+    from scipy.optimize import linprog
+    from scipy.sparse import csr_array, vstack
+
+    # Regions without a land limit get no row
+    limited = np.isfinite(land)
+    rows = np.cumsum(limited) - 1
+    sites = np.flatnonzero(limited[regions])
+    land_rows = csr_array((acres[sites], (rows[regions[sites]], sites)), shape=(int(limited.sum()), len(absorption)))
+    limits = [land_rows, csr_array(absorption[None, :])]
+    bounds = [land[limited], [target]]
+    if math.isfinite(budget):
+        limits.append(csr_array(cost[None, :]))
+        bounds.append([budget])
+    a_ub, b_ub = vstack(limits).tocsr(), np.concatenate(bounds)
+    first = linprog(-absorption, A_ub=a_ub, b_ub=b_ub, bounds=(0, None), method="highs")
+    if first.status != 0:
+        raise RuntimeError(f"Planting LP failed: {first.message}")
+
+    # Among plans that absorb as much, take the cheapest
+    reach = -first.fun * (1 - 1e-9)
+    second = linprog(cost, A_ub=vstack([a_ub, csr_array(-absorption[None, :])]).tocsr(),
+                     b_ub=np.append(b_ub, -reach), bounds=(0, None), method="highs")
+    return second.x if second.status == 0 else first.x
+
+
+def _solve_greedy(absorption: np.ndarray, cost: np.ndarray, acres: np.ndarray, regions: np.ndarray,
+                  land: np.ndarray, target: float, budget: float) -> np.ndarray:
+    """Fill sites in order of absorption per dollar; optimal without land limits, close with them"""
+    trees = np.zeros(len(absorption))
+    land = land.astype(np.float64)
+    for i in np.argsort(-absorption / cost, kind="stable"):
+        if target <= 0 or budget <= 0:
+            break
+        n = min(land[regions[i]] / acres[i], target / absorption[i], budget / cost[i])
+        if n <= 0:
+            continue
+        trees[i] = n
+        land[regions[i]] -= n * acres[i]
+        target -= n * absorption[i]
+        budget -= n * cost[i]
+    return trees
+
+
+def optimize_planting(sites: pd.DataFrame, target_lbs: float, budget: float = math.inf,
+                      land_acres: float = math.inf) -> PlantingPlan:
+    """Allocate a planting budget across candidate sites to minimize the emissions left unabsorbed
+
+    Sites in one region share its land (Land_Acres, else `land_acres`).
+    Solved as a linear program with scipy's HiGHS when scipy is installed,
+    otherwise greedily; fractional trees are rounded down per site. A
+    negative target, budget or land (net-negative emissions) plants nothing.
+    """
+    started = time.perf_counter()
+    target_lbs, budget, land_acres = max(target_lbs, 0.0), max(budget, 0.0), max(land_acres, 0.0)
+    region_codes, region_names = pd.factorize(sites['Region'])
+    if 'Land_Acres' in sites:
+        land = sites.groupby(region_codes)['Land_Acres'].max().fillna(land_acres).to_numpy(dtype=np.float64)
+    else:
+        land = np.full(len(region_names), land_acres, dtype=np.float64)
+    absorption = sites['CO2_Lbs_Per_Tree'].to_numpy(dtype=np.float64)
+    cost = sites['Cost_Per_Tree'].to_numpy(dtype=np.float64)
+    acres = sites['Acres_Per_Tree'].to_numpy(dtype=np.float64)
+
+    try:
+        trees = _solve_lp(absorption, cost, acres, region_codes, land, target_lbs, budget)
+        method = LINEAR_PROGRAM
+    except ImportError:
+        trees = _solve_greedy(absorption, cost, acres, region_codes, land, target_lbs, budget)
+        method = GREEDY
+
+    trees = np.floor(trees + 1e-6)
+    planted = trees > 0
+    allocation = sites.loc[planted, [c for c in ('Region', 'Continent', 'Species') if c in sites]].copy()
+    allocation['Trees'] = trees[planted].astype(np.int64)
+    allocation['Cost'] = trees[planted] * cost[planted]
+    allocation['CO2_Lbs'] = trees[planted] * absorption[planted]
+    allocation['Acres'] = trees[planted] * acres[planted]
+    allocation = allocation.sort_values('CO2_Lbs', ascending=False, ignore_index=True)
+    return PlantingPlan(allocation, target_lbs, budget, method, time.perf_counter() - started)
+
+
+def default_land(target_lbs: float, sites: pd.DataFrame) -> float:
+    """Land per region such that a full offset with typical sites needs about a quarter of the regions"""
+    typical = float((sites['Acres_Per_Tree'] / sites['CO2_Lbs_Per_Tree']).median())
+    return target_lbs * typical / max(1, sites['Region'].nunique() / 4)
+
+
+@memoized_section(maxsize=64)
+def plan_for(target_lbs: float, budget: float = math.inf, land_acres: Optional[float] = None) -> PlantingPlan:
+    """Plan for one scenario over the loaded sites, shared by reruns and sessions"""
+    sites = load_sites()
+    if land_acres is None:
+        land_acres = default_land(max(target_lbs, 0.0), sites)
+    return optimize_planting(sites, target_lbs, budget, land_acres)
+
+
+def planting_section(total_emissions: float):
+    """Sliders for the offset target, budget and land, and the optimal plan; re-solved as they move"""
+    import plotly.express as px
+    import streamlit as st
+
+    sites = load_sites()
+    full_target = total_emissions * LBS_PER_UNIT
+    if full_target <= 0:
+        st.info("No emissions to offset in this dataset")
+        return
+    col1, col2, col3 = st.columns(3)
+    share = col1.slider("Share of emissions to offset (%)", 5, 100, 100, 5, key="plan_share")
+    target = full_target * share / 100
+    reference_cost = target / float(sites['CO2_Lbs_Per_Tree'].median()) * float(sites['Cost_Per_Tree'].median())
+    # Slider steps keep the number of distinct scenarios, and so cache misses, small
+    step = max(1.0, float(10 ** math.floor(math.log10(max(reference_cost, 1) / 50))))
+    budget = col2.slider("Budget (USD)", 0.0, step * math.ceil(reference_cost * 2 / step),
+                         step * round(reference_cost / 2 / step), step, key="plan_budget", format="$%.0f")
+    land_step = max(0.01, float(10 ** math.floor(math.log10(max(default_land(full_target, sites), 0.01) / 20))))
+    land = col3.slider("Land per region (acres)", 0.0, land_step * 80, land_step * 20, land_step,
+                       key="plan_land", format="%.2f")
+
+    plan = plan_for(target, budget, land)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Trees to Plant", f"{plan.trees:,}")
+    col2.metric("Cost", f"${plan.cost:,.0f}", f"${budget - plan.cost:,.0f} unspent", delta_color="off")
+    col3.metric("CO₂ Absorbed", f"{plan.absorbed_lbs:,.0f} lbs/yr")
+    col4.metric("Residual", f"{plan.residual_lbs:,.0f} lbs/yr",
+                f"{plan.residual_lbs / target:.0%} of target" if target else None, delta_color="inverse")
+    if plan.allocation.empty:
+        st.info("No trees fit this budget and land; raise either to see a plan")
+        return
+    figure = px.bar(plan.by('Region').reset_index(), x='Region', y='Trees', title="Trees by Region",
+                    hover_data=['Cost', 'CO2_Lbs', 'Acres'])
+    st.plotly_chart(figure, use_container_width=True)
+    st.dataframe(plan.allocation, width="stretch", hide_index=True)
+    st.caption(f"Solved by {plan.method} over {len(sites):,} candidate sites in {plan.seconds * 1000:.1f} ms")
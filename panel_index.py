@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis_core import calculate_tree_impact, calculate_trends
+from parallel_aggregation import groupby_sum
+from regions import RegionRollup
+from result_cache import frame_fingerprint
+
+# How a subset summary was produced
+PATH_CACHED = "cached aggregates"
+PATH_SCAN = "raw scan"
+
+# Indexes kept for recently seen uploads
+INDEX_CACHE_SIZE = 8
+
+_indexes: "OrderedDict[str, PanelIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class _SegmentTree:
+    """Range min or max over the year axis, for every country at once
+
+    Leaves are the per-cell values; each query walks O(log years) nodes and
+    combines whole columns, so it answers all selected countries together.
+    """
+
+    def __init__(self, leaves: np.ndarray, op: np.ufunc, identity: float):
+        self.op = op
+        self.identity = identity
+        self.size = 1 << max(0, int(leaves.shape[1] - 1).bit_length())
+        self.tree = np.full((leaves.shape[0], 2 * self.size), identity)
+        self.tree[:, self.size:self.size + leaves.shape[1]] = leaves
+        node = self.size
+        while node > 1:
+            parents = slice(node // 2, node)
+            self.tree[:, parents] = op(self.tree[:, node:2 * node:2], self.tree[:, node + 1:2 * node:2])
+            node //= 2
+
+    def query(self, rows: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """op over years [start, stop) for each of `rows`"""
+        result = np.full(len(rows), self.identity)
+        low, high = start + self.size, stop + self.size
+        while low < high:
+            if low & 1:
+                result = self.op(result, self.tree[rows, low])
+                low += 1
+            if high & 1:
+                high -= 1
+                result = self.op(result, self.tree[rows, high])
+            low //= 2
+            high //= 2
+        return result
+
+
+class SubsetSummary:
+    """Summary statistics of a subset and how they were obtained"""
+
+    def __init__(self, stats: Dict[str, Any], path: str, reason: str, seconds: float):
+        self.stats = stats
+        self.path = path
+        self.reason = reason
+        self.seconds = seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"path": self.path, "reason": self.reason, "milliseconds": round(self.seconds * 1000, 2)}
+
+
+class PanelIndex:
+    """Aggregates of a dataset that answer subset queries without touching rows
+
+    A Country x Year grid of sums, record counts, per-cell min and max, with
+    prefix sums along years and segment trees for min and max. A subset of
+    countries and a year window is then a handful of array lookups: sums and
+    counts by prefix differences, extremes by tree queries, top-N by a
+    partial sort of the window totals. Row-level filters still need a scan.
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        country_codes, countries = pd.factorize(data['Country'], sort=True)
+        year_codes, years = pd.factorize(data['Year'], sort=True)
+        self.countries = pd.Index(np.asarray(countries, dtype=str), name="Country")
+        self.years = np.asarray(years, dtype=np.int64)
+        shape = (len(self.countries), len(self.years))
+        flat = country_codes * shape[1] + year_codes
+        values = data['Carbon_Emissions'].fillna(0).to_numpy(dtype=np.float64)
+
+        self.sums = np.bincount(flat, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+        self.counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+        maxima = np.full(shape[0] * shape[1], -np.inf)
+        minima = np.full(shape[0] * shape[1], np.inf)
+        np.maximum.at(maxima, flat, values)
+        np.minimum.at(minima, flat, values)
+
+        zero = np.zeros((shape[0], 1))
+        self._sum_prefix = np.concatenate([zero, np.cumsum(self.sums, axis=1)], axis=1)
+        self._count_prefix = np.concatenate([zero, np.cumsum(self.counts, axis=1)], axis=1)
+        self._max_tree = _SegmentTree(maxima.reshape(shape), np.maximum, -np.inf)
+        self._min_tree = _SegmentTree(minima.reshape(shape), np.minimum, np.inf)
+
+    def _rows(self, countries: Optional[Iterable[str]]) -> np.ndarray:
+        if not countries:
+            return np.arange(len(self.countries))
+        rows = self.countries.get_indexer(list(countries))
+        return rows[rows >= 0]
+
+    def _window(self, years: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+        """Column range [start, stop) of an inclusive (first, last) year window"""
+        if years is None:
+            return 0, len(self.years)
+        return (int(np.searchsorted(self.years, years[0], side="left")),
+                int(np.searchsorted(self.years, years[1], side="right")))
+
+    def summary(self, countries: Optional[Iterable[str]] = None, years: Optional[Tuple[int, int]] = None,
+                min_emissions: Optional[float] = None) -> SubsetSummary:
+        """Statistics of the rows in `countries` (all if empty) within an inclusive year window
+
+        min_emissions keeps only records at or above it; that is a row-level
+        filter the grid cannot answer, so it falls back to a raw scan.
+        """
+        started = time.perf_counter()
+        if min_emissions is not None:
+            stats = self._scan(countries, years, min_emissions)
+            return SubsetSummary(stats, PATH_SCAN, "record-level emissions filter", time.perf_counter() - started)
+
+        rows = self._rows(countries)
+        start, stop = self._window(years)
+        totals = self._sum_prefix[rows, stop] - self._sum_prefix[rows, start]
+        records = self._count_prefix[rows, stop] - self._count_prefix[rows, start]
+        reporting = records > 0
+        yearly_counts = self.counts[rows, start:stop].sum(axis=0)
+        yearly = pd.Series(self.sums[rows, start:stop].sum(axis=0), index=self.years[start:stop])[yearly_counts > 0]
+
+        n_records = int(records.sum())
+        total = float(totals.sum())
+        top = np.argsort(-totals[reporting], kind="stable")[:5]
+        top_names = self.countries[rows[reporting][top]]
+        maximum = self._max_tree.query(rows[reporting], start, stop).max(initial=-np.inf)
+        minimum = self._min_tree.query(rows[reporting], start, stop).min(initial=np.inf)
+
+        window = RegionRollup(self.countries[rows].to_numpy(), self.years[start:stop], self.sums[rows, start:stop])
+        stats = {
+            "records": n_records,
+            "total_countries": int(reporting.sum()),
+            "total_years": int(len(yearly)),
+            "year_range": f"{yearly.index.min()} - {yearly.index.max()}" if len(yearly) else "",
+            "total_emissions": total,
+            "avg_emissions": total / n_records if n_records else 0.0,
+            "max_emissions": float(maximum) if n_records else 0.0,
+            "min_emissions": float(minimum) if n_records else 0.0,
+            "top_emitters": {name: float(value) for name, value in zip(top_names, totals[reporting][top])},
+            "trend_analysis": _trend(yearly),
+            "regional_emitters": {level: window.top(level, 5).to_dict() for level in ("Sub-region", "Continent")},
+            "tree_impact": calculate_tree_impact(total),
+        }
+        return SubsetSummary(stats, PATH_CACHED, "countries and year window", time.perf_counter() - started)
+
+    def records(self, countries: Optional[Iterable[str]] = None, years: Optional[Tuple[int, int]] = None,
+                min_emissions: Optional[float] = None) -> pd.DataFrame:
+        """The rows behind summary(), for callers that need records rather than statistics"""
+        data = self.data
+        mask = np.ones(len(data), dtype=bool)
+        if countries:
+            mask &= data['Country'].isin(list(countries)).to_numpy()
+        if years is not None:
+            mask &= data['Year'].between(years[0], years[1]).to_numpy()
+        if min_emissions is not None:
+            mask &= (data['Carbon_Emissions'] >= min_emissions).to_numpy()
+        return data if mask.all() else data[mask]
+
+    def _scan(self, countries: Optional[Iterable[str]], years: Optional[Tuple[int, int]],
+              min_emissions: Optional[float]) -> Dict[str, Any]:
+        """The same statistics computed from the filtered rows"""
+        subset = self.records(countries, years, min_emissions)
+        if len(subset) == 0:
+            return {"records": 0, "total_countries": 0, "total_years": 0, "year_range": "",
+                    "total_emissions": 0.0, "avg_emissions": 0.0, "max_emissions": 0.0, "min_emissions": 0.0,
+                    "top_emitters": {}, "trend_analysis": calculate_trends(subset),
+                    "regional_emitters": {level: {} for level in ("Sub-region", "Continent")},
+                    "tree_impact": calculate_tree_impact(0.0)}
+        total = float(subset['Carbon_Emissions'].sum())
+        rollup = RegionRollup.from_frame(subset)
+        return {
+            "records": int(len(subset)),
+            "total_countries": int(subset['Country'].nunique()),
+            "total_years": int(subset['Year'].nunique()),
+            "year_range": f"{subset['Year'].min()} - {subset['Year'].max()}",
+            "total_emissions": total,
+            "avg_emissions": float(subset['Carbon_Emissions'].mean()),
+            "max_emissions": float(subset['Carbon_Emissions'].max()),
+            "min_emissions": float(subset['Carbon_Emissions'].min()),
+            "top_emitters": {str(k): float(v) for k, v in groupby_sum(subset, 'Country').nlargest(5).items()},
+            "trend_analysis": calculate_trends(subset),
+            "regional_emitters": {level: rollup.top(level, 5).to_dict() for level in ("Sub-region", "Continent")},
+            "tree_impact": calculate_tree_impact(total),
+        }
+
+
+def _trend(yearly: pd.Series) -> Dict:
+    """calculate_trends() from yearly totals"""
+    if len(yearly) > 1:
+        growth_rate = float((yearly.iloc[-1] - yearly.iloc[0]) / yearly.iloc[0] * 100)
+        return {"growth_rate": growth_rate, "trend": "increasing" if growth_rate > 0 else "decreasing"}
+    return {"growth_rate": 0, "trend": "stable"}
+
+
+def panel_index_for(data: pd.DataFrame) -> PanelIndex:
+    """PanelIndex of a frame, reused across reruns and sessions by content hash"""
+    key = frame_fingerprint(data)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = PanelIndex(data)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
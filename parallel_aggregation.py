@@ -0,0 +1,140 @@
+import os
+import multiprocessing
+import sys
+import types
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Frames with fewer rows than this are aggregated with a plain pandas groupby
+PARALLEL_ROW_THRESHOLD = int(os.environ.get("CARBON_PARALLEL_ROW_THRESHOLD", "2000000"))
+PARALLEL_WORKERS = int(os.environ.get("CARBON_PARALLEL_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        # Streamlit runs scripts on threads, so never fork the server process
+        _executor = ProcessPoolExecutor(
+            max_workers=PARALLEL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+@contextmanager
+def _plain_main():
+    """Hide the app script from spawned workers while they start
+
+    Streamlit (and AppTest) run the script as __main__, and a spawned worker
+    re-runs its parent's __main__ file before taking tasks.
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _partial_sums(name: str, by: str, value: str, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Factorize and sum one row range of the shared table; returns (keys, sums) of that range"""
+    import pyarrow as pa
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf)).read_all().slice(start, stop - start)
+        keys = table.column(by).combine_chunks()
+        if not pa.types.is_dictionary(keys.type):
+            keys = keys.dictionary_encode()
+        # Missing keys get one extra slot, dropped below as groupby drops them
+        n_keys = len(keys.dictionary)
+        codes = keys.indices.fill_null(n_keys).to_numpy()
+        values = table.column(value).to_numpy()
+        sums = np.bincount(codes, weights=values, minlength=n_keys + 1)[:n_keys]
+        seen = np.bincount(codes, minlength=n_keys + 1)[:n_keys] > 0
+        result = keys.dictionary.to_numpy(zero_copy_only=False)[seen], sums[seen]
+        del table, keys, values
+        return result
+    finally:
+        shm.close()
+
+
+def _to_shared(table) -> shared_memory.SharedMemory:
+    """Write a pyarrow table into a new shared memory block as an IPC stream"""
+    import pyarrow as pa
+
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    shm = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+    buffer = pa.py_buffer(shm.buf)
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+        writer.write_table(table)
+    del buffer
+    return shm
+
+
+def parallel_groupby_sum(data: pd.DataFrame, by: str, value: str = 'Carbon_Emissions',
+                         workers: Optional[int] = None) -> pd.Series:
+    """Sum `value` per `by` group across a process pool over shared memory
+
+    The key and value columns are copied once into shared memory as an
+    Arrow stream. Each worker dictionary-encodes and bincounts a contiguous
+    row range, so the hashing of keys is split up; the parent only merges
+    the small per-range results by key.
+    """
+    import pyarrow as pa
+
+    # Match groupby semantics: skip missing values, drop missing keys (in the workers)
+    values = pd.to_numeric(data[value], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    table = pa.table({by: pa.array(data[by]), value: np.nan_to_num(values, nan=0.0)})
+
+    n_rows = len(table)
+    workers = workers or PARALLEL_WORKERS
+    bounds = np.linspace(0, n_rows, workers + 1, dtype=np.int64)
+
+    shm = _to_shared(table)
+    del table
+    try:
+        executor = _get_executor()
+        # Workers are spawned on demand as tasks are submitted
+        with _plain_main():
+            futures = [
+                executor.submit(_partial_sums, shm.name, by, value, int(start), int(stop))
+                for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+            ]
+        partials = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    if not partials:
+        return data.groupby(by)[value].sum()
+    keys = np.concatenate([keys for keys, _ in partials])
+    sums = np.concatenate([sums for _, sums in partials])
+    totals = pd.Series(sums, index=pd.Index(keys, name=by), name=value).groupby(level=0).sum()
+    if isinstance(data[by].dtype, pd.CategoricalDtype):
+        totals.index = pd.CategoricalIndex(totals.index, dtype=data[by].dtype, name=by)
+    return totals
+
+
+def groupby_sum(data: pd.DataFrame, by: str, value: str = 'Carbon_Emissions') -> pd.Series:
+    """Sum `value` per `by` group, going parallel above PARALLEL_ROW_THRESHOLD rows
+
+    Categorical and numeric keys stay serial: pandas sums them with one
+    bincount over existing codes, which no process pool beats. Hashing
+    string keys is what the workers split up.
+    """
+    key = data[by].dtype
+    hashed = not isinstance(key, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(key)
+    if hashed and len(data) >= PARALLEL_ROW_THRESHOLD and PARALLEL_WORKERS > 1:
+        return parallel_groupby_sum(data, by, value)
+    return data.groupby(by)[value].sum()
@@ -0,0 +1,239 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis_core import calculate_tree_impact
+from digest import DIGEST_CHUNK_ROWS, TopCountries, hash_names, valid_records
+from result_cache import frame_fingerprint
+from validation import MAX_YEAR, MIN_YEAR
+
+# Uploads with at least this many rows get an approximate preview while the exact analysis runs
+PREVIEW_MIN_ROWS = int(os.environ.get("CARBON_PREVIEW_MIN_ROWS", "1000000"))
+
+# Records kept in the reservoir sample behind the quantile estimates
+PREVIEW_SAMPLE_SIZE = 100_000
+
+# Confidence of the reported error bounds
+CONFIDENCE = 0.95
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Previews kept for recently seen uploads
+PREVIEW_CACHE_SIZE = 8
+
+_previews: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_previews_lock = threading.Lock()
+
+
+class HyperLogLog:
+    """Distinct count of a stream of 64-bit hashes in 2 ** precision registers
+
+    The relative standard error is 1.04 / sqrt(2 ** precision), 1.6% with
+    the default 4096 one-byte registers.
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+
+        # Leading zeros of the remaining bits by binary search on the high bits
+        zeros = np.zeros(len(rest), dtype=np.uint8)
+        for shift in (32, 16, 8, 4, 2, 1):
+            high_clear = rest < np.uint64(1 << (64 - shift))
+            zeros[high_clear] += shift
+            rest[high_clear] <<= np.uint64(shift)
+        zeros[rest == 0] = 64
+        rank = np.minimum(zeros, 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def count(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate while many registers are unset
+            estimate = m * math.log(m / empty)
+        return float(estimate)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class ReservoirSample:
+    """Uniform sample of a stream of values without replacement
+
+    Every value draws a random key and the `size` smallest keys are kept,
+    which is Algorithm R applied a whole chunk at a time.
+    """
+
+    def __init__(self, size: int = PREVIEW_SAMPLE_SIZE, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+        self.seen = 0
+
+    def add(self, values: np.ndarray):
+        self.seen += len(values)
+        keys = self.rng.random(len(values))
+        if len(self.keys) == self.size:
+            # Only keys below the current cut-off can enter the sample
+            entering = keys < self.keys.max()
+            keys, values = keys[entering], values[entering]
+        keys = np.concatenate([self.keys, keys])
+        values = np.concatenate([self.values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+    @property
+    def rank_error(self) -> float:
+        """Largest quantile rank error at CONFIDENCE (Dvoretzky-Kiefer-Wolfowitz); 0 for a full copy"""
+        if self.seen <= self.size or not len(self.values):
+            return 0.0
+        return math.sqrt(math.log(2 / (1 - CONFIDENCE)) / (2 * len(self.values)))
+
+
+class PreviewBuilder:
+    """Approximate headline numbers of an emissions stream, fed one chunk at a time
+
+    Distinct countries come from a HyperLogLog, country totals from a
+    count-min sketch with top-K candidates and quantiles from a reservoir
+    sample. Row counts, totals, extremes and yearly totals are kept exactly,
+    since a running sum per year costs no more than the sketches.
+    """
+
+    def __init__(self, top_k: int = 10, sample_size: int = PREVIEW_SAMPLE_SIZE, cms_width: int = 16384):
+        self.top_k = top_k
+        self.distinct = HyperLogLog()
+        self.countries = TopCountries(top_k, cms_width)
+        self.sample = ReservoirSample(sample_size)
+        self.rows = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.yearly = np.zeros(MAX_YEAR - MIN_YEAR + 1)
+        self.yearly_counts = np.zeros(MAX_YEAR - MIN_YEAR + 1, dtype=np.int64)
+
+    def update(self, chunk: pd.DataFrame):
+        chunk, values, _ = valid_records(chunk, self.yearly, self.yearly_counts)
+        if not len(chunk):
+            return
+        self.rows += len(chunk)
+        self.total += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.sample.add(values)
+
+        # Each distinct country of the chunk is hashed once, for both sketches
+        codes, names = pd.factorize(chunk['Country'])
+        names = np.asarray(names, dtype=object)
+        hashes = hash_names(names)
+        self.distinct.add(hashes)
+        self.countries.add(names, hashes, np.bincount(codes, weights=values, minlength=len(names)))
+
+    def result(self) -> Dict[str, Any]:
+        reported = np.flatnonzero(self.yearly_counts)
+        top = self.countries.top()
+        distinct = self.distinct.count()
+        return {
+            "approximate": True,
+            "rows": self.rows,
+            "total_emissions": self.total,
+            "avg_emissions": self.total / self.rows if self.rows else 0.0,
+            "max_emissions": self.maximum if self.rows else 0.0,
+            "min_emissions": self.minimum if self.rows else 0.0,
+            "countries": int(round(distinct)),
+            "countries_error": int(math.ceil(self.distinct.relative_error * 2 * distinct)),
+            "years": int(len(reported)),
+            "yearly": {int(year): float(total) for year, total in zip(reported + MIN_YEAR, self.yearly[reported])},
+            "top_emitters": {name: total for name, total in top},
+            "top_emitters_error": self.countries.error_bound,
+            "quantiles": {f"p{round(q * 100):02d}": float(np.quantile(self.sample.values, q))
+                          for q in QUANTILES} if len(self.sample.values) else {},
+            "quantile_rank_error": self.sample.rank_error,
+            "sample_rows": int(len(self.sample.values)),
+            "tree_impact": calculate_tree_impact(self.total),
+        }
+
+
+def build_preview(data: pd.DataFrame, chunk_rows: int = DIGEST_CHUNK_ROWS, **options) -> Dict[str, Any]:
+    """Stream a frame through a PreviewBuilder"""
+    started = time.perf_counter()
+    builder = PreviewBuilder(**options)
+    for start in range(0, len(data), chunk_rows):
+        builder.update(data.iloc[start:start + chunk_rows])
+    preview = builder.result()
+    preview["seconds"] = time.perf_counter() - started
+    return preview
+
+
+def preview_for(data: pd.DataFrame) -> Dict[str, Any]:
+    """Preview of a frame, reused across reruns and sessions by content hash"""
+    key = frame_fingerprint(data)
+    with _previews_lock:
+        preview = _previews.get(key)
+        if preview is not None:
+            _previews.move_to_end(key)
+            return preview
+    preview = build_preview(data)
+    with _previews_lock:
+        _previews[key] = preview
+        while len(_previews) > PREVIEW_CACHE_SIZE:
+            _previews.popitem(last=False)
+    return preview
+
+
+def wants_preview(data: Optional[pd.DataFrame]) -> bool:
+    """Whether an upload is large enough to preview before the exact analysis"""
+    return data is not None and len(data) >= PREVIEW_MIN_ROWS
+
+
+def preview_section(preview: Dict[str, Any]):
+    """Approximate metric cards and charts, shown until the exact results replace them"""
+    import plotly.graph_objects as go
+    import streamlit as st
+
+    st.info(f"⚡ Approximate preview of {preview['rows']:,} records, computed in {preview['seconds']:.2f}s "
+            "from streaming sketches; exact results replace it when the analysis finishes.")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Emissions", f"{preview['total_emissions']:,.2f} units")
+    col2.metric("Countries Analyzed", f"≈ {preview['countries']:,}",
+                help=f"HyperLogLog estimate, ± {preview['countries_error']:,} at {CONFIDENCE:.0%} confidence")
+    col3.metric("Years Covered", f"{preview['years']}")
+    col4.metric("Trees Needed", f"{preview['tree_impact']['trees_needed']:,}")
+
+    error = preview["top_emitters_error"]
+    names = list(preview["top_emitters"])
+    totals = list(preview["top_emitters"].values())
+    bar = go.Figure(go.Bar(
+        x=names, y=totals,
+        # Count-min estimates only ever overcount: the true total lies up to `error` below
+        error_y=dict(type="data", symmetric=False, array=[0] * len(totals), arrayminus=[error] * len(totals)),
+    ))
+    bar.update_layout(title="Top Emitters (estimated)", xaxis_title="Country", yaxis_title="Total Emissions")
+    yearly = pd.Series(preview["yearly"])
+    line = go.Figure(go.Scatter(x=yearly.index, y=yearly.values, mode="lines+markers"))
+    line.update_layout(title="Emissions Trend Over Time", xaxis_title="Year", yaxis_title="Total Emissions")
+    col1, col2 = st.columns(2)
+    col1.plotly_chart(bar, use_container_width=True)
+    col2.plotly_chart(line, use_container_width=True)
+
+    if preview["quantiles"]:
+        st.caption("Record quantiles from a reservoir sample of {:,} records (rank error ± {:.2%}): {}".format(
+            preview["sample_rows"], preview["quantile_rank_error"],
+            ", ".join(f"{name} {value:,.4g}" for name, value in preview["quantiles"].items())))
@@ -0,0 +1,187 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from result_cache import frame_fingerprint
+from validation import load_canonical_countries
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGIONS_CSV = os.path.join(BASE_DIR, "reference", "regions.csv")
+
+# Hierarchy levels, finest first; each level rolls up into the next
+LEVELS = ["Country", "Sub-region", "Continent", "World"]
+LEVEL_PLURALS = {"Country": "Countries", "Sub-region": "Sub-regions", "Continent": "Continents", "World": "World"}
+
+# Parent of countries missing from the mapping table
+UNASSIGNED = "Unassigned"
+
+# Rollups kept for recently seen uploads
+ROLLUP_CACHE_SIZE = 8
+
+_regions_cache: Optional[pd.DataFrame] = None
+_rollups: "OrderedDict[str, RegionRollup]" = OrderedDict()
+_rollups_lock = threading.Lock()
+
+
+def load_region_hierarchy(path: str = REGIONS_CSV) -> pd.DataFrame:
+    """Country to sub-region to continent table, read once per process"""
+    global _regions_cache
+    if path != REGIONS_CSV:
+        return pd.read_csv(path)
+    if _regions_cache is None:
+        _regions_cache = pd.read_csv(path)
+    return _regions_cache
+
+
+class _Level:
+    """Precomputed aggregates for one hierarchy level"""
+
+    __slots__ = ("names", "by_year", "totals", "order", "parent")
+
+    def __init__(self, names: pd.Index, by_year: np.ndarray, parent: Optional[np.ndarray]):
+        self.names = names
+        self.by_year = by_year
+        self.totals = by_year.sum(axis=1)
+        # Descending order, so rankings and top-N are slices
+        self.order = np.argsort(-self.totals, kind="stable")
+        # Code of each member's parent in the next level up
+        self.parent = parent
+
+
+class RegionRollup:
+    """Emissions aggregated at every level of the region hierarchy
+
+    Built bottom-up in one pass from a Country x Year matrix: each level is
+    the previous one summed by parent code. Regional and income-group
+    aggregate rows are left out so that no emissions are counted twice.
+    """
+
+    def __init__(self, countries: np.ndarray, years: np.ndarray, sums: np.ndarray):
+        canonical = load_canonical_countries()
+        aggregates = canonical.loc[canonical['Kind'] == 'aggregate', 'Country']
+        keep = ~np.isin(countries, aggregates.to_numpy())
+        countries, sums = np.asarray(countries, dtype=str)[keep], sums[keep]
+        self.years = np.asarray(years, dtype=np.int64)
+
+        hierarchy = load_region_hierarchy().set_index('Country')
+        sub_regions = hierarchy['Sub_Region'].reindex(countries).fillna(UNASSIGNED).to_numpy()
+        continent_of = dict(zip(hierarchy['Sub_Region'], hierarchy['Continent']))
+        continent_of[UNASSIGNED] = UNASSIGNED
+
+        sub_codes, sub_names = pd.factorize(sub_regions, sort=True)
+        continents = np.array([continent_of[name] for name in sub_names], dtype=object)
+        continent_codes, continent_names = pd.factorize(continents, sort=True)
+
+        self._levels: Dict[str, _Level] = {}
+        self._levels["Country"] = _Level(pd.Index(countries, name="Country"), sums, sub_codes)
+        sub_sums = self._roll_up(sums, sub_codes, len(sub_names))
+        self._levels["Sub-region"] = _Level(pd.Index(sub_names, name="Sub-region"), sub_sums, continent_codes)
+        continent_sums = self._roll_up(sub_sums, continent_codes, len(continent_names))
+        self._levels["Continent"] = _Level(pd.Index(continent_names, name="Continent"), continent_sums,
+                                           np.zeros(len(continent_names), dtype=np.int64))
+        self._levels["World"] = _Level(pd.Index(["World"], name="World"), continent_sums.sum(axis=0, keepdims=True),
+                                       None)
+
+    @staticmethod
+    def _roll_up(child_sums: np.ndarray, parent_codes: np.ndarray, n_parents: int) -> np.ndarray:
+        sums = np.zeros((n_parents, child_sums.shape[1]), dtype=np.float64)
+        np.add.at(sums, parent_codes, child_sums)
+        return sums
+
+    @classmethod
+    def from_cube(cls, cube: Dict[str, np.ndarray]) -> "RegionRollup":
+        """Build from an artifact cube (countries, years, sums)"""
+        return cls(cube["countries"], cube["years"], cube["sums"])
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame) -> "RegionRollup":
+        country_codes, countries = pd.factorize(data['Country'], sort=True)
+        year_codes, years = pd.factorize(data['Year'], sort=True)
+        shape = (len(countries), len(years))
+        values = data['Carbon_Emissions'].fillna(0).to_numpy(dtype=np.float64)
+        sums = np.bincount(country_codes * shape[1] + year_codes, weights=values,
+                           minlength=shape[0] * shape[1]).reshape(shape)
+        return cls(np.asarray(countries, dtype=str), np.asarray(years), sums)
+
+    def _level(self, level: str) -> _Level:
+        try:
+            return self._levels[level]
+        except KeyError:
+            raise KeyError(f"Unknown level {level!r}; expected one of {LEVELS}") from None
+
+    @property
+    def world_total(self) -> float:
+        return float(self._levels["World"].totals[0])
+
+    def totals(self, level: str) -> pd.Series:
+        """Total emissions of every member of a level, largest first"""
+        lvl = self._level(level)
+        return pd.Series(lvl.totals[lvl.order], index=lvl.names[lvl.order], name="Carbon_Emissions")
+
+    def top(self, level: str, n: int = 5) -> pd.Series:
+        lvl = self._level(level)
+        order = lvl.order[:n]
+        return pd.Series(lvl.totals[order], index=lvl.names[order], name="Carbon_Emissions")
+
+    def shares(self, level: str) -> pd.Series:
+        """Fraction of world emissions held by each member, largest first"""
+        totals = self.totals(level)
+        return totals / self.world_total if self.world_total else totals * np.nan
+
+    def by_year(self, level: str, members: Optional[pd.Index] = None) -> pd.DataFrame:
+        """Year x member table of emissions"""
+        lvl = self._level(level)
+        frame = pd.DataFrame(lvl.by_year.T, index=pd.Index(self.years, name="Year"), columns=lvl.names)
+        return frame if members is None else frame[members]
+
+    def parent_of(self, level: str, name: str) -> str:
+        """Name of the member of the next level up that contains `name`"""
+        lvl = self._level(level)
+        if lvl.parent is None:
+            raise KeyError("World has no parent")
+        parent_level = LEVELS[LEVELS.index(level) + 1]
+        return self._levels[parent_level].names[lvl.parent[lvl.names.get_loc(name)]]
+
+    def countries_in(self, level: str, name: str) -> pd.Index:
+        """Every country that rolls up into `name`"""
+        index = LEVELS.index(level)
+        codes = np.array([self._level(level).names.get_loc(name)])
+        for child_level in reversed(LEVELS[:index]):
+            child = self._levels[child_level]
+            codes = np.flatnonzero(np.isin(child.parent, codes))
+        return self._levels["Country"].names[codes]
+
+    def children(self, level: str, name: str) -> pd.Series:
+        """Totals of the members one level down that roll up into `name`, largest first"""
+        index = LEVELS.index(level)
+        if index == 0:
+            raise KeyError("Countries have no children")
+        child = self._levels[LEVELS[index - 1]]
+        code = self._level(level).names.get_loc(name)
+        order = child.order[child.parent[child.order] == code]
+        return pd.Series(child.totals[order], index=child.names[order], name="Carbon_Emissions")
+
+
+def rollup_for(data: pd.DataFrame, bundle=None) -> RegionRollup:
+    """RegionRollup of a frame, reused across reruns and sessions by content hash
+
+    The bundled dataset's rollup comes straight from its artifact cube.
+    """
+    if bundle is not None and bundle.is_bundled(data):
+        return bundle.rollup
+    key = frame_fingerprint(data)
+    with _rollups_lock:
+        rollup = _rollups.get(key)
+        if rollup is not None:
+            _rollups.move_to_end(key)
+            return rollup
+    rollup = RegionRollup.from_frame(data)
+    with _rollups_lock:
+        _rollups[key] = rollup
+        while len(_rollups) > ROLLUP_CACHE_SIZE:
+            _rollups.popitem(last=False)
+    return rollup
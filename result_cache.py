@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# One SQLite file shared by every session and worker process on the host
+CACHE_PATH = os.environ.get("CARBON_CACHE_PATH", os.path.join(BASE_DIR, ".cache", "results.sqlite"))
+CACHE_MAX_BYTES = int(float(os.environ.get("CARBON_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Bump to invalidate every entry written by older code
+CACHE_SCHEMA_VERSION = 1
+
+# Fingerprints of pinned frames by id(), with the column labels and length they were taken at
+_pinned: Dict[int, Tuple[Tuple, str]] = {}
+_pinned_lock = threading.Lock()
+
+
+def _hash_frame(data: pd.DataFrame) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in data.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _shape_key(data: pd.DataFrame) -> Tuple:
+    return tuple(map(str, data.columns)), len(data)
+
+
+def pin_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """Private copy of a dataset entering the app, fingerprinted once
+
+    The caller's frame is left alone and may still be modified; the copy
+    is what sessions hold, and the app never writes to it, so its
+    fingerprint is memoized for the copy's lifetime.
+    """
+    with _pinned_lock:
+        if id(data) in _pinned:
+            return data
+    pinned = data.copy()
+    fingerprint = _hash_frame(pinned)
+    with _pinned_lock:
+        _pinned[id(pinned)] = (_shape_key(pinned), fingerprint)
+    weakref.finalize(pinned, _pinned.pop, id(pinned), None)
+    return pinned
+
+
+def frame_fingerprint(data: pd.DataFrame) -> str:
+    """Content hash of a frame; memoized for pinned frames, recomputed for any other
+
+    Frames that are not pinned may be edited in place between calls, so
+    they are hashed on every call rather than served a stale hash.
+    """
+    cached = _pinned.get(id(data))
+    if cached is not None and cached[0] == _shape_key(data):
+        return cached[1]
+    return _hash_frame(data)
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultCache:
+    """Content-addressed, size-bounded result store on SQLite
+
+    Values are JSON documents stored zlib-compressed. Entries are evicted
+    least-recently-used first once the total payload exceeds max_bytes.
+    WAL mode lets several worker processes read and write the same file.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " namespace TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(namespace: str, *parts: Any) -> str:
+        """Deterministic key for a namespace and its inputs"""
+        payload = json.dumps([CACHE_SCHEMA_VERSION, namespace, parts], sort_keys=True, default=_json_default)
+        return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError):
+            # A broken cache must never break an analysis
+            return None
+
+    def put(self, key: str, value: Any):
+        try:
+            blob = zlib.compress(json.dumps(value, separators=(",", ":"), default=_json_default).encode("utf-8"))
+        except (TypeError, ValueError):
+            return
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        namespace = key.split(":", 1)[0]
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, namespace, value, size, created, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, blob, len(blob), now, now)
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least-recently-used entries until the cache fits max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def get_or_compute(self, key: str, compute) -> Any:
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+        ).fetchall()
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "entries": sum(r[1] for r in rows),
+            "bytes": sum(r[2] for r in rows),
+            "namespaces": {r[0]: {"entries": r[1], "bytes": r[2]} for r in rows},
+        }
+
+    def clear(self, namespace: Optional[str] = None):
+        conn = self._connection()
+        if namespace is None:
+            conn.execute("DELETE FROM entries")
+        else:
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
@@ -0,0 +1,75 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import pandas as pd
+
+from analysis_core import level_visualizations
+from result_cache import frame_fingerprint
+
+# Results kept per builder; builders are keyed by dataset, so a few entries cover every live session
+SECTION_CACHE_SIZE = 32
+
+
+def input_key(value: Any) -> Hashable:
+    """Cheap, stable key for one input of a section builder
+
+    Frames are keyed by their (memoized) content fingerprint and JSON-like
+    values by a digest of their canonical form; anything else must be
+    hashable and is keyed by itself.
+    """
+    if isinstance(value, pd.DataFrame):
+        return ("frame", frame_fingerprint(value))
+    if isinstance(value, (dict, list, tuple)):
+        encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return ("json", hashlib.sha256(encoded.encode("utf-8")).hexdigest())
+    return value
+
+
+def memoized_section(maxsize: int = SECTION_CACHE_SIZE) -> Callable:
+    """Memoize a pure section builder on its inputs, shared by all sessions
+
+    A rerun whose inputs are unchanged gets the previous result back without
+    recomputing it. Callers must treat results as read-only.
+    """
+    def decorator(fn: Callable) -> Callable:
+        entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (tuple(input_key(arg) for arg in args),
+                   tuple((name, input_key(value)) for name, value in sorted(kwargs.items())))
+            with lock:
+                if key in entries:
+                    entries.move_to_end(key)
+                    return entries[key]
+            result = fn(*args, **kwargs)
+            with lock:
+                entries[key] = result
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
+
+@memoized_section()
+def dataset_metrics(data: pd.DataFrame) -> dict:
+    """Headline numbers shown in the metric cards and voice summary"""
+    return {
+        "total_emissions": float(data['Carbon_Emissions'].sum()),
+        "countries": int(data['Country'].nunique()),
+        "years": int(data['Year'].nunique()),
+    }
+
+
+@memoized_section()
+def level_figures(rollup, level: str) -> tuple:
+    """Bar, pie and line figures for one region level of a (cached) rollup"""
+    return level_visualizations(rollup, level)
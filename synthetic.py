@@ -0,0 +1,150 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from validation import load_canonical_countries
+
+# Entities generated per block; every block has its own seeded generator, so
+# the output does not depend on how it is consumed
+BLOCK_ENTITIES = 16_384
+
+# "Use Sample Data" panel: small enough to analyze instantly, the same on every click
+SAMPLE_ROWS = 1_000
+SAMPLE_SEED = 42
+
+FIRST_YEAR = 1965
+LAST_YEAR = 2023
+
+# Median yearly emissions of an entity, in the units of the bundled dataset
+MEDIAN_EMISSIONS = 0.22
+
+# Expected share of an entity's years it reports before gaps: half start in
+# the first year, the rest uniformly in the first 60% of the span
+REPORTING_SHARE = 0.85
+
+
+def _entity_names(seed: int, start: int, stop: int) -> np.ndarray:
+    """Names of entities [start, stop)
+
+    The first entities are the canonical countries in a seeded order; past
+    them, numbered sub-national series of the same countries ("China #2")
+    let a panel grow beyond one row per country-year.
+    """
+    countries = load_canonical_countries()
+    countries = countries.loc[countries['Kind'] != 'aggregate', 'Country'].to_numpy(dtype=object)
+    countries = countries[np.random.default_rng(seed).permutation(len(countries))]
+    index = np.arange(start, stop)
+    names = countries[index % len(countries)]
+    series = index // len(countries)
+    numbered = series > 0
+    names[numbered] = [f"{name} #{n + 1}" for name, n in zip(names[numbered], series[numbered])]
+    return names
+
+
+def _block(seed: int, block: int, first_entity: int, n_entities: int, years: np.ndarray,
+           missing_rate: float, noise: float) -> pd.DataFrame:
+    """Panel rows of one block of entities, in entity then year order"""
+    rng = np.random.default_rng([seed, block])
+    n_years = len(years)
+    t = np.arange(n_years, dtype=np.float64)
+
+    # Log-quadratic trend: most series grow, then level off or decline
+    base = np.log(MEDIAN_EMISSIONS) + rng.normal(0, 0.6, n_entities)
+    growth = rng.normal(0.015, 0.02, n_entities)
+    curvature = rng.normal(-0.0003, 0.0003, n_entities)
+    log_level = base[:, None] + growth[:, None] * t + curvature[:, None] * t ** 2
+
+    # AR(1) year-to-year noise in log space
+    shocks = rng.normal(0, noise, (n_entities, n_years))
+    for y in range(1, n_years):
+        shocks[:, y] += 0.6 * shocks[:, y - 1]
+    values = np.exp(log_level + shocks).round(3)
+
+    # Half the entities report from the first year, the rest start later; gaps are random
+    start = np.where(rng.random(n_entities) < 0.5, 0, rng.integers(0, max(1, int(n_years * 0.6)), n_entities))
+    present = (t[None, :] >= start[:, None]) & (rng.random((n_entities, n_years)) >= missing_rate)
+
+    entity, year = np.nonzero(present)
+    names = _entity_names(seed, first_entity, first_entity + n_entities)
+    return pd.DataFrame({
+        'Country': pd.Categorical.from_codes(entity, categories=names),
+        'Year': years[year],
+        'Carbon_Emissions': values[entity, year],
+    })
+
+
+def iter_synthetic(rows: int, seed: int = 0, first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR,
+                   missing_rate: float = 0.05, noise: float = 0.08) -> Iterator[pd.DataFrame]:
+    """Yield a seeded Country x Year emissions panel of exactly `rows` rows, one block at a time
+
+    Every (Country, Year) pair is unique, so the panel passes validation
+    without duplicates. The same arguments always give the same rows.
+    """
+    years = np.arange(first_year, last_year + 1, dtype=np.int16)
+    rows_per_entity = len(years) * REPORTING_SHARE * (1 - missing_rate)
+    produced = 0
+    entities = 0
+    block = 0
+    while produced < rows:
+        # Ask for 10% more entities than expected so gaps rarely need an extra block
+        needed = math.ceil((rows - produced) / rows_per_entity * 1.1)
+        size = min(BLOCK_ENTITIES, max(1, needed))
+        frame = _block(seed, block, entities, size, years, missing_rate, noise)
+        frame = frame.iloc[:rows - produced]
+        produced += len(frame)
+        entities += size
+        block += 1
+        yield frame
+
+
+def synthetic_frame(rows: int, seed: int = 0, **options) -> pd.DataFrame:
+    """Whole synthetic panel in memory, typed like a validated upload"""
+    frames = list(iter_synthetic(rows, seed, **options))
+    data = pd.concat(frames, ignore_index=True)
+    data['Country'] = union_categoricals([frame['Country'] for frame in frames]).remove_unused_categories()
+    return data
+
+
+def write_synthetic(path: str, rows: int, seed: int = 0, **options) -> int:
+    """Stream a synthetic panel to Parquet (one row group per block) or CSV; returns bytes written"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires the 'pyarrow' package")
+        schema = pa.schema([('Country', pa.string()), ('Year', pa.int16()), ('Carbon_Emissions', pa.float64())])
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for frame in iter_synthetic(rows, seed, **options):
+                writer.write_table(pa.Table.from_pandas(frame.astype({'Country': str}), schema=schema,
+                                                        preserve_index=False))
+    else:
+        with open(path, "w", newline="") as f:
+            for i, frame in enumerate(iter_synthetic(rows, seed, **options)):
+                frame.to_csv(f, index=False, header=(i == 0))
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic emissions panel")
+    parser.add_argument("out", help="Output file (.parquet or .csv)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-year", type=int, default=FIRST_YEAR)
+    parser.add_argument("--last-year", type=int, default=LAST_YEAR)
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="Chance a reporting year is missing")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    size = write_synthetic(args.out, args.rows, args.seed, first_year=args.first_year,
+                           last_year=args.last_year, missing_rate=args.missing_rate)
+    json.dump({"rows": args.rows, "bytes": size, "seconds": round(time.perf_counter() - started, 2)},
+              sys.stdout, indent=2)
+    print()
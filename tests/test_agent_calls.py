@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from agent_calls import AgentCallScheduler, BudgetExceeded, RateLimited
+
+
+def _slow_call(release: threading.Event, calls: list):
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "insight"
+    return fn
+
+
+def _join_in_flight(scheduler, session_id, release, calls):
+    """Start a leader call from session-a, then call the same key from `session_id`"""
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault(
+        "leader", scheduler.call("session-a", "climate", "same-query", _slow_call(release, calls))))
+    leader.start()
+    while not calls:
+        pass
+    # Let the leader finish shortly after the follower has attached to it
+    threading.Timer(0.3, release.set).start()
+    try:
+        results["follower"] = scheduler.call(session_id, "climate", "same-query", lambda: pytest.fail())
+    finally:
+        release.set()
+        leader.join()
+    return results
+
+
+def test_queries_are_charged_until_the_budget_runs_out():
+    scheduler = AgentCallScheduler({"climate": 2.0}, budget=5.0)
+
+    scheduler.call("session-a", "climate", 1, lambda: "one")
+    scheduler.call("session-a", "climate", 2, lambda: "two")
+    with pytest.raises(BudgetExceeded):
+        scheduler.call("session-a", "climate", 3, lambda: pytest.fail())
+
+    usage = scheduler.usage("session-a").to_dict()
+    assert usage["tokens_used"] == 4.0
+    assert usage["queries"] == {"climate": 2}
+    # Budgets are per session
+    assert scheduler.call("session-b", "climate", 3, lambda: "three") == "three"
+
+
+def test_identical_in_flight_query_is_shared_and_free():
+    scheduler = AgentCallScheduler({"climate": 2.0}, budget=5.0)
+    calls = []
+
+    results = _join_in_flight(scheduler, "session-b", threading.Event(), calls)
+
+    assert results == {"leader": "insight", "follower": "insight"}
+    assert len(calls) == 1
+    assert scheduler.usage("session-b").to_dict()["coalesced"] == {"climate": 1}
+    assert scheduler.usage("session-b").spent == 0.0
+
+
+def test_exhausted_session_cannot_join_an_in_flight_query():
+    scheduler = AgentCallScheduler({"climate": 2.0}, budget=5.0)
+    scheduler.call("session-b", "climate", 1, lambda: "one")
+    scheduler.call("session-b", "climate", 2, lambda: "two")
+
+    with pytest.raises(BudgetExceeded):
+        _join_in_flight(scheduler, "session-b", threading.Event(), [])
+    assert scheduler.usage("session-b").to_dict()["coalesced"] == {}
+
+
+def test_rate_limit_rejects_calls_that_would_wait_too_long_and_refunds_them():
+    scheduler = AgentCallScheduler({"climate": 1.0}, rate=0.01, burst=1, budget=10.0, max_wait=1.0)
+
+    scheduler.call("session-a", "climate", 1, lambda: "one")
+    with pytest.raises(RateLimited):
+        scheduler.call("session-a", "climate", 2, lambda: pytest.fail())
+    assert scheduler.usage("session-a").spent == 1.0
+
+
+def test_idle_sessions_are_forgotten():
+    scheduler = AgentCallScheduler({"climate": 1.0}, idle_seconds=0.0)
+    scheduler.call("session-a", "climate", 1, lambda: "one")
+
+    scheduler.usage("session-b")
+
+    assert list(scheduler._sessions) == ["session-b"]
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from agent_dag import DONE, FAILED, SKIPPED, TIMEOUT, TaskNode, run_dag, topological_order
+
+
+def _value(value):
+    return lambda inputs: value
+
+
+def test_nodes_receive_their_dependencies_outputs():
+    nodes = [
+        TaskNode("total", _value(10)),
+        TaskNode("trees", lambda inputs: inputs["total"] * 2, depends_on=["total"]),
+        TaskNode("cost", lambda inputs: inputs["trees"] + inputs["total"], depends_on=["trees", "total"]),
+    ]
+
+    run = run_dag(nodes)
+
+    assert run.succeeded
+    assert run.outputs() == {"total": 10, "trees": 20, "cost": 30}
+    assert run.critical_path() == ["total", "trees", "cost"]
+
+
+def test_independent_branches_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    nodes = [TaskNode(name, lambda inputs: barrier.wait()) for name in ("policy", "energy")]
+
+    # Each branch waits for the other, so this only finishes if both run at once
+    assert run_dag(nodes).succeeded
+
+
+def test_failure_and_timeout_skip_only_their_downstream():
+    release = threading.Event()
+
+    def slow(inputs):
+        release.wait(5)
+        return "late"
+
+    def broken(inputs):
+        raise RuntimeError("agent down")
+
+    nodes = [
+        TaskNode("slow", slow, timeout=0.1),
+        TaskNode("after_slow", _value(1), depends_on=["slow"]),
+        TaskNode("broken", broken),
+        TaskNode("after_broken", _value(2), depends_on=["broken"]),
+        TaskNode("healthy", _value(3)),
+    ]
+    progress = []
+    try:
+        run = run_dag(nodes, on_progress=lambda settled, total: progress.append((settled, total)))
+    finally:
+        release.set()
+
+    statuses = {name: result.status for name, result in run.results.items()}
+    assert statuses == {"slow": TIMEOUT, "after_slow": SKIPPED, "broken": FAILED,
+                        "after_broken": SKIPPED, "healthy": DONE}
+    assert run.results["broken"].error == "RuntimeError: agent down"
+    assert run.results["after_slow"].error == "Upstream slow did not complete"
+    assert run.outputs() == {"healthy": 3}
+    assert progress[-1] == (5, 5)
+    assert not run.succeeded
+
+
+def test_topological_order_rejects_bad_graphs():
+    assert topological_order([TaskNode("b", _value(0), ["a"]), TaskNode("a", _value(0))]) == ["a", "b"]
+    with pytest.raises(ValueError, match="cycle"):
+        topological_order([TaskNode("a", _value(0), ["b"]), TaskNode("b", _value(0), ["a"])])
+    with pytest.raises(ValueError, match="unknown"):
+        topological_order([TaskNode("a", _value(0), ["missing"])])
+    with pytest.raises(ValueError, match="Duplicate"):
+        topological_order([TaskNode("a", _value(0)), TaskNode("a", _value(0))])
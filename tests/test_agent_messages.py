@@ -0,0 +1,51 @@
+import msgpack
+import pytest
+
+from agent_messages import (FAILED, WIRE_VERSION, AgentMessage, AgentResponse, EnergyResult, PolicyResult,
+                            TradingResult, TreePlantingResult, WireFormatError, decode, encode, format_range,
+                            format_usd)
+
+RECORDS = [
+    AgentMessage("policy", "Recommend policies", context={"growth_rate": 12}),
+    TreePlantingResult(1200, ["Oak", "Pine"], ["Riverbank"], 4.5, 48.0, [3, 4]),
+    PolicyResult(["China", "India"], ["Carbon tax"], [0.15, 0.3], 10, 2.5e9, ["Energy"], -1.5),
+    PolicyResult(["China"], ["Carbon tax"], [0.15, 0.3], 10, 2.5e9, ["Energy"]),
+    EnergyResult(0.4, {"solar": 0.6, "wind": 0.4}, 3e9, [2025, 2035], 1500),
+    TradingResult(85.0, 1.2e6, 0.7, 0.05, ["Gold Standard"]),
+    AgentResponse("tree", "Tree Planting Agent", result=TreePlantingResult(10, ["Oak"], ["Park"], 2.0, 48.0, [4])),
+    AgentResponse.failure("energy", "Timed out"),
+]
+
+
+@pytest.mark.parametrize("record", RECORDS, ids=lambda record: type(record).__name__)
+def test_records_survive_the_wire(record):
+    decoded = decode(encode(record))
+
+    assert decoded == record
+    assert type(decoded) is type(record)
+    assert decoded.to_dict() == record.to_dict()
+
+
+def test_response_state_and_nested_result():
+    ok = decode(encode(RECORDS[6]))
+    failed = decode(encode(RECORDS[7]))
+
+    assert ok.ok and ok.result.cost_estimate == 20.0
+    assert not failed.ok and failed.status == FAILED and failed.error == "Timed out"
+
+
+@pytest.mark.parametrize("payload", [
+    b"\xc1",
+    msgpack.packb([WIRE_VERSION - 1, 1, ["policy", "task", "summary", {}]]),
+    msgpack.packb([WIRE_VERSION, 99, []]),
+    msgpack.packb([WIRE_VERSION, 2, ["tree", "", "success", [99, []], None]]),
+])
+def test_unknown_or_malformed_payloads_are_rejected(payload):
+    with pytest.raises(WireFormatError):
+        decode(payload)
+
+
+def test_formatting_applies_units_only_when_rendering():
+    assert format_usd(2.5e9) == "$2.5B"
+    assert format_usd(1234.5) == "$1,234.50"
+    assert format_range((0.15, 0.3), "%", scale=100) == "15-30%"
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomalies import AnomalyReport, anomalies_for
+
+
+def _series(country, values, first_year=1990):
+    return pd.DataFrame({"Country": country, "Year": np.arange(first_year, first_year + len(values)),
+                         "Carbon_Emissions": values})
+
+
+@pytest.fixture
+def data():
+    steady = 100.0 * 1.02 ** np.arange(20)
+    france = steady.copy()
+    france[10] = 0.0
+    spiky = steady.copy()
+    spiky[15] *= 50
+    germany = _series("Germany", steady)
+    return pd.concat([_series("France", france), germany, germany.iloc[[5]], _series("Spain", spiky),
+                      _series("Italy", steady)], ignore_index=True)
+
+
+def _flags(report, check):
+    flags = report.flags[report.flags["Check"] == check]
+    return list(zip(flags["Country"], flags["Year"]))
+
+
+def test_injected_problems_are_flagged(data):
+    report = AnomalyReport.from_frame(data, isolation_forest=False)
+
+    assert _flags(report, "zero") == [("France", 2000)]
+    assert _flags(report, "duplicate_year") == [("Germany", 1995)]
+    # The spike is a jump up and a jump back down, and far from its neighbours
+    assert _flags(report, "jump") == [("Spain", 2005), ("Spain", 2006)]
+    assert ("Spain", 2005) in _flags(report, "outlier")
+    assert "Italy" not in set(report.flags["Country"])
+
+
+def test_smooth_series_have_no_flags():
+    data = pd.concat([_series(name, 10.0 * 1.05 ** np.arange(30)) for name in ("France", "Italy")])
+
+    report = AnomalyReport.from_frame(data, isolation_forest=False)
+
+    assert report.flags.empty
+    assert report.counts().tolist() == [0, 0, 0, 0]
+
+
+def test_summary_is_restricted_to_the_subset(data):
+    report = anomalies_for(data, isolation_forest=False)
+
+    everything = report.summary()
+    spain = report.summary(countries=["Spain"])
+    window = report.summary(years=(1990, 1999))
+
+    assert everything["countries_flagged"] == 3
+    assert spain["countries_flagged"] == 1 and spain["by_check"]["zero"] == 0
+    # Germany's duplicate rows are summed, which also doubles that year
+    assert window["by_check"] == {"duplicate_year": 1, "zero": 0, "jump": 0, "outlier": 1}
+    assert everything["top_flags"][0]["country"] == "Spain"
+    assert report.series("France").set_index("Year").loc[2000, "Checks"] == "zero"
+    assert anomalies_for(data, isolation_forest=False) is report
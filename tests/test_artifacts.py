@@ -0,0 +1,64 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from artifacts import BUNDLED_CSV, build_artifacts, load_artifacts, verify_artifacts
+from regions import RegionRollup
+
+
+@pytest.fixture
+def source(tmp_path):
+    csv_path = tmp_path / "emissions.csv"
+    pd.read_csv(BUNDLED_CSV).head(600).to_csv(csv_path, index=False)
+    return str(csv_path), str(tmp_path / "artifacts")
+
+
+def test_fresh_bundle_verifies_and_matches_its_source(source):
+    csv_path, out_dir = source
+    manifest = build_artifacts(csv_path, out_dir)
+
+    assert verify_artifacts(csv_path, out_dir) == manifest
+    bundle = load_artifacts(csv_path, out_dir, rebuild=False)
+    expected = pd.read_csv(csv_path)
+    assert len(bundle.data) == bundle.stats["records"] == len(expected)
+    assert bundle.cube["sums"].sum() == pytest.approx(expected["Carbon_Emissions"].sum())
+    # The rollup built from the cube agrees with one built from the rows
+    assert bundle.rollup.totals("Continent").to_dict() == \
+        pytest.approx(RegionRollup.from_frame(bundle.data).totals("Continent").to_dict())
+    assert bundle.is_bundled(bundle.data)
+
+
+def test_changed_source_makes_the_bundle_stale(source):
+    csv_path, out_dir = source
+    build_artifacts(csv_path, out_dir)
+    with open(csv_path, "a") as f:
+        f.write("France,2000,1.0\n")
+
+    assert verify_artifacts(csv_path, out_dir) is None
+    assert load_artifacts(csv_path, out_dir, rebuild=False) is None
+    # Loading with rebuild picks the new row up
+    assert load_artifacts(csv_path, out_dir).stats["records"] == 601
+
+
+@pytest.mark.parametrize("name", ["data.parquet", "cube.npz", "stats.json", "figures.json"])
+def test_tampered_or_missing_artifact_makes_the_bundle_stale(source, name):
+    csv_path, out_dir = source
+    build_artifacts(csv_path, out_dir)
+    with open(os.path.join(out_dir, name), "ab") as f:
+        f.write(b"\0")
+
+    assert verify_artifacts(csv_path, out_dir) is None
+    os.remove(os.path.join(out_dir, name))
+    assert verify_artifacts(csv_path, out_dir) is None
+
+
+def test_old_format_version_makes_the_bundle_stale(source):
+    csv_path, out_dir = source
+    manifest = build_artifacts(csv_path, out_dir)
+    manifest["format_version"] -= 1
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    assert verify_artifacts(csv_path, out_dir) is None
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from comparison import _unique_name, align_datasets
+
+
+@pytest.fixture
+def panel():
+    before = pd.DataFrame({
+        "Country": ["France", "France", "Germany", "Japan"],
+        "Year": [2000, 2001, 2000, 2002],
+        "Carbon_Emissions": [1.0, 2.0, 3.0, 4.0],
+    })
+    after = pd.DataFrame({
+        "Country": pd.Categorical(["Germany", "France", "France", "Brazil"]),
+        "Year": [2000, 2000, 2001, 2001],
+        "Carbon_Emissions": [3.0, 1.5, 2.0, 5.0],
+    })
+    return align_datasets({"before": before, "after": after})
+
+
+def test_datasets_share_the_union_grid(panel):
+    assert list(panel.countries) == ["Brazil", "France", "Germany", "Japan"]
+    assert list(panel.years) == [2000, 2001, 2002]
+    assert panel.values.shape == panel.present.shape == (2, 4, 3)
+    assert panel.summary()["Records"].tolist() == [4, 4]
+    assert panel.summary()["Total Emissions"].tolist() == [10.0, 11.5]
+
+
+def test_diff_and_ratio_cover_only_cells_both_report(panel):
+    diff = panel.diff("before", "after")
+    ratio = panel.ratio("before", "after")
+
+    # Rows are Brazil, France, Germany, Japan; columns 2000-2002
+    np.testing.assert_array_equal(np.isnan(diff), [[True] * 3, [False, False, True],
+                                                   [False, True, True], [True] * 3])
+    assert diff[1, 0] == pytest.approx(0.5)
+    assert ratio[1, 0] == pytest.approx(1.5)
+    assert diff[2, 0] == 0.0
+
+
+def test_changes_classify_revised_added_and_removed_cells(panel):
+    changes = panel.changes("before", "after").set_index(["Country", "Year"])["Change"]
+
+    assert changes.to_dict() == {("Brazil", 2001): "added", ("France", 2000): "revised",
+                                 ("Japan", 2002): "removed"}
+    deltas = panel.country_deltas("before", "after")
+    assert deltas.loc["France", "Changed Years"] == 1
+    assert deltas.loc["Japan", "Only in before"] == 1
+    with pytest.raises(KeyError):
+        panel.diff("before", "missing")
+
+
+def test_duplicate_rows_are_summed():
+    frame = pd.DataFrame({"Country": ["France", "France"], "Year": [2000, 2000], "Carbon_Emissions": [1.0, 2.0]})
+
+    assert align_datasets({"dup": frame}).values[0, 0, 0] == 3.0
+
+
+def test_same_named_uploads_get_distinct_names():
+    taken = {"data.csv": None, "data.csv (2)": None}
+
+    assert _unique_name("data.csv", taken) == "data.csv (3)"
+    assert _unique_name("other.csv", taken) == "other.csv"
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import enrichment
+from enrichment import EnrichedEmissions, ReferenceIndex, enrichment_for
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def reference():
+    population = pd.DataFrame({
+        "Country": ["France", "France", "Germany", "Germany"],
+        "Year": [2000, 2001, 2000, 2001],
+        "Population": [60.0, 61.0, 0.0, 82.0],
+    })
+    return ReferenceIndex({"Population": population})
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        "Country": pd.Categorical(["France", "France", "Germany", "Germany", "Atlantis", "France"]),
+        "Year": [2000, 2001, 2000, 2001, 2000, 2020],
+        "Carbon_Emissions": [6.0, 6.1, 9.0, 8.2, 1.0, 5.0],
+    })
+
+
+def test_join_leaves_unknown_countries_years_and_zero_denominators_missing(reference, data):
+    population = reference.join(data)["Population"]
+
+    # Germany 2000 has zero population, Atlantis is unknown, 2020 is outside the tables
+    np.testing.assert_array_equal(population, [60.0, 61.0, np.nan, 82.0, np.nan, np.nan])
+
+
+def test_ranking_weights_regions_by_size_and_has_no_infinities(reference, data):
+    enriched = EnrichedEmissions.build(data, reference)
+
+    assert enriched.metrics == ["Emissions_Per_Capita"]
+    assert enriched.coverage()["Population"] == pytest.approx(3 / 6)
+    ranking = enriched.ranking("Emissions_Per_Capita", "Country")
+    assert np.isfinite(ranking["Emissions_Per_Capita"]).all()
+    assert ranking.loc["France", "Emissions_Per_Capita"] == pytest.approx((6.0 + 6.1) / (60.0 + 61.0))
+    assert ranking.loc["Germany", "Emissions_Per_Capita"] == pytest.approx(8.2 / 82.0)
+    assert "Atlantis" not in ranking.index
+
+    world = enriched.ranking("Emissions_Per_Capita", "World")
+    assert world["Emissions_Per_Capita"].iloc[0] == pytest.approx((6.0 + 6.1 + 8.2) / (60.0 + 61.0 + 82.0))
+
+
+def test_aggregates_are_persisted_in_the_result_cache(reference, data, tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    first = enrichment_for(data, reference, cache).ranking("Emissions_Per_Capita", "Continent")
+
+    # A fresh process has an empty in-memory cache and must not redo the join
+    enrichment._enriched.clear()
+    monkeypatch.setattr(EnrichedEmissions, "build", classmethod(lambda cls, *args: pytest.fail()))
+    second = enrichment_for(data, reference, cache).ranking("Emissions_Per_Capita", "Continent")
+
+    pd.testing.assert_frame_equal(first, second)
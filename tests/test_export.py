@@ -0,0 +1,97 @@
+import gzip
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from export import (PayloadCache, available_export_formats, export_stream, iter_csv, iter_export, iter_json,
+                    json_stream)
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        "Country": ["France", "Germany", "Japan"] * 4,
+        "Year": np.repeat([2000, 2001, 2002, 2003], 3),
+        "Carbon_Emissions": np.arange(12, dtype=np.float64) * 1.5,
+    })
+
+
+def _read_back(payload: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == "csv.gz":
+        payload = gzip.decompress(payload)
+    elif fmt == "csv.zst":
+        import zstandard
+        payload = zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    if fmt == "parquet":
+        return pd.read_parquet(io.BytesIO(payload))
+    return pd.read_csv(io.BytesIO(payload))
+
+
+@pytest.mark.parametrize("fmt", sorted(available_export_formats()))
+def test_every_format_round_trips(data, fmt):
+    payload = export_stream(data, fmt).read()
+
+    pd.testing.assert_frame_equal(_read_back(payload, fmt), data, check_dtype=False)
+
+
+def test_csv_chunks_have_one_header(data):
+    chunks = list(iter_csv(data, chunk_rows=5))
+
+    assert len(chunks) == 3
+    assert b"".join(chunks).count(b"Country") == 1
+    assert b"".join(chunks) == data.to_csv(index=False).encode("utf-8")
+
+
+def test_stream_reads_across_chunk_boundaries(data):
+    expected = b"".join(iter_export(data, "csv"))
+    stream = export_stream(data, "csv")
+    stream.seek(0)
+
+    parts = []
+    while part := stream.read(7):
+        parts.append(part)
+
+    assert b"".join(parts) == expected
+    assert stream.tell() == len(expected)
+    with pytest.raises(io.UnsupportedOperation):
+        stream.seek(0)
+
+
+def test_json_stream_serializes_numpy_values():
+    payload = {"total": np.float64(2.5), "years": np.array([2000, 2001]), "name": "France"}
+
+    assert json.loads(json_stream(payload).read()) == {"total": 2.5, "years": [2000, 2001], "name": "France"}
+    assert b"\n" in b"".join(iter_json(payload, compact=False))
+
+
+def test_unknown_format_is_rejected(data):
+    with pytest.raises(ValueError):
+        iter_export(data, "xlsx")
+
+
+def test_payload_cache_builds_once_and_evicts_least_recently_used():
+    builds = []
+
+    def chunks(name, size):
+        def build():
+            builds.append(name)
+            return [b"x" * size]
+        return build
+
+    cache = PayloadCache(max_bytes=10)
+    assert cache.get_or_build("a", chunks("a", 4)) == b"xxxx"
+    cache.get_or_build("b", chunks("b", 4))
+    cache.get_or_build("a", chunks("a", 4))
+    cache.get_or_build("c", chunks("c", 4))
+    cache.get_or_build("a", chunks("a", 4))
+    cache.get_or_build("b", chunks("b", 4))
+    # Too large to keep, and None never caches
+    cache.get_or_build("big", chunks("big", 11))
+    cache.get_or_build("big", chunks("big", 11))
+    cache.get_or_build(None, chunks("fresh", 1))
+    cache.get_or_build(None, chunks("fresh", 1))
+
+    assert builds == ["a", "b", "c", "b", "big", "big", "fresh", "fresh"]
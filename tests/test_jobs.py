@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, JobScheduler
+
+
+def _wait(scheduler, job_id):
+    scheduler.get(job_id)._future.result(timeout=5)
+    return scheduler.get(job_id)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(max_workers=1)
+    yield scheduler
+    scheduler.shutdown(wait=True)
+
+
+def test_job_result_and_progress(scheduler):
+    def work(job, value):
+        job.update(0.5, "halfway")
+        return value * 2
+
+    job = _wait(scheduler, scheduler.submit(work, 21, kind="double", owner="session-a"))
+
+    assert job.status == DONE
+    assert job.progress == 1.0
+    assert job.message == "halfway"
+    assert scheduler.result(job.job_id) == 42
+    assert [j.job_id for j in scheduler.jobs(owner="session-a")] == [job.job_id]
+
+
+def test_running_job_stops_at_its_next_update(scheduler):
+    started, resume = threading.Event(), threading.Event()
+    reached = []
+
+    def work(job):
+        job.update(0.1)
+        started.set()
+        resume.wait(5)
+        job.update(0.5)
+        reached.append("after checkpoint")
+
+    job_id = scheduler.submit(work)
+    started.wait(5)
+    assert scheduler.cancel(job_id)
+    resume.set()
+    job = _wait(scheduler, job_id)
+
+    assert job.status == CANCELLED
+    assert reached == []
+    assert scheduler.result(job_id) is None
+    assert not scheduler.cancel(job_id)
+
+
+def test_queued_job_is_cancelled_before_it_runs(scheduler):
+    release = threading.Event()
+    blocker = scheduler.submit(lambda job: release.wait(5))
+    queued = scheduler.submit(lambda job: pytest.fail())
+
+    assert scheduler.cancel(queued)
+    release.set()
+    _wait(scheduler, blocker)
+
+    assert scheduler.get(queued).status == CANCELLED
+
+
+def test_failures_are_recorded_on_the_job(scheduler):
+    def work(job):
+        raise ValueError("bad upload")
+
+    job = _wait(scheduler, scheduler.submit(work))
+
+    assert job.status == FAILED
+    assert job.error == "ValueError: bad upload"
+
+
+def test_finished_jobs_are_pruned_after_the_ttl():
+    scheduler = JobScheduler(max_workers=1, ttl=0.0)
+    job_id = scheduler.submit(lambda job: None)
+    _wait(scheduler, job_id)
+
+    scheduler.prune()
+
+    assert scheduler.get(job_id) is None
+    scheduler.shutdown(wait=True)
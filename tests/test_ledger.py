@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from ledger import CONFIRMED, FAILED, LedgerWriter, merkle_root, verify_proof
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def ledger_url():
+    """mock_ledger_server.py on a free port, failing half of the submissions after recording them"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "mock_ledger_server.py"), "--port", "0",
+         "--fail-rate", "0.5", "--latency", "0", "--seed", "7"],
+        stdout=subprocess.PIPE, text=True, cwd=ROOT,
+    )
+    try:
+        match = re.search(r"http://[\d.]+:\d+", process.stdout.readline())
+        assert match, "mock ledger did not report its address"
+        yield match.group(0)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def make_writer(url: str) -> LedgerWriter:
+    return LedgerWriter(url=url, batch_size=4, flush_seconds=0.2, max_retries=20)
+
+
+def server_batches(url: str):
+    return requests.get(f"{url}/v1/batches", timeout=5).json()["batches"]
+
+
+def test_records_are_batched_retried_idempotently_and_provable(ledger_url):
+    writer = make_writer(ledger_url)
+    ids = [writer.submit("analysis", {"run": i}, owner="session-a") for i in range(10)]
+    assert writer.flush(timeout=30)
+    writer.shutdown()
+
+    batches = server_batches(ledger_url)
+    # Batches are cut at batch_size; retried submissions never store a batch twice
+    assert sorted(batch["leaf_count"] for batch in batches) == [2, 4, 4]
+    assert len({batch["merkle_root"] for batch in batches}) == len(batches)
+    assert sum(batch["attempts"] for batch in batches) > len(batches)
+
+    roots = {batch["batch_id"]: batch["merkle_root"] for batch in batches}
+    for record_id in ids:
+        receipt = writer.receipt(record_id)
+        assert receipt.status == CONFIRMED
+        assert receipt.merkle_root == roots[receipt.batch_id]
+        assert verify_proof(record_id, receipt.proof, receipt.merkle_root)
+        assert not verify_proof(record_id, receipt.proof, merkle_root([record_id]))
+
+
+def test_identical_records_are_sent_once_but_shown_to_every_owner(ledger_url):
+    writer = make_writer(ledger_url)
+    first = writer.submit("analysis", {"dataset": "bundled"}, owner="session-a")
+    second = writer.submit("analysis", {"dataset": "bundled"}, owner="session-b")
+    assert first == second
+    assert writer.flush(timeout=30)
+    writer.shutdown()
+
+    assert sum(batch["leaf_count"] for batch in server_batches(ledger_url)) == 1
+    assert [r.record_id for r in writer.receipts("session-a")] == [first]
+    assert [r.record_id for r in writer.receipts("session-b")] == [first]
+    assert writer.receipts("session-c") == []
+
+
+class PlainTextOnceHandler(BaseHTTPRequestHandler):
+    """Acknowledges the first batch with a plain-text 200, later ones properly"""
+
+    requests_served = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests_served += 1
+        if type(self).requests_served == 1:
+            payload, content_type = b"OK", "text/plain"
+        else:
+            payload = json.dumps({"batch_id": "b2", "merkle_root": body["merkle_root"]}).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def plain_text_ledger_url():
+    PlainTextOnceHandler.requests_served = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlainTextOnceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_malformed_acknowledgement_fails_the_batch_and_the_worker_carries_on(plain_text_ledger_url):
+    writer = make_writer(plain_text_ledger_url)
+    first = writer.submit("analysis", {"run": 1}, owner="session-a")
+    assert writer.flush(timeout=10)
+
+    receipt = writer.receipt(first)
+    assert receipt.status == FAILED
+    assert "not JSON" in receipt.error
+
+    second = writer.submit("analysis", {"run": 2}, owner="session-a")
+    assert writer.flush(timeout=10)
+    writer.shutdown()
+    assert writer.receipt(second).status == CONFIRMED
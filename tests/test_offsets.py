@@ -0,0 +1,40 @@
+from streamlit.testing.v1 import AppTest
+
+from offsets import load_sites, optimize_planting, plan_for
+
+
+def _planting_page(total_emissions):
+    from offsets import planting_section
+
+    planting_section(total_emissions)
+
+
+def test_planting_section_without_emissions_shows_a_message():
+    app = AppTest.from_function(_planting_page, args=(0.0,)).run(timeout=60)
+
+    assert not app.exception
+    assert not app.slider
+    assert "No emissions to offset" in app.info[0].value
+
+
+def test_planting_section_renders_sliders_for_positive_emissions():
+    app = AppTest.from_function(_planting_page, args=(10.0,)).run(timeout=60)
+
+    assert not app.exception
+    assert [slider.key for slider in app.slider] == ["plan_share", "plan_budget", "plan_land"]
+
+
+def test_plan_stays_within_budget_and_target():
+    plan = optimize_planting(load_sites(), target_lbs=100_000, budget=500.0)
+
+    assert plan.trees > 0
+    assert plan.cost <= 500.0 + 1e-6
+    assert plan.absorbed_lbs <= plan.target_lbs + 1e-6
+
+
+def test_negative_emissions_give_an_empty_plan():
+    plan = plan_for(-5000.0)
+
+    assert plan.trees == 0
+    assert plan.target_lbs == 0.0
+    assert plan.residual_lbs == 0.0
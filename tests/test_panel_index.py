@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_index import PATH_CACHED, PATH_SCAN, PanelIndex
+from synthetic import synthetic_frame
+
+
+@pytest.fixture(scope="module")
+def index():
+    return PanelIndex(synthetic_frame(5000, seed=3))
+
+
+def _approx(value):
+    """pytest.approx for the nested dicts of summary statistics"""
+    if isinstance(value, dict):
+        return {key: _approx(item) for key, item in value.items()}
+    return pytest.approx(value) if isinstance(value, float) else value
+
+
+@pytest.mark.parametrize("countries, years", [
+    (None, None),
+    (None, (1995, 2005)),
+    (["Ireland", "Germany", "Togo"], (2000, 2010)),
+])
+def test_cached_summary_matches_the_raw_scan(index, countries, years):
+    cached = index.summary(countries, years)
+    # A filter every record passes forces the scan without changing the subset
+    scanned = index.summary(countries, years, min_emissions=-np.inf)
+
+    assert cached.path == PATH_CACHED
+    assert scanned.path == PATH_SCAN
+    assert scanned.stats == _approx(cached.stats)
+
+
+def test_min_emissions_filters_records(index):
+    threshold = float(index.data["Carbon_Emissions"].median())
+    summary = index.summary(min_emissions=threshold)
+    rows = index.records(min_emissions=threshold)
+
+    assert summary.path == PATH_SCAN
+    assert summary.stats["records"] == len(rows) < len(index.data)
+    assert summary.stats["min_emissions"] >= threshold
+
+
+def test_empty_window_gives_zero_statistics(index):
+    cached = index.summary(years=(1000, 1001)).stats
+
+    assert cached["records"] == 0
+    assert cached["total_emissions"] == 0.0
+    assert cached["top_emitters"] == {}
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from parallel_aggregation import groupby_sum, parallel_groupby_sum
+
+
+def _frame(rows=20_000, seed=3):
+    rng = np.random.default_rng(seed)
+    countries = np.array([f"Country {i}" for i in range(300)], dtype=object)
+    data = pd.DataFrame({
+        "Country": countries[rng.integers(0, len(countries), rows)],
+        "Year": rng.integers(1990, 2020, rows).astype(np.int16),
+        "Carbon_Emissions": rng.random(rows),
+    })
+    data.loc[::17, "Carbon_Emissions"] = np.nan
+    data.loc[::101, "Country"] = None
+    return data
+
+
+@pytest.mark.parametrize("key", ["str", "category", "year"])
+def test_parallel_sums_match_pandas(key):
+    data = _frame()
+    by = "Year" if key == "year" else "Country"
+    if key == "str":
+        data["Country"] = data["Country"].astype("str")
+        data.loc[::101, "Country"] = None
+    elif key == "category":
+        data["Country"] = data["Country"].astype("category")
+
+    expected = data.groupby(by)["Carbon_Emissions"].sum()
+    result = parallel_groupby_sum(data, by, workers=3)
+
+    pd.testing.assert_series_equal(result, expected)
+
+
+def test_codes_based_keys_stay_serial(monkeypatch):
+    import parallel_aggregation
+
+    monkeypatch.setattr(parallel_aggregation, "PARALLEL_ROW_THRESHOLD", 0)
+    monkeypatch.setattr(parallel_aggregation, "PARALLEL_WORKERS", 2)
+    monkeypatch.setattr(parallel_aggregation, "parallel_groupby_sum", lambda *args, **kwargs: pytest.fail())
+    data = _frame(1000).astype({"Country": "category"})
+
+    groupby_sum(data, "Country")
+    groupby_sum(data, "Year")
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from regions import LEVELS, UNASSIGNED, RegionRollup
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        "Country": ["France", "France", "Germany", "Japan", "China", "Atlantis", "World", "Europe"],
+        "Year": [2000, 2001, 2000, 2001, 2000, 2000, 2000, 2000],
+        "Carbon_Emissions": [1.0, 2.0, 3.0, 4.0, 5.0, 0.5, 100.0, 50.0],
+    })
+
+
+def test_every_level_adds_up_to_the_world_without_aggregates(data):
+    rollup = RegionRollup.from_frame(data)
+
+    # World and Europe are aggregate rows and would double count
+    assert rollup.world_total == pytest.approx(15.5)
+    for level in LEVELS:
+        assert rollup.totals(level).sum() == pytest.approx(rollup.world_total), level
+        assert rollup.by_year(level).to_numpy().sum() == pytest.approx(rollup.world_total), level
+    assert "World" not in rollup.totals("Country").index
+    assert rollup.shares("Continent").sum() == pytest.approx(1.0)
+
+
+def test_hierarchy_navigation(data):
+    rollup = RegionRollup.from_frame(data)
+
+    assert rollup.parent_of("Country", "France") == "Western Europe"
+    assert rollup.parent_of("Sub-region", "Western Europe") == "Europe"
+    assert rollup.parent_of("Country", "Atlantis") == UNASSIGNED
+    assert sorted(rollup.countries_in("Continent", "Europe")) == ["France", "Germany"]
+    assert rollup.children("Continent", "Asia").index.tolist() == ["Eastern Asia"]
+    assert rollup.totals("Continent").to_dict() == {"Asia": 9.0, "Europe": 6.0, UNASSIGNED: 0.5}
+    assert rollup.top("Country", 2).index.tolist() == ["China", "Japan"]
+
+
+def test_cube_and_frame_builds_agree(data):
+    from_frame = RegionRollup.from_frame(data)
+    cube = {
+        "countries": np.array(["Atlantis", "China", "Europe", "France", "Germany", "Japan", "World"]),
+        "years": np.array([2000, 2001]),
+        "sums": np.array([[0.5, 0], [5, 0], [50, 0], [1, 2], [3, 0], [0, 4], [100, 0]], dtype=np.float64),
+    }
+    from_cube = RegionRollup.from_cube(cube)
+
+    for level in LEVELS:
+        pd.testing.assert_series_equal(from_cube.totals(level), from_frame.totals(level))
+        pd.testing.assert_frame_equal(from_cube.by_year(level), from_frame.by_year(level))
+
+
+def test_unknown_level_is_rejected(data):
+    with pytest.raises(KeyError):
+        RegionRollup.from_frame(data).totals("Planet")
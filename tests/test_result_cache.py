@@ -0,0 +1,41 @@
+import pandas as pd
+
+from result_cache import ResultCache, frame_fingerprint, pin_frame
+
+
+def _frame():
+    return pd.DataFrame({"Country": ["A", "B", "C"], "Year": [2000, 2001, 2002],
+                         "Carbon_Emissions": [1.0, 2.0, 3.0]})
+
+
+def test_fingerprint_leaves_the_frame_writable_and_follows_edits():
+    data = _frame()
+    before = frame_fingerprint(data)
+
+    data.loc[0, "Carbon_Emissions"] = 99.0
+    data.iloc[1, 2] = 42.0
+
+    assert frame_fingerprint(data) != before
+    assert frame_fingerprint(data) == frame_fingerprint(data.copy())
+
+
+def test_pinned_copy_is_independent_of_the_original():
+    original = _frame()
+    pinned = pin_frame(original)
+    fingerprint = frame_fingerprint(pinned)
+
+    original.loc[0, "Carbon_Emissions"] = 99.0
+
+    assert pinned is not original
+    assert pin_frame(pinned) is pinned
+    assert frame_fingerprint(pinned) == fingerprint == frame_fingerprint(_frame())
+    assert frame_fingerprint(original) != fingerprint
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    key = cache.key("analysis", "basic", frame_fingerprint(_frame()))
+
+    assert cache.get(key) is None
+    cache.put(key, {"total": 6.0, "top": ["C", "B"]})
+    assert cache.get(key) == {"total": 6.0, "top": ["C", "B"]}
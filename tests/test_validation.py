@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from validation import MAX_YEAR, ValidationError, validate_emissions
+
+
+@pytest.fixture
+def upload():
+    return pd.DataFrame({
+        "Country": ["France", " usa ", None, "France", "Germany", "Germany", "France", "Atlantis", "World", "Japan"],
+        "Year": [2000, "2000", 2001, 1700, 2000.5, 2001, 2000, 2000, 2000, MAX_YEAR + 1],
+        "Carbon_Emissions": [1.0, 2.0, 3.0, 4.0, 5.0, "n/a", 7.0, 8.0, 9.0, -1.0],
+        "Source": list("abcdefghij"),
+    })
+
+
+def test_invalid_rows_are_dropped_and_counted(upload):
+    cleaned, report = validate_emissions(upload)
+
+    assert report.rows_in == 10
+    assert report.rows_out == len(cleaned) == 4
+    assert report.rows_dropped == 6
+    assert report.errors == {
+        "missing_country": 1,
+        "invalid_year": 3,
+        "non_numeric_emissions": 1,
+        "negative_emissions": 1,
+        "duplicate_country_year": 1,
+    }
+    # Japan has both a bad year and a negative value; the first France 2000 row wins
+    # and examples are 1-based row numbers
+    assert report.examples["duplicate_country_year"] == [7]
+    assert cleaned["Source"].tolist() == ["a", "b", "h", "i"]
+
+
+def test_cleaned_frame_is_typed_and_names_are_normalized(upload):
+    cleaned, report = validate_emissions(upload)
+
+    assert cleaned["Country"].tolist() == ["France", "United States", "Atlantis", "World"]
+    assert isinstance(cleaned["Country"].dtype, pd.CategoricalDtype)
+    assert cleaned["Year"].dtype == np.int16
+    assert cleaned["Carbon_Emissions"].dtype == np.float64
+    assert report.warnings == {"normalized_country": 1, "unknown_country": 1, "aggregate_region": 1}
+
+
+def test_clean_upload_has_no_issues():
+    upload = pd.DataFrame({"Country": ["France", "France"], "Year": [2000, 2001], "Carbon_Emissions": [1.0, 0.0]})
+
+    cleaned, report = validate_emissions(upload)
+
+    assert not report.has_issues
+    assert report.to_frame().empty
+    assert cleaned["Carbon_Emissions"].tolist() == [1.0, 0.0]
+
+
+def test_missing_columns_are_rejected():
+    with pytest.raises(ValidationError, match="Carbon_Emissions"):
+        validate_emissions(pd.DataFrame({"Country": ["France"], "Year": [2000]}))
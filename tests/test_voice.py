@@ -0,0 +1,76 @@
+import importlib
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import fake_tts_server
+import voice
+
+SUMMARY = "Total emissions reached 2,682 units across 222 countries"
+
+
+@pytest.fixture
+def tts_server(monkeypatch):
+    """fake_tts_server on an ephemeral port, with a short delay between chunks"""
+    monkeypatch.setattr(fake_tts_server.FakeTTSHandler, "chunk_delay", 0.001)
+    monkeypatch.setattr(fake_tts_server.FakeTTSHandler, "requests_served", 0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fake_tts_server.FakeTTSHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def synthesizer(tts_server, tmp_path, monkeypatch):
+    """VoiceSynthesizer configured from the environment, pointed at the fake server"""
+    host, port = tts_server.server_address[:2]
+    monkeypatch.setenv("CARBON_ELEVENLABS_URL", f"http://{host}:{port}")
+    monkeypatch.setenv("CARBON_AUDIO_CACHE_DIR", str(tmp_path / ".cache" / "audio"))
+    module = importlib.reload(voice)
+    yield module.VoiceSynthesizer()
+    monkeypatch.undo()
+    importlib.reload(voice)
+
+
+def cache_files(synth):
+    return sorted(os.listdir(synth.cache_dir)) if os.path.isdir(synth.cache_dir) else []
+
+
+def test_first_call_fetches_and_writes_cache(synthesizer):
+    assert synthesizer.enabled
+    audio = b"".join(synthesizer.stream(SUMMARY))
+
+    assert fake_tts_server.FakeTTSHandler.requests_served == 1
+    assert audio == fake_tts_server.render_tone(SUMMARY)
+    path = synthesizer.cached_clip(SUMMARY)
+    assert path is not None and path.endswith(".wav")
+    assert cache_files(synthesizer) == [os.path.basename(path)]
+    with open(path, "rb") as f:
+        assert f.read() == audio
+
+
+def test_second_call_is_served_from_disk(synthesizer):
+    first = b"".join(synthesizer.stream(SUMMARY))
+    second = b"".join(synthesizer.stream(SUMMARY))
+
+    assert second == first
+    assert fake_tts_server.FakeTTSHandler.requests_served == 1
+    assert synthesizer.clip_mime(SUMMARY) == "audio/wav"
+
+
+def test_interrupted_stream_leaves_no_partial_file(synthesizer):
+    stream = synthesizer.stream(SUMMARY, chunk_size=1024)
+    assert next(stream)
+    stream.close()
+
+    assert synthesizer.cached_clip(SUMMARY) is None
+    assert cache_files(synthesizer) == []
+
+    # The next request synthesizes again and completes the entry
+    b"".join(synthesizer.stream(SUMMARY))
+    assert fake_tts_server.FakeTTSHandler.requests_served == 2
+    assert synthesizer.cached_clip(SUMMARY) is not None
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from world_map import SCOPE_DETAIL, animated_map_figure
+
+
+def test_unchanged_years_keep_their_slider_step_and_reuse_the_previous_frame():
+    by_year = pd.DataFrame({"United States": [1.0, 1.0, 1.0, 2.0, 2.0], "France": [0.5, 0.5, 0.5, 0.7, 0.7]},
+                           index=[1990, 1991, 1992, 1993, 1994])
+    figure = animated_map_figure(by_year, SCOPE_DETAIL["World"])
+
+    steps = figure["layout"]["sliders"][0]["steps"]
+    assert [step["label"] for step in steps] == ["1990", "1991", "1992", "1993", "1994"]
+    assert [step["args"][0] for step in steps] == [["1990"], ["1991"], ["1992"], ["1993"], ["1994"]]
+
+    frames = {frame["name"]: frame for frame in figure["frames"]}
+    assert frames["1991"] == {"name": "1991", "baseframe": "1990"}
+    assert frames["1992"] == {"name": "1992", "baseframe": "1990"}
+    assert frames["1994"] == {"name": "1994", "baseframe": "1993"}
+    assert "z" in frames["1993"]["data"][0]
@@ -0,0 +1,228 @@
+import datetime
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COUNTRIES_CSV = os.path.join(BASE_DIR, "reference", "countries.csv")
+
+REQUIRED_COLUMNS = ['Country', 'Year', 'Carbon_Emissions']
+
+MIN_YEAR = 1750
+MAX_YEAR = datetime.date.today().year + 1
+
+# Common alternative spellings mapped to the canonical dataset names
+COUNTRY_ALIASES = {
+    "usa": "United States",
+    "us": "United States",
+    "u.s.": "United States",
+    "u.s.a.": "United States",
+    "united states of america": "United States",
+    "uk": "United Kingdom",
+    "u.k.": "United Kingdom",
+    "great britain": "United Kingdom",
+    "britain": "United Kingdom",
+    "russian federation": "Russia",
+    "korea, republic of": "South Korea",
+    "republic of korea": "South Korea",
+    "korea, dem. people's rep.": "North Korea",
+    "iran, islamic rep.": "Iran",
+    "viet nam": "Vietnam",
+    "czech republic": "Czechia",
+    "turkiye": "Turkey",
+    "türkiye": "Turkey",
+    "ivory coast": "Cote d'Ivoire",
+    "côte d'ivoire": "Cote d'Ivoire",
+    "dr congo": "Democratic Republic of Congo",
+    "congo, dem. rep.": "Democratic Republic of Congo",
+    "republic of the congo": "Congo",
+    "lao pdr": "Laos",
+    "syrian arab republic": "Syria",
+    "timor-leste": "East Timor",
+    "cabo verde": "Cape Verde",
+    "swaziland": "Eswatini",
+    "macedonia": "North Macedonia",
+    "burma": "Myanmar",
+    "hong kong sar, china": "Hong Kong",
+    "world total": "World",
+}
+
+# Problems that remove a row from the cleaned frame
+ERROR_LABELS = {
+    "missing_country": "Missing country name",
+    "invalid_year": f"Year missing, non-integer or outside {MIN_YEAR}-{MAX_YEAR}",
+    "missing_emissions": "Missing emission value",
+    "non_numeric_emissions": "Non-numeric emission value",
+    "negative_emissions": "Negative emission value",
+    "duplicate_country_year": "Duplicate (Country, Year) row",
+}
+
+# Problems that are reported but keep the row
+WARNING_LABELS = {
+    "normalized_country": "Country name normalized to canonical spelling",
+    "unknown_country": "Country not in the canonical list",
+    "aggregate_region": "Regional or income-group aggregate (double counts countries)",
+}
+
+_canonical_cache: Optional[pd.DataFrame] = None
+
+
+class ValidationError(ValueError):
+    """Raised when an upload cannot be validated at all"""
+
+
+class ValidationReport:
+    """Compact summary of the problems found while cleaning an upload"""
+
+    def __init__(self, rows_in: int, rows_out: int, errors: Dict[str, int],
+                 warnings: Dict[str, int], examples: Dict[str, List[int]]):
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.errors = errors
+        self.warnings = warnings
+        self.examples = examples
+
+    @property
+    def rows_dropped(self) -> int:
+        return self.rows_in - self.rows_out
+
+    @property
+    def has_issues(self) -> bool:
+        return bool(self.errors or self.warnings)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per issue type, for display"""
+        rows = []
+        for kind, counts, labels in (("error", self.errors, ERROR_LABELS),
+                                     ("warning", self.warnings, WARNING_LABELS)):
+            for issue, count in counts.items():
+                rows.append({
+                    "Severity": kind,
+                    "Issue": labels[issue],
+                    "Rows": count,
+                    "Example rows": ", ".join(str(i) for i in self.examples.get(issue, [])),
+                })
+        return pd.DataFrame(rows, columns=["Severity", "Issue", "Rows", "Example rows"])
+
+    def to_dict(self) -> Dict:
+        return {
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "errors": dict(self.errors),
+            "warnings": dict(self.warnings),
+            "examples": {k: list(v) for k, v in self.examples.items()},
+        }
+
+
+def load_canonical_countries(path: str = COUNTRIES_CSV) -> pd.DataFrame:
+    """Canonical country table (Country, Kind), read once per process"""
+    global _canonical_cache
+    if path != COUNTRIES_CSV:
+        return pd.read_csv(path)
+    if _canonical_cache is None:
+        _canonical_cache = pd.read_csv(path)
+    return _canonical_cache
+
+
+def _normalize_countries(raw: pd.Series, canonical: pd.DataFrame):
+    """Map country names to canonical spellings, working on unique values only
+
+    Returns per-row arrays: names, missing, normalized, unknown, aggregate.
+    """
+    codes, uniques = pd.factorize(raw, use_na_sentinel=True)
+    uniques = np.asarray(uniques, dtype=object)
+    stripped = pd.Series(uniques, dtype=object).astype(str).str.strip().str.replace(r"\s+", " ", regex=True)
+
+    lookup = dict(COUNTRY_ALIASES)
+    lookup.update({name.casefold(): name for name in canonical['Country']})
+    mapped = stripped.str.casefold().map(lookup)
+
+    names = np.append(mapped.fillna(stripped).to_numpy(dtype=object), None)
+    known = np.append(mapped.notna().to_numpy(), False)
+    renamed = known & (names != np.append(uniques, None))
+    aggregates = set(canonical.loc[canonical['Kind'] == 'aggregate', 'Country'])
+    is_aggregate = np.array([name in aggregates for name in names], dtype=bool)
+    empty = np.append((stripped == "").to_numpy(), True)
+
+    # Missing keys get the sentinel slot appended above; expand back to rows
+    codes = np.where(codes < 0, len(uniques), codes)
+    row_missing = empty[codes]
+    return (names[codes],
+            row_missing,
+            ~row_missing & renamed[codes],
+            ~row_missing & ~known[codes],
+            ~row_missing & is_aggregate[codes])
+
+
+def validate_emissions(data: pd.DataFrame, canonical: Optional[pd.DataFrame] = None,
+                       max_examples: int = 5) -> Tuple[pd.DataFrame, ValidationReport]:
+    """Coerce, check and clean an emissions frame in one vectorized pass
+
+    Returns the cleaned, typed frame (Country categorical, Year int16,
+    Carbon_Emissions float64) and a report of what was dropped or changed.
+    """
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in data.columns]
+    if missing_columns:
+        raise ValidationError(f"Missing required columns: {missing_columns}. Found: {list(data.columns)}")
+    if canonical is None:
+        canonical = load_canonical_countries()
+
+    countries, missing_country, normalized, unknown, aggregate = _normalize_countries(data['Country'], canonical)
+
+    years = pd.to_numeric(data['Year'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    invalid_year = ~np.isfinite(years) | (years != np.floor(years)) | (years < MIN_YEAR) | (years > MAX_YEAR)
+
+    raw_emissions = data['Carbon_Emissions']
+    emissions = pd.to_numeric(raw_emissions, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    raw_missing = raw_emissions.isna().to_numpy()
+    missing_emissions = raw_missing | np.isinf(emissions)
+    non_numeric = np.isnan(emissions) & ~raw_missing
+    negative = emissions < 0
+
+    valid = ~(missing_country | invalid_year | missing_emissions | non_numeric | negative)
+
+    # Hash (Country, Year) of the valid rows and keep the first occurrence
+    duplicate = np.zeros(len(data), dtype=bool)
+    if valid.any():
+        keys = pd.DataFrame({'Country': countries[valid], 'Year': years[valid]})
+        hashes = pd.util.hash_pandas_object(keys, index=False)
+        duplicate[valid] = hashes.duplicated(keep='first').to_numpy()
+    valid &= ~duplicate
+
+    masks = {
+        "missing_country": missing_country,
+        "invalid_year": invalid_year & ~missing_country,
+        "missing_emissions": missing_emissions,
+        "non_numeric_emissions": non_numeric,
+        "negative_emissions": negative,
+        "duplicate_country_year": duplicate,
+    }
+    warning_masks = {
+        "normalized_country": normalized & valid,
+        "unknown_country": unknown & valid,
+        "aggregate_region": aggregate & valid,
+    }
+
+    errors, warnings, examples = {}, {}, {}
+    for target, group in ((errors, masks), (warnings, warning_masks)):
+        for issue, mask in group.items():
+            count = int(mask.sum())
+            if count:
+                target[issue] = count
+                # 1-based data row numbers, header excluded
+                examples[issue] = [int(i) + 1 for i in np.flatnonzero(mask)[:max_examples]]
+
+    cleaned = pd.DataFrame({
+        'Country': pd.Categorical(countries[valid]),
+        'Year': years[valid].astype(np.int16),
+        'Carbon_Emissions': emissions[valid],
+    })
+    # Carry through any extra columns the upload had
+    extra = [col for col in data.columns if col not in REQUIRED_COLUMNS]
+    for col in extra:
+        cleaned[col] = data[col].to_numpy()[valid]
+
+    report = ValidationReport(len(data), len(cleaned), errors, warnings, examples)
+    return cleaned, report
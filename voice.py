@@ -0,0 +1,148 @@
+import hashlib
+import os
+import tempfile
+from typing import Iterator, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Point at fake_tts_server.py (e.g. http://127.0.0.1:8765) to develop offline
+ELEVENLABS_DEFAULT_URL = "https://api.elevenlabs.io"
+ELEVENLABS_API_URL = os.environ.get("CARBON_ELEVENLABS_URL", ELEVENLABS_DEFAULT_URL)
+DEFAULT_VOICE_ID = os.environ.get("CARBON_VOICE_ID", "21m00Tcm4TlvDq8N1PGT")
+DEFAULT_MODEL_ID = os.environ.get("CARBON_TTS_MODEL", "eleven_multilingual_v2")
+OUTPUT_FORMAT = "mp3_44100_128"
+AUDIO_CACHE_DIR = os.environ.get("CARBON_AUDIO_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "audio"))
+
+CHUNK_SIZE = 16 * 1024
+REQUEST_TIMEOUT = 30
+
+# Cached clips keep the container the server answered with
+AUDIO_FORMATS = {
+    "audio/mpeg": ".mp3",
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+}
+EXTENSION_MIME = {".mp3": "audio/mpeg", ".wav": "audio/wav"}
+
+
+class VoiceSynthesisError(RuntimeError):
+    """Raised when the TTS service cannot produce audio"""
+
+
+def audio_cache_key(text: str, voice_id: str, model_id: str = DEFAULT_MODEL_ID) -> str:
+    """Cache key for one rendered clip: the exact text, voice and model"""
+    payload = "\x1f".join([model_id, voice_id, OUTPUT_FORMAT, text])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VoiceSynthesizer:
+    """ElevenLabs text-to-speech with a content-addressed audio cache on disk
+
+    Audio is requested from the streaming endpoint and handed to the caller
+    chunk by chunk while it is written to the cache, so a repeated summary
+    is served from disk without another API call.
+    """
+
+    def __init__(self, api_key: str = "", voice_id: str = DEFAULT_VOICE_ID, model_id: str = DEFAULT_MODEL_ID,
+                 base_url: str = ELEVENLABS_API_URL, cache_dir: str = AUDIO_CACHE_DIR):
+        self.api_key = api_key
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+
+    @property
+    def enabled(self) -> bool:
+        """A key is required for the real API; a custom endpoint works without one"""
+        return bool(self.api_key) or self.base_url != ELEVENLABS_DEFAULT_URL
+
+    def cached_clip(self, text: str) -> Optional[str]:
+        """Path of the cached clip for text, if one exists"""
+        key = audio_cache_key(text, self.voice_id, self.model_id)
+        for extension in EXTENSION_MIME:
+            path = os.path.join(self.cache_dir, key + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def stream(self, text: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield audio bytes for text, from the cache or straight off the wire"""
+        path = self.cached_clip(text)
+        if path is not None:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        if not self.enabled:
+            raise VoiceSynthesisError("ElevenLabs API key not configured")
+
+        import requests
+
+        try:
+            response = requests.post(
+                f"{self.base_url}/v1/text-to-speech/{self.voice_id}/stream",
+                params={"output_format": OUTPUT_FORMAT},
+                headers={"xi-api-key": self.api_key, "Accept": "audio/mpeg"},
+                json={"text": text, "model_id": self.model_id},
+                stream=True,
+                timeout=REQUEST_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            raise VoiceSynthesisError(f"TTS request failed: {e}") from e
+
+        with response:
+            if response.status_code != 200:
+                raise VoiceSynthesisError(f"TTS service returned {response.status_code}: {response.text[:200]}")
+            mime = response.headers.get("Content-Type", "audio/mpeg").split(";")[0].strip()
+            extension = AUDIO_FORMATS.get(mime, ".mp3")
+            final_path = os.path.join(self.cache_dir, audio_cache_key(text, self.voice_id, self.model_id) + extension)
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            yield chunk
+                # Publish only complete clips; an interrupted stream leaves no entry
+                os.replace(tmp_path, final_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def clip_mime(self, text: str) -> str:
+        """MIME type of the cached clip for text"""
+        path = self.cached_clip(text)
+        return EXTENSION_MIME[os.path.splitext(path)[1]] if path else "audio/mpeg"
+
+
+def play_summary(synth: VoiceSynthesizer, text: str):
+    """Render a spoken summary, showing download progress while audio streams in"""
+    import streamlit as st
+
+    st.write("**Summary Text:**", text)
+    cached = synth.cached_clip(text) is not None
+    if not cached and not synth.enabled:
+        st.info("💡 Add ELEVENLABS_API_KEY to secrets.toml to generate voice audio")
+        return
+
+    chunks = []
+    received = 0
+    status = st.empty()
+    try:
+        for chunk in synth.stream(text):
+            chunks.append(chunk)
+            received += len(chunk)
+            status.caption(f"🎵 Receiving audio... {received / 1024:.0f} KB")
+    except VoiceSynthesisError as e:
+        status.empty()
+        st.warning(f"Voice generation unavailable: {e}")
+        return
+    status.empty()
+
+    st.audio(b"".join(chunks), format=synth.clip_mime(text), autoplay=True)
+    st.success("🎵 Voice summary ready!" + (" (from audio cache)" if cached else ""))
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GEOMETRY_DIR = os.path.join(BASE_DIR, "reference", "geometry")
+
+# Douglas-Peucker tolerance in degrees and coordinate precision per detail level
+DETAIL_LEVELS = {
+    "fine": (0.05, 2),
+    "medium": (0.25, 2),
+    "coarse": (0.75, 1),
+}
+# A world view uses the coarsest geometry; zooming to one continent uses finer
+# shapes, and Europe's small countries need the finest
+SCOPE_DETAIL = {"World": "coarse", "Europe": "fine"}
+CONTINENT_DETAIL = "medium"
+
+# Bump when the geometry files or the map figure layout change
+MAP_VERSION = 2
+
+# Natural Earth names that differ from the canonical dataset spelling
+NATURAL_EARTH_NAMES = {
+    "United States of America": "United States",
+    "Dem. Rep. Congo": "Democratic Republic of Congo",
+    "Dominican Rep.": "Dominican Republic",
+    "Central African Rep.": "Central African Republic",
+    "Eq. Guinea": "Equatorial Guinea",
+    "eSwatini": "Eswatini",
+    "Solomon Is.": "Solomon Islands",
+    "Bosnia and Herz.": "Bosnia and Herzegovina",
+    "S. Sudan": "South Sudan",
+    "Côte d'Ivoire": "Cote d'Ivoire",
+    "Timor-Leste": "East Timor",
+    "Macedonia": "North Macedonia",
+}
+
+_geometry_cache: Dict[str, Dict[str, Any]] = {}
+_geometry_lock = threading.Lock()
+
+
+def _simplify_ring(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker on one closed ring, iterative to avoid deep recursion"""
+    if len(points) <= 4 or tolerance <= 0:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[start + 1:end]
+        a, b = points[start], points[end]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            distances = np.hypot(*(segment - a).T)
+        else:
+            distances = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return points[keep]
+
+
+def _simplify_polygon(rings: List[List[List[float]]], tolerance: float, decimals: int) -> Optional[List]:
+    simplified = []
+    for i, ring in enumerate(rings):
+        points = _simplify_ring(np.asarray(ring, dtype=np.float64), tolerance).round(decimals)
+        # Drop consecutive duplicates created by rounding
+        points = points[np.r_[True, np.any(np.diff(points, axis=0) != 0, axis=1)]]
+        if len(points) < 4:
+            if i == 0:
+                return None
+            continue
+        simplified.append(points.tolist())
+    return simplified
+
+
+def build_geometry(source: str, out_dir: str = GEOMETRY_DIR) -> Dict[str, int]:
+    """Write one simplified GeoJSON per detail level from a Natural Earth countries file
+
+    Feature ids are canonical country names, so the map joins on the same
+    key as every other aggregate. Returns the size in bytes of each file.
+    """
+    with open(source) as f:
+        features = json.load(f)["features"]
+    os.makedirs(out_dir, exist_ok=True)
+    sizes = {}
+    for detail, (tolerance, decimals) in DETAIL_LEVELS.items():
+        output = []
+        for feature in features:
+            name = feature["properties"]["name"]
+            geometry = feature["geometry"]
+            polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            # Keep the largest polygon even if simplification would remove it, so no country vanishes
+            polygons = sorted(polygons, key=lambda rings: -len(rings[0]))
+            kept = [p for p in (_simplify_polygon(rings, tolerance, decimals) for rings in polygons) if p]
+            if not kept:
+                kept = [_simplify_polygon(polygons[0], 0, decimals)]
+            output.append({
+                "type": "Feature",
+                "id": NATURAL_EARTH_NAMES.get(name, name),
+                "properties": {},
+                "geometry": {"type": "MultiPolygon", "coordinates": kept},
+            })
+        path = os.path.join(out_dir, f"countries_{detail}.json")
+        with open(path, "w") as f:
+            json.dump({"type": "FeatureCollection", "features": output}, f, separators=(",", ":"))
+        sizes[detail] = os.path.getsize(path)
+    return sizes
+
+
+def load_geometry(detail: str, geometry_dir: str = GEOMETRY_DIR) -> Dict[str, Any]:
+    """Shipped country shapes at one detail level, read once per process"""
+    path = os.path.join(geometry_dir, f"countries_{detail}.json")
+    with _geometry_lock:
+        if path not in _geometry_cache:
+            with open(path) as f:
+                _geometry_cache[path] = json.load(f)
+        return _geometry_cache[path]
+
+
+def _subset(geometry: Dict[str, Any], countries: pd.Index) -> Dict[str, Any]:
+    """Only the features that will be drawn"""
+    wanted = set(countries)
+    return {"type": "FeatureCollection", "features": [f for f in geometry["features"] if f["id"] in wanted]}
+
+
+def _round_values(values: np.ndarray, zmax: float) -> List[Optional[float]]:
+    """Four significant digits relative to the largest value; NaN becomes null"""
+    decimals = max(0, 3 - int(np.floor(np.log10(zmax)))) if zmax > 0 else 0
+    rounded = np.round(values, decimals)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def _base_figure(countries: pd.Index, geometry: Dict[str, Any], z: List[Optional[float]],
+                 zmax: float, title: str) -> Dict[str, Any]:
+    return {
+        "data": [{
+            "type": "choropleth",
+            "geojson": geometry,
+            "locations": list(countries),
+            "z": z,
+            "zmin": 0,
+            "zmax": zmax,
+            "colorscale": "Reds",
+            "marker": {"line": {"width": 0.3, "color": "#999"}},
+            "colorbar": {"title": {"text": "Emissions"}},
+            "hovertemplate": "%{location}<br>%{z:,.3f}<extra></extra>",
+        }],
+        "layout": {
+            "title": {"text": title},
+            "geo": {"visible": False, "fitbounds": "locations", "projection": {"type": "natural earth"}},
+            "margin": {"l": 0, "r": 0, "t": 50, "b": 0},
+            "height": 520,
+        },
+    }
+
+
+def map_figure(by_year: pd.DataFrame, year: int, detail: str) -> Dict[str, Any]:
+    """Choropleth of one year as a plain figure dict (Year x Country input)"""
+    countries = by_year.columns
+    values = by_year.loc[year].to_numpy(dtype=np.float64)
+    zmax = float(np.nanmax(values)) if np.isfinite(values).any() else 0.0
+    geometry = _subset(load_geometry(detail), countries)
+    return _base_figure(countries, geometry, _round_values(values, zmax), zmax,
+                        f"Carbon Emissions by Country, {year}")
+
+
+def animated_map_figure(by_year: pd.DataFrame, detail: str) -> Dict[str, Any]:
+    """Choropleth with a year slider
+
+    Geometry and locations are sent once in the base trace; each frame only
+    carries the z values, and a year identical to the previous one carries
+    nothing but the name of the frame it repeats (its baseframe). Every year
+    keeps its own frame and slider step.
+    """
+    countries = by_year.columns
+    values = by_year.to_numpy(dtype=np.float64)
+    zmax = float(np.nanmax(values)) if np.isfinite(values).any() else 0.0
+    geometry = _subset(load_geometry(detail), countries)
+
+    frames, previous, base = [], None, None
+    for year, row in zip(by_year.index, values):
+        z = _round_values(row, zmax)
+        if z == previous:
+            frames.append({"name": str(year), "baseframe": base})
+            continue
+        frames.append({"name": str(year), "data": [{"type": "choropleth", "z": z}], "traces": [0]})
+        previous, base = z, str(year)
+
+    figure = _base_figure(countries, geometry, frames[0]["data"][0]["z"] if frames else [], zmax,
+                          "Carbon Emissions by Country")
+    figure["frames"] = frames
+    figure["layout"]["sliders"] = [{
+        "active": 0,
+        "currentvalue": {"prefix": "Year: "},
+        "pad": {"t": 30},
+        "steps": [{
+            "label": frame["name"],
+            "method": "animate",
+            "args": [[frame["name"]], {"mode": "immediate", "frame": {"duration": 0, "redraw": True},
+                                       "transition": {"duration": 0}}],
+        } for frame in frames],
+    }]
+    figure["layout"]["updatemenus"] = [{
+        "type": "buttons",
+        "showactive": False,
+        "x": 0.05, "y": 0, "xanchor": "right", "yanchor": "top",
+        "pad": {"t": 40, "r": 10},
+        "buttons": [
+            {"label": "▶", "method": "animate",
+             "args": [None, {"frame": {"duration": 200, "redraw": True}, "fromcurrent": True,
+                             "transition": {"duration": 0}}]},
+            {"label": "⏸", "method": "animate",
+             "args": [[None], {"mode": "immediate", "frame": {"duration": 0, "redraw": False}}]},
+        ],
+    }]
+    return figure
+
+
+def cached_map_figure(rollup, fingerprint: str, cache: ResultCache, scope: str = "World",
+                      year: Optional[int] = None) -> Dict[str, Any]:
+    """Map figure for a dataset, scope and year (None animates), cached as JSON
+
+    scope is "World" or a continent name from the region hierarchy.
+    """
+    key = cache.key("map", MAP_VERSION, fingerprint, scope, year if year is not None else "animated")
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    by_year = rollup.by_year("Country")
+    if scope != "World":
+        by_year = by_year[rollup.countries_in("Continent", scope)]
+    # Leave out countries with no emissions at all so the map fits what was reported
+    by_year = by_year.loc[:, by_year.to_numpy().any(axis=0)]
+    detail = SCOPE_DETAIL.get(scope, CONTINENT_DETAIL)
+    figure = map_figure(by_year, year, detail) if year is not None else animated_map_figure(by_year, detail)
+    cache.put(key, figure)
+    return figure
+
+
+def map_section(rollup, fingerprint: str, cache: ResultCache):
+    """World map tab: scope, single year or animated slider"""
+    import streamlit as st
+
+    continents = [c for c in rollup.totals("Continent").index if c != "Unassigned"]
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        scope = st.selectbox("Region", ["World"] + continents, key="map_scope")
+    with col2:
+        animate = st.toggle("▶️ Animate years", key="map_animate")
+    if animate:
+        figure = cached_map_figure(rollup, fingerprint, cache, scope)
+    else:
+        year = st.select_slider("Year", options=rollup.years.tolist(), value=int(rollup.years[-1]),
+                                key="map_year")
+        figure = cached_map_figure(rollup, fingerprint, cache, scope, year)
+    st.plotly_chart(figure, use_container_width=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build simplified country geometry for the world map")
+    parser.add_argument("source", help="Natural Earth admin-0 countries as GeoJSON")
+    parser.add_argument("--out", default=GEOMETRY_DIR, help="Output directory")
+    args = parser.parse_args()
+    print(json.dumps(build_geometry(args.source, args.out), indent=2))